@@ -0,0 +1,139 @@
+"""Admission control for the heavy request classes, so checkout keeps its workers.
+
+Reports, exports and imports each get a small number of running slots
+shared by every worker process on the host: a slot is an exclusive
+``flock`` on one of the class's lock files, so the limit holds under sync
+gunicorn workers as well as threads, and a crashed worker's slots are freed
+by the kernel. A request that finds its class full waits briefly for a slot
+(at most QUEUED per class and worker), then gets a 429 with Retry-After
+rather than holding a worker indefinitely. An import job keeps its slot
+until the job ends, on whichever thread runs it. Only signed-in requests
+are admitted. Everything else - POS, auth, lookups - is never queued, so
+the workers left over after the class limits are reserved for it.
+
+Reports read through read-only connections whose progress handler
+interrupts a query once it has run past REPORT_TIME_BUDGET_SECONDS. With
+the database in WAL mode those readers never block a POS commit, and a
+commit never blocks them.
+"""
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+SLOT_DIR = os.environ.get('ADMISSION_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'inventory-admission'))
+
+# Request class -> (running slots per host, requests each worker may queue)
+LIMITS = {
+    'report': (int(os.environ.get('REPORT_SLOTS', 2)), 2),
+    'export': (int(os.environ.get('EXPORT_SLOTS', 1)), 1),
+    'import': (int(os.environ.get('IMPORT_SLOTS', 1)), 1),
+}
+
+# (request class, path prefix, methods or None for any); first match wins.
+# Imports are not classified by path: an import job may outlive its request,
+# so the import routes acquire the 'import' slot themselves and the job holds it.
+REQUEST_CLASSES = (
+    ('report', '/api/reports/', None),
+    ('export', '/api/export/', None),
+)
+
+QUEUE_WAIT_SECONDS = float(os.environ.get('ADMISSION_QUEUE_WAIT_SECONDS', 2))
+QUEUE_POLL_SECONDS = 0.05
+RETRY_AFTER_SECONDS = 5
+
+REPORT_TIME_BUDGET_SECONDS = float(os.environ.get('REPORT_TIME_BUDGET_SECONDS', 15))
+# SQLite VM instructions between time budget checks
+PROGRESS_INTERVAL = 10000
+
+_lock = threading.Lock()
+_waiting = {}
+
+
+class Saturated(Exception):
+    """Raised when a request class has no free slot within the queue wait"""
+
+    def __init__(self, request_class):
+        super().__init__(f'Too many {request_class} requests are running. Please try again shortly.')
+        self.request_class = request_class
+        self.retry_after = RETRY_AFTER_SECONDS
+
+
+def enable_wal(cursor):
+    """Put the database in WAL mode so report readers and POS writers don't block each other.
+
+    Must run outside a transaction; the mode is stored in the database file.
+    """
+    cursor.execute('PRAGMA journal_mode=WAL')
+
+
+def classify(method, path):
+    """The admission-controlled class of a request, or None if it is always admitted"""
+    for request_class, prefix, methods in REQUEST_CLASSES:
+        if path.startswith(prefix) and (methods is None or method in methods):
+            return request_class
+    return None
+
+
+def _try_slot(request_class, running):
+    os.makedirs(SLOT_DIR, exist_ok=True)
+    for index in range(running):
+        # A separate open per attempt: flock conflicts between open files, threads included
+        handle = open(os.path.join(SLOT_DIR, f'{request_class}.{index}.lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except BlockingIOError:
+            handle.close()
+    return None
+
+
+def acquire_slot(request_class):
+    """Hold a running slot of ``request_class``; pass the result to ``release_slot``.
+
+    Raises Saturated when no slot frees up within QUEUE_WAIT_SECONDS or the
+    class queue is full.
+    """
+    running, queued = LIMITS[request_class]
+    slot = _try_slot(request_class, running)
+    if slot:
+        return slot
+
+    with _lock:
+        if _waiting.get(request_class, 0) >= queued:
+            raise Saturated(request_class)
+        _waiting[request_class] = _waiting.get(request_class, 0) + 1
+    try:
+        deadline = time.monotonic() + QUEUE_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(QUEUE_POLL_SECONDS)
+            slot = _try_slot(request_class, running)
+            if slot:
+                return slot
+        raise Saturated(request_class)
+    finally:
+        with _lock:
+            _waiting[request_class] -= 1
+
+
+def release_slot(slot):
+    fcntl.flock(slot, fcntl.LOCK_UN)
+    slot.close()
+
+
+def read_only_connection(database, time_budget=None):
+    """Row connection that cannot write; with ``time_budget`` its queries are
+    interrupted ('interrupted' OperationalError) that many seconds after it opens"""
+    conn = sqlite3.connect(f'file:{database}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    if time_budget:
+        deadline = time.monotonic() + time_budget
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+    return conn
+
+
+def is_interrupted(error):
+    """True for the OperationalError of a query stopped by its time budget"""
+    return isinstance(error, sqlite3.OperationalError) and str(error) == 'interrupted'
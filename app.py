@@ -1,5 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, send_from_directory
-from functools import wraps
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, send_from_directory, g
 from werkzeug.utils import secure_filename
 import sqlite3
 import json
@@ -9,15 +8,43 @@ import io
 import os
 import hashlib
 import time
-import bcrypt # Import bcrypt
 
 # Import authentication and user route modules
-from auth import login_required, authenticate_user, log_audit
+from auth import login_required, admin_required, authenticate_user, log_audit, log_audit_many, current_user
 from user_routes import user_bp
+from permission_cache import init_permission_cache
+from password_hashing import hash_password, HashingBusy
+from admission import enable_wal, classify, acquire_slot, release_slot, read_only_connection, is_interrupted, Saturated, REPORT_TIME_BUDGET_SECONDS
+from login_throttle import check_login_rate
+from audit_store import init_audit_store
+from dashboard_summary import init_dashboard_summary, read_dashboard_summary, read_sales_window, read_daily_sales, get_cached, invalidate_dashboard_cache
+from live_events import init_live_events, event_stream_response, TooManyStreams
+from change_feed import init_change_feed, read_changes, ResyncRequired, TRACKED_TABLES, DEFAULT_CHANGE_LIMIT, MAX_CHANGE_LIMIT
+from backup import init_backup, create_backup, list_backups, verify_backup, restore_backup, prune_backups, BackupError
+from grn_receiving import receive_purchase_order_items
+from product_deletion import init_product_deletion, delete_products, ARCHIVED_STATUS
+from product_bulk_update import preview_bulk_update, apply_bulk_update, audit_details, BulkUpdateError
+from detail_documents import init_detail_documents, fetch_document
+from list_query import init_list_queries, read_list, count_list, ListQueryError
+from service_board import init_service_board, read_service_board, DEFAULT_TURNAROUND_MONTHS, DEFAULT_OVERDUE_LIMIT
+from service_parts import init_service_parts, consume_service_parts, release_service_parts
+from service_search import init_service_search, search_service_jobs, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from stock_reconciliation import init_stock_reconciliation, reconcile_stock, get_reconciliation_run
+from inventory_snapshots import init_inventory_snapshots, take_snapshot, prune_snapshots, list_snapshots, read_valuation, parse_as_of
+from stock_ledger import init_stock_ledger, read_stock_history, DEFAULT_HISTORY_LIMIT, MAX_HISTORY_LIMIT
+from imei_ingest import check_imeis, accepted_or_raise, insert_imeis, ingest_imeis, ImeiRejected
+from imei_filter import SCAN_SYNC_SECONDS
+from export_stream import csv_stream, xlsx_stream, streaming_download, CSV_MIMETYPE, XLSX_MIMETYPE
+from import_jobs import (
+    init_import_jobs, stage_upload, preview_import_file, create_import_job,
+    get_import_job, is_resumable, run_import_job, start_import_job
+)
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Import uploads are streamed to disk, so they get a larger per-request limit
+app.config['IMPORT_MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'
@@ -35,6 +62,34 @@ def add_security_headers(response):
     response.headers['Expires'] = '-1'
     return response
 
+# Reports and exports run in capped slots so POS and auth always find a free worker.
+# Anonymous requests are left to login_required so they never take a slot.
+@app.before_request
+def admit_request():
+    request_class = classify(request.method, request.path)
+    if request_class and current_user() is not None:
+        g.admission_slot = acquire_slot(request_class)
+
+@app.errorhandler(Saturated)
+def admission_saturated(e):
+    return jsonify({'success': False, 'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+
+@app.teardown_request
+def release_admission(exc):
+    # Streamed downloads tear down after their last chunk, so they hold the slot until then
+    slot = g.pop('admission_slot', None)
+    if slot:
+        release_slot(slot)
+
+@app.errorhandler(sqlite3.OperationalError)
+def query_interrupted(e):
+    if not is_interrupted(e):
+        raise e
+    return jsonify({
+        'success': False,
+        'error': f'The report took longer than {REPORT_TIME_BUDGET_SECONDS:g} seconds. Please narrow the date range or filters.'
+    }), 503, {'Retry-After': '30'}
+
 @app.route('/static/<path:filename>')
 def serve_static(filename):
     return send_from_directory('static', filename)
@@ -51,14 +106,6 @@ ADMIN_PASSWORD_HASH = hashlib.sha256('admin123'.encode()).hexdigest()
 # Register user management blueprint
 app.register_blueprint(user_bp)
 
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not session.get('logged_in'):
-            return jsonify({'error': 'Authentication required'}), 401
-        return f(*args, **kwargs)
-    return decorated_function
-
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -68,6 +115,10 @@ def get_db():
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_report_db():
+    """Read-only connection for reports; its queries stop past the report time budget"""
+    return read_only_connection(DATABASE, REPORT_TIME_BUDGET_SECONDS)
+
 def init_db():
     """Initialize the database and create tables if they don't exist"""
     conn = get_db()
@@ -609,14 +660,65 @@ def init_db():
     # Insert default admin user if not exists
     cursor.execute('SELECT COUNT(*) as count FROM users WHERE username = ?', (ADMIN_USERNAME,))
     if cursor.fetchone()['count'] == 0:
-        hashed_password = bcrypt.hashpw(b'admin123', bcrypt.gensalt()) # Hash password using bcrypt
+        hashed_password = hash_password('admin123')
         cursor.execute('SELECT id FROM roles WHERE name = ?', ('Admin',))
         admin_role = cursor.fetchone()
         if admin_role:
             cursor.execute('INSERT INTO users (username, password_hash, full_name, email, role_id, is_active, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                           (ADMIN_USERNAME, hashed_password.decode('utf-8'), 'Administrator', 'admin@example.com', admin_role['id'], 1, 'active'))
+                           (ADMIN_USERNAME, hashed_password, 'Administrator', 'admin@example.com', admin_role['id'], 1, 'active'))
+
+    # Audit log indexes and legacy audit_logs migration
+    init_audit_store(cursor)
+
+    # Version stamp that invalidates cached permissions in every worker
+    init_permission_cache(cursor)
+
+    # Trigger-maintained dashboard aggregates
+    init_dashboard_summary(cursor)
+
+    # Resumable bulk import jobs
+    init_import_jobs(cursor)
+
+    # Change log feeding /api/changes
+    init_change_feed(cursor)
+
+    # Running balances on stock_movements
+    init_stock_ledger(cursor)
+
+    # Nightly stock reconciliation reports
+    init_stock_reconciliation(cursor)
+
+    # Foreign-key indexes for single-statement detail documents
+    init_detail_documents(cursor)
+
+    # Sort and filter indexes for keyset-paginated list endpoints
+    init_list_queries(cursor)
+
+    # Trigger-maintained service desk counters and turnaround stats
+    init_service_board(cursor)
+
+    # Full-text index over service jobs
+    init_service_search(cursor)
+
+    # Product foreign-key indexes for set-based bulk delete
+    init_product_deletion(cursor)
+
+    # IMEI tracking for service parts taken from stock
+    init_service_parts(cursor)
+
+    # Stock snapshots for point-in-time valuation
+    init_inventory_snapshots(cursor)
+
+    # Event log behind the /api/events live update stream
+    init_live_events(cursor)
+
+    # Restore epoch checked by per-worker caches without a version of their own
+    init_backup(cursor)
 
     conn.commit()
+
+    # WAL lets reports read while POS commits; set after the commit, outside any transaction
+    enable_wal(cursor)
     conn.close()
 
 # Initialize database automatically when app starts
@@ -638,7 +740,15 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    user, error = authenticate_user(username, password)
+    # Throttled before any DB or bcrypt work, so a login storm stays cheap
+    retry_after = check_login_rate(username, request.remote_addr)
+    if retry_after:
+        return jsonify({'error': 'Too many login attempts. Please wait and try again.'}), 429, {'Retry-After': str(int(retry_after) + 1)}
+
+    try:
+        user, error = authenticate_user(username, password)
+    except HashingBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
 
     if error:
         log_audit(user_id=None, action='login_failed', details=f"Failed login attempt for username: {username}. Reason: {error}")
@@ -667,7 +777,10 @@ def logout():
 
 @app.route('/api/check-auth', methods=['GET'])
 def check_auth():
-    return jsonify({'logged_in': session.get('logged_in', False), 'username': session.get('username'), 'role': session.get('role_name')})
+    user = current_user()
+    if user is None:
+        return jsonify({'logged_in': False, 'username': None, 'role': None})
+    return jsonify({'logged_in': True, 'username': user['username'], 'role': user['role_name']})
 
 @app.route('/api/categories', methods=['GET', 'POST'])
 @login_required
@@ -1027,6 +1140,10 @@ def products():
         if status:
             query += ' AND p.status = ?'
             params.append(status)
+        else:
+            # Archived products only show up when asked for
+            query += ' AND p.status IS NOT ?'
+            params.append(ARCHIVED_STATUS)
 
         if stock_status == 'low':
             query += ' AND p.current_stock <= p.min_stock_level'
@@ -1069,7 +1186,7 @@ def product_detail(id):
 
         try:
             # Get old stock value and other details to track changes for audit log
-            cursor.execute('SELECT current_stock, name, sku FROM products WHERE id = ?', (id,))
+            cursor.execute('SELECT current_stock, name, sku, status FROM products WHERE id = ?', (id,))
             old_product_data = cursor.fetchone()
             if not old_product_data:
                 return jsonify({'success': False, 'error': 'Product not found'}), 404
@@ -1092,7 +1209,9 @@ def product_detail(id):
                 data.get('min_stock_level', 10), data.get('storage_location'), data.get('imei'),
                 data.get('color'), data.get('storage_capacity'), data.get('ram'),
                 data.get('warranty_period'), data.get('supplier_name'), data.get('supplier_contact'),
-                data.get('image_url'), data.get('status', 'active'), id
+                data.get('image_url'),
+                # The edit form has no status field; keep an archived product archived
+                data.get('status') or old_product_data['status'], id
             ))
 
             # Record stock adjustment if stock changed
@@ -1148,57 +1267,40 @@ def bulk_delete_products():
         return jsonify({'success': False, 'error': 'Invalid request data'}), 400
 
     ids = data.get('ids', [])
+    mode = data.get('mode', 'delete')
 
     if not ids:
         return jsonify({'success': False, 'error': 'No product IDs provided'}), 400
+    if mode not in ('delete', 'archive'):
+        return jsonify({'success': False, 'error': "mode must be 'delete' or 'archive'"}), 400
 
     conn = get_db()
-    cursor = conn.cursor()
-    deleted_count = 0
-    failed_deletions = []
-
-    for product_id in ids:
-        try:
-            # Check dependencies before deleting each product
-            cursor.execute('SELECT COUNT(*) as count FROM purchase_order_items WHERE product_id = ?', (product_id,))
-            if cursor.fetchone()['count'] > 0:
-                failed_deletions.append(f"Product ID {product_id}: Associated with purchase orders")
-                continue
-            cursor.execute('SELECT COUNT(*) as count FROM stock_movements WHERE product_id = ?', (product_id,))
-            if cursor.fetchone()['count'] > 0:
-                failed_deletions.append(f"Product ID {product_id}: Has stock movement history")
-                continue
-            cursor.execute('SELECT COUNT(*) as count FROM pos_sale_items WHERE product_id = ?', (product_id,))
-            if cursor.fetchone()['count'] > 0:
-                failed_deletions.append(f"Product ID {product_id}: Associated with sales")
-                continue
-            cursor.execute('SELECT COUNT(*) as count FROM product_imei WHERE product_id = ?', (product_id,))
-            if cursor.fetchone()['count'] > 0:
-                failed_deletions.append(f"Product ID {product_id}: Has associated IMEI numbers")
-                continue
-
-            cursor.execute('SELECT name, sku FROM products WHERE id = ?', (product_id,))
-            product = cursor.fetchone()
-
-            cursor.execute('DELETE FROM products WHERE id = ?', (product_id,))
-            deleted_count += 1
-            log_audit(user_id=session.get('user_id'), action='bulk_delete_product', target_type='product', target_id=product_id, details=f"Deleted product '{product['name']}' (SKU: {product['sku']})")
-
-        except Exception as e:
-            failed_deletions.append(f"Product ID {product_id}: {str(e)}")
+    try:
+        deleted, archived, failed = delete_products(conn, ids, archive=(mode == 'archive'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Product IDs must be integers'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+    log_audit_many(session.get('user_id'), 'bulk_delete_product', 'product',
+                   [(id, f"Deleted product '{name}' (SKU: {sku})") for id, name, sku in deleted])
+    log_audit_many(session.get('user_id'), 'bulk_archive_product', 'product',
+                   [(id, f"Archived product '{name}' (SKU: {sku})") for id, name, sku in archived])
 
-    if failed_deletions:
+    result = {'deleted': len(deleted)}
+    if mode == 'archive':
+        result['archived'] = len(archived)
+    if failed:
         return jsonify({
             'success': False,
             'message': f"Some products could not be deleted due to dependencies.",
-            'deleted': deleted_count,
-            'failed': failed_deletions
+            **result,
+            'failed': failed
         })
 
-    return jsonify({'success': True, 'deleted': deleted_count})
+    return jsonify({'success': True, **result})
 
 @app.route('/api/products/bulk-update', methods=['POST'])
 @login_required
@@ -1207,45 +1309,27 @@ def bulk_update_products():
     if not data:
         return jsonify({'success': False, 'error': 'Invalid request data'}), 400
 
-    ids = data.get('ids', [])
-    updates = data.get('updates', {})
+    ids = data.get('ids') or []
+    filters = data.get('filter') or {}
+    updates = data.get('updates') or {}
 
-    if not ids:
+    if not ids and not filters:
         return jsonify({'success': False, 'error': 'No product IDs provided'}), 400
 
     conn = get_db()
-    cursor = conn.cursor()
-
-    set_clauses = []
-    params = []
-
-    if 'category_id' in updates:
-        set_clauses.append('category_id = ?')
-        params.append(updates['category_id'])
-
-    if 'status' in updates:
-        set_clauses.append('status = ?')
-        params.append(updates['status'])
-
-    if 'selling_price' in updates:
-        set_clauses.append('selling_price = ?')
-        params.append(updates['selling_price'])
-
-    if 'cost_price' in updates:
-        set_clauses.append('cost_price = ?')
-        params.append(updates['cost_price'])
-
-    if set_clauses:
-        set_clauses.append('updated_at = CURRENT_TIMESTAMP')
-        params.extend(ids)
-        placeholders = ','.join('?' * len(ids))
-        query = f"UPDATE products SET {', '.join(set_clauses)} WHERE id IN ({placeholders})"
-        cursor.execute(query, params)
-        conn.commit()
-        log_audit(user_id=session.get('user_id'), action='bulk_update_product', target_type='product', details=f"Bulk updated {len(ids)} products with: {updates}")
+    try:
+        if data.get('preview'):
+            result = preview_bulk_update(conn.cursor(), ids, filters, updates)
+        else:
+            result = apply_bulk_update(conn, ids, filters, updates)
+    except BulkUpdateError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
 
-    conn.close()
-    return jsonify({'success': True, 'updated': len(ids)})
+    if not data.get('preview') and result['updated']:
+        log_audit(user_id=session.get('user_id'), action='bulk_update_product', target_type='product', details=audit_details(ids, filters, updates, result))
+    return jsonify({'success': True, **result})
 
 @app.route('/api/products/<int:product_id>/imeis', methods=['GET', 'POST'])
 @login_required
@@ -1267,33 +1351,22 @@ def manage_product_imeis(product_id):
             return jsonify({'success': False, 'error': 'No IMEI numbers provided'}), 400
 
         try:
-            added_imeis = []
-            for imei in imei_list:
-                imei_clean = imei.strip()
-                if not imei_clean:
-                    continue
-
-                # Validate IMEI format (15 digits)
-                if len(imei_clean) != 15 or not imei_clean.isdigit():
-                    raise ValueError(f'Invalid IMEI format: {imei_clean}. IMEI must be exactly 15 digits.')
-
-                cursor.execute('''
-                    INSERT INTO product_imei (product_id, imei, status, grn_id, stock_movement_id, received_date)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (product_id, imei_clean, 'available', grn_id, stock_movement_id, datetime.now()))
-                added_imeis.append(imei_clean)
+            results = ingest_imeis(
+                cursor, product_id, imei_list, partial=bool(data.get('partial')),
+                grn_id=grn_id, stock_movement_id=stock_movement_id, received_date=datetime.now()
+            )
+            added_imeis = [entry['imei'] for entry in results if entry['status'] == 'accepted']
 
             conn.commit()
             log_audit(user_id=session.get('user_id'), action='add_imeis', target_type='product', target_id=product_id, details=f"Added {len(added_imeis)} IMEIs. GRN ID: {grn_id}, Stock Movement ID: {stock_movement_id}")
-            return jsonify({'success': True, 'added': len(added_imeis), 'imeis': added_imeis})
+            return jsonify({'success': True, 'added': len(added_imeis), 'imeis': added_imeis, 'results': results})
+        except ImeiRejected as e:
+            conn.rollback()
+            return jsonify({'success': False, 'error': str(e), 'results': e.rejected}), 400
         except sqlite3.IntegrityError as e:
+            # Another request added one of these IMEIs after the check
             conn.rollback()
-            # Extracting the specific IMEI that caused the integrity error is difficult here without more complex SQL.
-            # We'll return a general message.
             return jsonify({'success': False, 'error': f'One or more IMEI numbers already exist: {str(e)}'}), 400
-        except ValueError as e: # Catch IMEI validation errors
-            conn.rollback()
-            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             conn.rollback()
             return jsonify({'success': False, 'error': str(e)}), 400
@@ -1364,6 +1437,30 @@ def verify_product_imei(product_id):
     finally:
         conn.close()
 
+# A full carton or pallet scan; larger lists belong in a bulk import
+MAX_IMEI_CHECK = 5000
+
+@app.route('/api/imeis/check', methods=['POST'])
+@login_required
+def check_imei_batch():
+    """Flag scanned IMEIs that are invalid or already on file, before anything is saved"""
+    data = request.json
+    if not data or not isinstance(data.get('imeis'), list):
+        return jsonify({'success': False, 'error': 'imeis must be a list'}), 400
+    if len(data['imeis']) > MAX_IMEI_CHECK:
+        return jsonify({'success': False, 'error': f'At most {MAX_IMEI_CHECK} IMEIs per check'}), 400
+
+    conn = get_db()
+    try:
+        results = check_imeis(conn.cursor(), data['imeis'], max_age=SCAN_SYNC_SECONDS)
+    finally:
+        conn.close()
+    return jsonify({
+        'success': True,
+        'results': results,
+        'rejected': sum(1 for entry in results if entry['status'] != 'accepted')
+    })
+
 @app.route('/api/imeis/<int:imei_id>', methods=['DELETE'])
 @login_required
 def delete_imei(imei_id):
@@ -1445,40 +1542,41 @@ def purchase_orders():
         finally:
             conn.close()
     else:
-        cursor.execute('''
-            SELECT * FROM purchase_orders ORDER BY created_at DESC
-        ''')
-        pos = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        return jsonify(pos)
+        return _list_response('purchase_orders')
 
-@app.route('/api/purchase-orders/<int:id>', methods=['GET'])
-@login_required
-def purchase_order_detail(id):
+def _list_response(name):
+    """One page of a list endpoint; the cursor for the next page is sent in X-Next-Cursor"""
     conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT * FROM purchase_orders WHERE id = ?', (id,))
-    po = cursor.fetchone()
-
-    if not po:
+    try:
+        cursor = conn.cursor()
+        rows, next_cursor = read_list(cursor, name, request.args)
+        response = jsonify(rows)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        if request.args.get('total'):
+            response.headers['X-Total-Count'] = str(count_list(cursor, name, request.args))
+        return response
+    except ListQueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
         conn.close()
-        return jsonify({'error': 'Purchase order not found'}), 404
 
-    po_dict = dict(po)
-
-    cursor.execute('''
-        SELECT poi.*, c.name as category_name, b.name as brand_name, m.name as model_name
-        FROM purchase_order_items poi
-        LEFT JOIN categories c ON poi.category_id = c.id
-        LEFT JOIN brands b ON poi.brand_id = b.id
-        LEFT JOIN models m ON poi.model_id = m.id
-        WHERE poi.po_id = ?
-    ''', (id,))
-    po_dict['items'] = [dict(row) for row in cursor.fetchall()]
+def _detail_response(document, id, not_found):
+    """Send a nested detail document straight from SQLite's JSON text"""
+    conn = get_db()
+    try:
+        body = fetch_document(conn.cursor(), document, id)
+    finally:
+        conn.close()
+    if body is None:
+        return jsonify({'error': not_found}), 404
+    return app.response_class(body, mimetype='application/json')
 
-    conn.close()
-    return jsonify(po_dict)
+@app.route('/api/purchase-orders/<int:id>', methods=['GET'])
+@login_required
+def purchase_order_detail(id):
+    return _detail_response('purchase_order', id, 'Purchase order not found')
 
 @app.route('/api/purchase-orders/<int:id>/receive', methods=['POST'])
 @login_required
@@ -1488,239 +1586,20 @@ def receive_purchase_order(id):
         return jsonify({'success': False, 'error': 'Invalid request data'}), 400
 
     conn = get_db()
-    cursor = conn.cursor()
 
     try:
-        payment_status = data.get('payment_status', 'unpaid')
-        storage_location = data.get('storage_location', '')
-        damaged_count = 0
-
-        # Get PO details
-        cursor.execute('SELECT po_number, supplier_name FROM purchase_orders WHERE id = ?', (id,))
-        po_row = cursor.fetchone()
-        if not po_row:
-            return jsonify({'success': False, 'error': 'Purchase order not found'}), 404
-
-        po_data = dict(po_row)
-
-        # Generate GRN number
-        grn_number = f"GRN-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-        # Create GRN record
-        cursor.execute('''
-            INSERT INTO grns (grn_number, po_id, po_number, supplier_name, payment_status, storage_location, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (grn_number, id, po_data['po_number'], po_data['supplier_name'], payment_status, storage_location, session.get('username', 'admin')))
-
-        grn_id = cursor.lastrowid
-        total_items = 0
-        total_quantity = 0
-
-        for item in data.get('items', []):
-            item_id = item['id']
-            received_qty = item.get('received_quantity', 0)
-            damaged_qty = item.get('damaged_quantity', 0)
-            damage_reason = item.get('damage_reason', '')
-
-            if received_qty <= 0 and damaged_qty <= 0:
-                continue
-
-            cursor.execute('SELECT * FROM purchase_order_items WHERE id = ?', (item_id,))
-            po_item_row = cursor.fetchone()
-            if not po_item_row:
-                continue
-
-            po_item = dict(po_item_row)
-
-            # Update received quantity (good + damaged)
-            total_received = received_qty + damaged_qty
-            cursor.execute('''
-                UPDATE purchase_order_items
-                SET received_quantity = received_quantity + ?
-                WHERE id = ?
-            ''', (total_received, item_id))
-
-            # Add to GRN items
-            cursor.execute('''
-                INSERT INTO grn_items (grn_id, product_id, product_name, quantity_received, quantity_damaged, damage_reason, cost_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (grn_id, po_item['product_id'], po_item['product_name'], received_qty, damaged_qty, damage_reason, po_item['cost_price']))
-
-            total_items += 1
-            total_quantity += received_qty
-
-            # Record damaged items if any
-            if damaged_qty > 0:
-                cursor.execute('''
-                    INSERT INTO damaged_items (po_id, po_item_id, product_name, quantity, damage_reason)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (id, item_id, po_item['product_name'], damaged_qty, damage_reason))
-                damaged_count += 1
-
-            # Check if product exists or needs to be created
-            if po_item['product_id']:
-                # Product exists, update stock
-                cursor.execute('SELECT * FROM products WHERE id = ?', (po_item['product_id'],))
-                existing_product = cursor.fetchone()
-
-                if existing_product:
-                    # Update stock and storage location
-                    update_query = 'UPDATE products SET current_stock = current_stock + ?, updated_at = CURRENT_TIMESTAMP'
-                    params_update = [received_qty]
-
-                    if storage_location:
-                        update_query += ', storage_location = ?'
-                        params_update.append(storage_location)
-
-                    update_query += ' WHERE id = ?'
-                    params_update.append(po_item['product_id'])
-
-                    cursor.execute(update_query, params_update)
-
-                    # Record stock movement
-                    cursor.execute('''
-                        INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (po_item['product_id'], 'purchase', received_qty, 'purchase_order', id,
-                          f"Received from PO #{id}"))
-
-                    stock_movement_id = cursor.lastrowid
-
-                    # Add IMEI numbers if provided
-                    imei_list = item.get('imeis', [])
-                    if imei_list:
-                        for imei in imei_list:
-                            if imei and imei.strip():
-                                cursor.execute('''
-                                    INSERT INTO product_imei (product_id, imei, status, grn_id, stock_movement_id, received_date)
-                                    VALUES (?, ?, ?, ?, ?, ?)
-                                ''', (po_item['product_id'], imei.strip(), 'available', grn_id, stock_movement_id, datetime.now()))
-                else:
-                    # Product was deleted, create new one
-                    cursor.execute('''
-                        INSERT INTO products (
-                            name, category_id, brand_id, model_id, cost_price,
-                            selling_price, mrp, current_stock, opening_stock,
-                            storage_location, status
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        po_item['product_name'], po_item['category_id'], po_item['brand_id'],
-                        po_item['model_id'], po_item['cost_price'],
-                        round(po_item['cost_price'] * 1.2, 2),
-                        round(po_item['cost_price'] * 1.3, 2),
-                        received_qty, received_qty, storage_location, 'active'
-                    ))
-                    new_product_id = cursor.lastrowid
-
-                    # Update PO item with new product ID
-                    cursor.execute('''
-                        UPDATE purchase_order_items
-                        SET product_id = ?
-                        WHERE id = ?
-                    ''', (new_product_id, item_id))
-
-                    # Record stock movement
-                    cursor.execute('''
-                        INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (new_product_id, 'purchase', received_qty, 'purchase_order', id,
-                          f"Initial stock from PO #{id}"))
-
-                    stock_movement_id = cursor.lastrowid
-
-                    # Add IMEI numbers if provided
-                    imei_list = item.get('imeis', [])
-                    if imei_list:
-                        for imei in imei_list:
-                            if imei and imei.strip():
-                                cursor.execute('''
-                                    INSERT INTO product_imei (product_id, imei, status, grn_id, stock_movement_id, received_date)
-                                    VALUES (?, ?, ?, ?, ?, ?)
-                                ''', (new_product_id, imei.strip(), 'available', grn_id, stock_movement_id, datetime.now()))
-            else:
-                # Create new product
-                cursor.execute('''
-                    INSERT INTO products (
-                        name, category_id, brand_id, model_id, cost_price,
-                        selling_price, mrp, current_stock, opening_stock,
-                        storage_location, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    po_item['product_name'], po_item['category_id'], po_item['brand_id'],
-                    po_item['model_id'], po_item['cost_price'],
-                    round(po_item['cost_price'] * 1.2, 2),
-                    round(po_item['cost_price'] * 1.3, 2),
-                    received_qty, received_qty, storage_location, 'active'
-                ))
-                new_product_id = cursor.lastrowid
-
-                # Update PO item with new product ID
-                cursor.execute('''
-                    UPDATE purchase_order_items
-                    SET product_id = ?
-                    WHERE id = ?
-                ''', (new_product_id, item_id))
-
-                # Record stock movement
-                cursor.execute('''
-                    INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (new_product_id, 'purchase', received_qty, 'purchase_order', id,
-                      f"Initial stock from PO #{id}"))
-
-                stock_movement_id = cursor.lastrowid
-
-                # Add IMEI numbers if provided
-                imei_list = item.get('imeis', [])
-                if imei_list:
-                    for imei in imei_list:
-                        if imei and imei.strip():
-                            cursor.execute('''
-                                INSERT INTO product_imei (product_id, imei, status, grn_id, stock_movement_id, received_date)
-                                VALUES (?, ?, ?, ?, ?, ?)
-                            ''', (new_product_id, imei.strip(), 'available', grn_id, stock_movement_id, datetime.now()))
-
-        # Check if all items are fully received
-        cursor.execute('''
-            SELECT SUM(quantity) as total_qty, SUM(received_quantity) as received_qty
-            FROM purchase_order_items WHERE po_id = ?
-        ''', (id,))
-        totals_row = cursor.fetchone()
-        totals = dict(totals_row) if totals_row else {'total_qty': 0, 'received_qty': 0}
-
-        # Update PO status
-        if totals['total_qty'] <= totals['received_qty']:
-            new_status = 'completed'
-        elif totals['received_qty'] > 0:
-            new_status = 'partial'
-        else:
-            new_status = 'pending'
-
-        cursor.execute('''
-            UPDATE purchase_orders
-            SET status = ?, payment_status = ?, storage_location = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (new_status, payment_status, storage_location, id))
-
-        # Update GRN totals
-        cursor.execute('''
-            UPDATE grns
-            SET total_items = ?, total_quantity = ?
-            WHERE id = ?
-        ''', (total_items, total_quantity, grn_id))
-
-        conn.commit()
-        log_audit(user_id=session.get('user_id'), action='receive_purchase_order', target_type='purchase_order', target_id=id, details=f"Received items for PO #{id}. GRN #{grn_number} created. Status updated to {new_status}.")
-        return jsonify({
-            'success': True,
-            'message': 'Items received successfully',
-            'grn_number': grn_number,
-            'grn_id': grn_id,
-            'status': new_status,
-            'total_qty': totals['total_qty'],
-            'received_qty': totals['received_qty'],
-            'damaged_count': damaged_count
-        })
+        result = receive_purchase_order_items(
+            conn, id, data.get('items', []),
+            payment_status=data.get('payment_status', 'unpaid'),
+            storage_location=data.get('storage_location', ''),
+            created_by=session.get('username', 'admin')
+        )
+        log_audit(user_id=session.get('user_id'), action='receive_purchase_order', target_type='purchase_order', target_id=id, details=f"Received items for PO #{id}. GRN #{result['grn_number']} created. Status updated to {result['status']}.")
+        return jsonify({'success': True, 'message': 'Items received successfully', **result})
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ImeiRejected as e:
+        return jsonify({'success': False, 'error': str(e), 'results': e.rejected}), 400
     except Exception as e:
         conn.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1730,44 +1609,12 @@ def receive_purchase_order(id):
 @app.route('/api/grns', methods=['GET'])
 @login_required
 def get_grns():
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT * FROM grns
-        ORDER BY created_at DESC
-    ''')
-    grns = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    return jsonify(grns)
+    return _list_response('grns')
 
 @app.route('/api/grns/<int:id>', methods=['GET'])
 @login_required
 def get_grn_detail(id):
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT * FROM grns WHERE id = ?', (id,))
-    grn_row = cursor.fetchone()
-
-    if not grn_row:
-        conn.close()
-        return jsonify({'error': 'GRN not found'}), 404
-
-    grn = dict(grn_row)
-
-    cursor.execute('''
-        SELECT gi.*, p.sku, p.brand_id, p.category_id, poi.quantity as ordered_quantity
-        FROM grn_items gi
-        LEFT JOIN products p ON gi.product_id = p.id
-        LEFT JOIN purchase_order_items poi ON gi.product_name = poi.product_name AND poi.po_id = ?
-        WHERE gi.grn_id = ?
-    ''', (grn['po_id'], id))
-    grn['items'] = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    return jsonify(grn)
+    return _detail_response('grn', id, 'GRN not found')
 
 @app.route('/api/quick-orders', methods=['GET', 'POST'])
 @login_required
@@ -1850,39 +1697,13 @@ def quick_orders():
             conn.close()
 
     else:
-        cursor.execute('''
-            SELECT * FROM quick_orders
-            ORDER BY created_at DESC
-        ''')
-        orders = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        return jsonify(orders)
+        return _list_response('quick_orders')
 
 @app.route('/api/quick-orders/<int:id>', methods=['GET'])
 @login_required
 def get_quick_order_detail(id):
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT * FROM quick_orders WHERE id = ?', (id,))
-    order_row = cursor.fetchone()
-
-    if not order_row:
-        conn.close()
-        return jsonify({'error': 'Order not found'}), 404
-
-    order = dict(order_row)
-
-    cursor.execute('''
-        SELECT qoi.*, p.sku, p.brand_id, p.category_id
-        FROM quick_order_items qoi
-        LEFT JOIN products p ON qoi.product_id = p.id
-        WHERE qoi.order_id = ?
-    ''', (id,))
-    order['items'] = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    return jsonify(order)
+    return _detail_response('quick_order', id, 'Order not found')
 
 @app.route('/api/stock-adjustment', methods=['POST'])
 @login_required
@@ -1917,6 +1738,10 @@ def stock_adjustment():
         current_stock = product_row['current_stock'] or 0
         new_stock = current_stock + quantity
 
+        # Reject bad or duplicate IMEIs before touching stock
+        if imei_numbers:
+            imei_numbers = accepted_or_raise(check_imeis(cursor, imei_numbers))
+
         cursor.execute('UPDATE products SET current_stock = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                       (new_stock, product_id))
 
@@ -1933,24 +1758,8 @@ def stock_adjustment():
         movement_id = cursor.lastrowid
 
         # Store IMEI numbers if provided
-        if imei_numbers and len(imei_numbers) > 0:
-            # Insert IMEI numbers
-            for imei in imei_numbers:
-                imei_clean = imei.strip()
-                if not imei_clean:
-                    continue
-                # Validate IMEI format (15 digits)
-                if len(imei_clean) != 15 or not imei_clean.isdigit():
-                    raise ValueError(f'Invalid IMEI format: {imei_clean}. IMEI must be exactly 15 digits.')
-                try:
-                    cursor.execute('''
-                        INSERT INTO product_imei (product_id, imei, stock_movement_id, status)
-                        VALUES (?, ?, ?, ?)
-                    ''', (product_id, imei_clean, movement_id, 'in_stock'))
-                except sqlite3.IntegrityError:
-                    # IMEI already exists
-                    conn.rollback()
-                    return jsonify({'success': False, 'error': f'IMEI number {imei_clean} already exists in the system'}), 400
+        if imei_numbers:
+            insert_imeis(cursor, product_id, imei_numbers, 'in_stock', stock_movement_id=movement_id)
 
         conn.commit()
         log_audit(user_id=session.get('user_id'), action='stock_adjustment', target_type='product', target_id=product_id, details=f"Adjusted stock for {product_name}. Quantity: {quantity}. IMEI count: {len(imei_numbers) if imei_numbers else 0}.")
@@ -1963,6 +1772,9 @@ def stock_adjustment():
             'imei_count': len(imei_numbers) if imei_numbers else 0
         })
 
+    except ImeiRejected as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e), 'results': e.rejected}), 400
     except ValueError as e: # Catch IMEI validation errors
         conn.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1975,31 +1787,7 @@ def stock_adjustment():
 @app.route('/api/stock-adjustments', methods=['GET'])
 @login_required
 def get_stock_adjustments():
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT
-            sm.id,
-            sm.product_id,
-            p.name as product_name,
-            p.sku,
-            sm.quantity,
-            sm.notes,
-            sm.created_at,
-            COUNT(pi.id) as imei_count
-        FROM stock_movements sm
-        LEFT JOIN products p ON sm.product_id = p.id
-        LEFT JOIN product_imei pi ON sm.id = pi.stock_movement_id
-        WHERE sm.type = 'adjustment'
-        GROUP BY sm.id
-        ORDER BY sm.created_at DESC
-    ''')
-
-    adjustments = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    return jsonify(adjustments)
+    return _list_response('stock_adjustments')
 
 @app.route('/api/stock-adjustments/<int:id>', methods=['GET', 'DELETE'])
 @login_required
@@ -2099,7 +1887,7 @@ def stock_adjustment_detail(id):
 @app.route('/api/reports/sales', methods=['GET'])
 @login_required
 def report_sales():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2179,55 +1967,65 @@ def report_sales():
 @app.route('/api/reports/inventory', methods=['GET'])
 @login_required
 def report_inventory():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     category_id = request.args.get('category_id', '')
     stock_status = request.args.get('stock_status', '')
 
-    query = '''
-        SELECT
-            p.sku,
-            p.name,
-            c.name as category,
-            b.name as brand,
-            m.name as model,
-            p.current_stock,
-            p.min_stock_level,
-            p.cost_price,
-            p.selling_price,
-            p.mrp,
-            (p.current_stock * p.cost_price) as stock_value,
-            CASE
-                WHEN p.current_stock = 0 THEN 'Out of Stock'
-                WHEN p.current_stock <= p.min_stock_level THEN 'Low Stock'
-                ELSE 'Good Stock'
-            END as stock_status,
-            p.storage_location,
-            p.status
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN brands b ON p.brand_id = b.id
-        LEFT JOIN models m ON p.model_id = m.id
-        WHERE 1=1
-    '''
-    params = []
+    as_of = request.args.get('as_of', '')
 
-    if category_id:
-        query += ' AND p.category_id = ?'
-        params.append(category_id)
+    if as_of:
+        # Stock and value at a past date, from the nearest snapshot plus the ledger
+        try:
+            _, inventory = read_valuation(cursor, parse_as_of(as_of), category_id, stock_status)
+        except ValueError as e:
+            conn.close()
+            return jsonify({'success': False, 'error': str(e)}), 400
+    else:
+        query = '''
+            SELECT
+                p.sku,
+                p.name,
+                c.name as category,
+                b.name as brand,
+                m.name as model,
+                p.current_stock,
+                p.min_stock_level,
+                p.cost_price,
+                p.selling_price,
+                p.mrp,
+                (p.current_stock * p.cost_price) as stock_value,
+                CASE
+                    WHEN p.current_stock = 0 THEN 'Out of Stock'
+                    WHEN p.current_stock <= p.min_stock_level THEN 'Low Stock'
+                    ELSE 'Good Stock'
+                END as stock_status,
+                p.storage_location,
+                p.status
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN brands b ON p.brand_id = b.id
+            LEFT JOIN models m ON p.model_id = m.id
+            WHERE 1=1
+        '''
+        params = []
 
-    if stock_status == 'low':
-        query += ' AND p.current_stock <= p.min_stock_level AND p.current_stock > 0'
-    elif stock_status == 'out':
-        query += ' AND p.current_stock = 0'
-    elif stock_status == 'good':
-        query += ' AND p.current_stock > p.min_stock_level'
+        if category_id:
+            query += ' AND p.category_id = ?'
+            params.append(category_id)
 
-    query += ' ORDER BY p.name'
+        if stock_status == 'low':
+            query += ' AND p.current_stock <= p.min_stock_level AND p.current_stock > 0'
+        elif stock_status == 'out':
+            query += ' AND p.current_stock = 0'
+        elif stock_status == 'good':
+            query += ' AND p.current_stock > p.min_stock_level'
 
-    cursor.execute(query, params)
-    inventory = [dict(row) for row in cursor.fetchall()]
+        query += ' ORDER BY p.name'
+
+        cursor.execute(query, params)
+        inventory = [dict(row) for row in cursor.fetchall()]
     conn.close()
 
     df = pd.DataFrame(inventory)
@@ -2255,13 +2053,37 @@ def report_inventory():
         output,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
-        download_name=f'inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        download_name=f'inventory_report_as_of_{as_of}.xlsx' if as_of else f'inventory_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
     )
 
-@app.route('/api/reports/purchase-orders', methods=['GET'])
+@app.route('/api/reports/inventory-valuation', methods=['GET'])
 @login_required
-def report_purchase_orders():
-    conn = get_db()
+def report_inventory_valuation():
+    as_of = request.args.get('as_of', '')
+    if not as_of:
+        return jsonify({'success': False, 'error': 'as_of is required'}), 400
+
+    conn = get_report_db()
+    try:
+        snapshot, items = read_valuation(conn.cursor(), parse_as_of(as_of), request.args.get('category_id', ''),
+                                         request.args.get('stock_status', ''))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    return jsonify({
+        'as_of': as_of,
+        'snapshot': snapshot,
+        'total_quantity': sum(item['quantity'] for item in items),
+        'total_value': sum(item['stock_value'] or 0 for item in items),
+        'items': items
+    })
+
+@app.route('/api/reports/purchase-orders', methods=['GET'])
+@login_required
+def report_purchase_orders():
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2341,7 +2163,7 @@ def report_purchase_orders():
 @app.route('/api/reports/stock-movements', methods=['GET'])
 @login_required
 def report_stock_movements():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2419,7 +2241,7 @@ def report_stock_movements():
 @app.route('/api/reports/grns', methods=['GET'])
 @login_required
 def report_grns():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2615,7 +2437,7 @@ def search_by_imei():
 @app.route('/api/reports/profit', methods=['GET'])
 @login_required
 def report_profit():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2702,7 +2524,7 @@ def report_profit():
 @app.route('/api/reports/gst', methods=['GET'])
 @login_required
 def report_gst():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2777,7 +2599,7 @@ def report_gst():
 @app.route('/api/reports/brand-performance', methods=['GET'])
 @login_required
 def report_brand_performance():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2845,7 +2667,7 @@ def report_brand_performance():
 @app.route('/api/reports/top-selling', methods=['GET'])
 @login_required
 def report_top_selling():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2921,7 +2743,7 @@ def report_top_selling():
 @app.route('/api/reports/staff-performance', methods=['GET'])
 @login_required
 def report_staff_performance():
-    conn = get_db()
+    conn = get_report_db()
     cursor = conn.cursor()
 
     from_date = request.args.get('from_date', '')
@@ -2993,88 +2815,21 @@ def get_stock_history(id):
     conn = get_db()
     cursor = conn.cursor()
 
-    # Get product name and opening stock
-    cursor.execute('SELECT name, opening_stock FROM products WHERE id = ?', (id,))
+    cursor.execute('SELECT name, current_stock FROM products WHERE id = ?', (id,))
     product_row = cursor.fetchone()
     if not product_row:
         conn.close()
         return jsonify({'error': 'Product not found'}), 404
 
-    product_name = product_row['name']
-    opening_stock = product_row['opening_stock'] or 0
-
-    # Get stock movements with running balance
-    cursor.execute('''
-        SELECT
-            sm.id,
-            sm.type,
-            sm.quantity,
-            sm.reference_type,
-            sm.reference_id,
-            sm.notes,
-            sm.created_at,
-            CASE
-                WHEN sm.reference_type = 'purchase_order' THEN 'PO-' || COALESCE(po.po_number, sm.reference_id)
-                WHEN sm.reference_type = 'grn' THEN COALESCE(g.grn_number, 'GRN-' || sm.reference_id)
-                WHEN sm.reference_type = 'manual' THEN 'Manual Entry'
-                ELSE COALESCE(sm.reference_type, 'System')
-            END as reference_number,
-            COALESCE(g.created_by, 'System') as received_by
-        FROM stock_movements sm
-        LEFT JOIN purchase_orders po ON sm.reference_type = 'purchase_order' AND sm.reference_id = po.id
-        LEFT JOIN grns g ON sm.reference_type = 'grn' AND sm.reference_id = g.id
-        WHERE sm.product_id = ?
-        ORDER BY sm.created_at ASC
-    ''', (id,))
-
-    movements = [dict(row) for row in cursor.fetchall()]
+    limit = min(max(request.args.get('limit', DEFAULT_HISTORY_LIMIT, type=int), 1), MAX_HISTORY_LIMIT)
+    history, next_cursor = read_stock_history(cursor, id, request.args.get('before_id', type=int), limit)
     conn.close()
 
-    # Calculate running balance starting from opening stock
-    running_balance = opening_stock
-    history = []
-
-    for movement in movements:
-        quantity = abs(movement['quantity'])
-
-        # Determine if stock is added or removed based on movement type
-        if movement['type'] in ['purchase', 'opening_stock', 'adjustment']:
-            if movement['quantity'] >= 0:
-                stock_added = quantity
-                stock_removed = 0
-                running_balance += quantity
-            else: # Negative quantity for adjustments means stock reduction
-                stock_added = 0
-                stock_removed = quantity
-                running_balance -= quantity
-        elif movement['type'] in ['sale', 'return', 'damage', 'exchange']: # Treat these as stock reduction
-            stock_added = 0
-            stock_removed = quantity
-            running_balance -= quantity
-        else:
-            # Default handling for unknown types - assume reduction if quantity negative
-            if movement['quantity'] >= 0:
-                stock_added = quantity
-                stock_removed = 0
-                running_balance += quantity
-            else:
-                stock_added = 0
-                stock_removed = quantity
-                running_balance -= quantity
-
-
-        history.append({
-            'date_time': movement['created_at'],
-            'stock_added': stock_added,
-            'stock_removed': stock_removed,
-            'reference': movement['reference_number'],
-            'received_by': movement['received_by'],
-            'running_balance': max(0, running_balance)  # Ensure balance doesn't go negative
-        })
-
     return jsonify({
-        'product_name': product_name,
-        'history': history
+        'product_name': product_row['name'],
+        'current_stock': product_row['current_stock'],
+        'history': history,
+        'next_cursor': next_cursor
     })
 
 @app.route('/api/dashboard/stats', methods=['GET'])
@@ -3083,48 +2838,42 @@ def dashboard_stats():
     conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT COUNT(*) as count FROM products WHERE status = "active"')
-    total_products = cursor.fetchone()['count']
-
-    cursor.execute('SELECT COUNT(*) as count FROM products WHERE current_stock <= min_stock_level AND status = "active"')
-    low_stock = cursor.fetchone()['count']
-
-    cursor.execute('SELECT COUNT(*) as count FROM products WHERE current_stock = 0 AND status = "active"')
-    out_of_stock = cursor.fetchone()['count']
-
-    cursor.execute('SELECT SUM(current_stock * cost_price) as value FROM products WHERE status = "active"')
-    stock_value = cursor.fetchone()['value'] or 0
-
-    cursor.execute('''
-        SELECT p.*, c.name as category_name, b.name as brand_name
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN brands b ON p.brand_id = b.id
-        WHERE p.current_stock <= p.min_stock_level AND p.status = "active"
-        ORDER BY p.current_stock ASC
-        LIMIT 10
-    ''')
-    low_stock_items = [dict(row) for row in cursor.fetchall()]
+    try:
+        summary = read_dashboard_summary(cursor)
 
-    cursor.execute('''
-        SELECT sm.*, p.name as product_name
-        FROM stock_movements sm
-        LEFT JOIN products p ON sm.product_id = p.id
-        ORDER BY sm.created_at DESC
-        LIMIT 20
-    ''')
-    recent_movements = [dict(row) for row in cursor.fetchall()]
+        def build():
+            cursor.execute('''
+                SELECT p.*, c.name as category_name, b.name as brand_name
+                FROM products p
+                LEFT JOIN categories c ON p.category_id = c.id
+                LEFT JOIN brands b ON p.brand_id = b.id
+                WHERE p.current_stock <= p.min_stock_level AND p.status = 'active'
+                ORDER BY p.current_stock ASC
+                LIMIT 10
+            ''')
+            low_stock_items = [dict(row) for row in cursor.fetchall()]
 
-    conn.close()
+            cursor.execute('''
+                SELECT sm.*, p.name as product_name
+                FROM stock_movements sm
+                LEFT JOIN products p ON sm.product_id = p.id
+                ORDER BY sm.created_at DESC
+                LIMIT 20
+            ''')
+            recent_movements = [dict(row) for row in cursor.fetchall()]
+
+            return {
+                'total_products': summary['total_products'],
+                'low_stock': summary['low_stock'],
+                'out_of_stock': summary['out_of_stock'],
+                'stock_value': round(summary['stock_value'] or 0, 2),
+                'low_stock_items': low_stock_items,
+                'recent_movements': recent_movements
+            }
 
-    return jsonify({
-        'total_products': total_products,
-        'low_stock': low_stock,
-        'out_of_stock': out_of_stock,
-        'stock_value': round(stock_value, 2),
-        'low_stock_items': low_stock_items,
-        'recent_movements': recent_movements
-    })
+        return jsonify(get_cached('stats', summary['version'], build))
+    finally:
+        conn.close()
 
 @app.route('/api/dashboard/analytics', methods=['GET'])
 @login_required
@@ -3132,109 +2881,87 @@ def dashboard_analytics():
     conn = get_db()
     cursor = conn.cursor()
 
-    # Total products
-    cursor.execute('SELECT COUNT(*) as count FROM products WHERE status = "active"')
-    total_products = cursor.fetchone()['count']
-
-    # Sales and profit for last 30 days
-    cursor.execute('''
-        SELECT
-            COALESCE(SUM(CASE WHEN transaction_type = 'sale' THEN total_amount ELSE 0 END), 0) as total_sales,
-            COALESCE(SUM(CASE WHEN transaction_type = 'return' THEN ABS(total_amount) ELSE 0 END), 0) as total_returns
-        FROM pos_sales
-        WHERE DATE(sale_date) >= DATE('now', '-30 days')
-    ''')
-    sales_data = cursor.fetchone()
-    total_sales = (sales_data['total_sales'] or 0) - (sales_data['total_returns'] or 0)
-
-    # Calculate profit (revenue - cost)
-    cursor.execute('''
-        SELECT
-            COALESCE(SUM(psi.total_price), 0) as revenue,
-            COALESCE(SUM(psi.quantity * p.cost_price), 0) as cost
-        FROM pos_sale_items psi
-        LEFT JOIN products p ON psi.product_id = p.id
-        LEFT JOIN pos_sales ps ON psi.sale_id = ps.id
-        WHERE DATE(ps.sale_date) >= DATE('now', '-30 days')
-        AND ps.transaction_type = 'sale'
-    ''')
-    profit_data = cursor.fetchone()
-    revenue = profit_data['revenue'] or 0
-    cost = profit_data['cost'] or 0
-    profit = revenue - cost
-    margin_percent = (profit / revenue * 100) if revenue > 0 else 0
-
-    # Low stock count
-    cursor.execute('SELECT COUNT(*) as count FROM products WHERE current_stock <= min_stock_level AND status = "active"')
-    low_stock_count = cursor.fetchone()['count']
-
-    # Top 5 selling products (last 30 days)
-    cursor.execute('''
-        SELECT
-            psi.product_name,
-            p.name as current_product_name,
-            b.name as brand_name,
-            SUM(psi.quantity) as total_quantity,
-            SUM(psi.total_price) as total_revenue
-        FROM pos_sale_items psi
-        LEFT JOIN pos_sales ps ON psi.sale_id = ps.id
-        LEFT JOIN products p ON psi.product_id = p.id
-        LEFT JOIN brands b ON p.brand_id = b.id
-        WHERE DATE(ps.sale_date) >= DATE('now', '-30 days')
-        AND ps.transaction_type = 'sale'
-        GROUP BY psi.product_id
-        ORDER BY total_quantity DESC
-        LIMIT 5
-    ''')
-    top_products = []
-    for row in cursor.fetchall():
-        product = dict(row)
-        product['product_name'] = product['current_product_name'] or product['product_name']
-        top_products.append(product)
-
-    # Recent POS transactions
-    cursor.execute('''
-        SELECT
-            sale_number,
-            customer_name,
-            total_amount,
-            transaction_type,
-            sale_date
-        FROM pos_sales
-        ORDER BY sale_date DESC
-        LIMIT 10
-    ''')
-    recent_transactions = [dict(row) for row in cursor.fetchall()]
-
-    # Low stock items
-    cursor.execute('''
-        SELECT p.*, c.name as category_name, b.name as brand_name
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN brands b ON p.brand_id = b.id
-        WHERE p.current_stock <= p.min_stock_level AND p.status = "active"
-        ORDER BY p.current_stock ASC
-        LIMIT 10
-    ''')
-    low_stock_items = [dict(row) for row in cursor.fetchall()]
-
-    conn.close()
+    try:
+        summary = read_dashboard_summary(cursor)
+
+        def build():
+            # Sales and profit for last 30 days from the daily rollup
+            window = read_sales_window(cursor, 30)
+            total_sales = window['total_sales'] - window['total_returns']
+            revenue = window['revenue']
+            cost = window['cost']
+            profit = revenue - cost
+            margin_percent = (profit / revenue * 100) if revenue > 0 else 0
+
+            # Top 5 selling products (last 30 days)
+            cursor.execute('''
+                SELECT
+                    psi.product_name,
+                    p.name as current_product_name,
+                    b.name as brand_name,
+                    SUM(psi.quantity) as total_quantity,
+                    SUM(psi.total_price) as total_revenue
+                FROM pos_sales ps
+                JOIN pos_sale_items psi ON psi.sale_id = ps.id
+                LEFT JOIN products p ON psi.product_id = p.id
+                LEFT JOIN brands b ON p.brand_id = b.id
+                WHERE ps.sale_date >= DATE('now', '-30 days')
+                AND ps.transaction_type = 'sale'
+                GROUP BY psi.product_id
+                ORDER BY total_quantity DESC
+                LIMIT 5
+            ''')
+            top_products = []
+            for row in cursor.fetchall():
+                product = dict(row)
+                product['product_name'] = product['current_product_name'] or product['product_name']
+                top_products.append(product)
+
+            # Recent POS transactions
+            cursor.execute('''
+                SELECT
+                    sale_number,
+                    customer_name,
+                    total_amount,
+                    transaction_type,
+                    sale_date
+                FROM pos_sales
+                ORDER BY sale_date DESC
+                LIMIT 10
+            ''')
+            recent_transactions = [dict(row) for row in cursor.fetchall()]
+
+            # Low stock items
+            cursor.execute('''
+                SELECT p.*, c.name as category_name, b.name as brand_name
+                FROM products p
+                LEFT JOIN categories c ON p.category_id = c.id
+                LEFT JOIN brands b ON p.brand_id = b.id
+                WHERE p.current_stock <= p.min_stock_level AND p.status = 'active'
+                ORDER BY p.current_stock ASC
+                LIMIT 10
+            ''')
+            low_stock_items = [dict(row) for row in cursor.fetchall()]
+
+            return {
+                'total_products': summary['total_products'],
+                'total_sales': total_sales,
+                'total_profit': profit,
+                'low_stock_count': summary['low_stock'],
+                'profit_summary': {
+                    'revenue': revenue,
+                    'cost': cost,
+                    'profit': profit,
+                    'margin_percent': margin_percent
+                },
+                'top_products': top_products,
+                'recent_transactions': recent_transactions,
+                'low_stock_items': low_stock_items
+            }
 
-    return jsonify({
-        'total_products': total_products,
-        'total_sales': total_sales,
-        'total_profit': profit,
-        'low_stock_count': low_stock_count,
-        'profit_summary': {
-            'revenue': revenue,
-            'cost': cost,
-            'profit': profit,
-            'margin_percent': margin_percent
-        },
-        'top_products': top_products,
-        'recent_transactions': recent_transactions,
-        'low_stock_items': low_stock_items
-    })
+        return jsonify(get_cached('analytics', summary['version'], build))
+    finally:
+        conn.close()
 
 @app.route('/api/dashboard/sales-chart', methods=['GET'])
 @login_required
@@ -3243,37 +2970,13 @@ def dashboard_sales_chart():
     conn = get_db()
     cursor = conn.cursor()
 
-    # Get sales and profit for each day
-    cursor.execute('''
-        SELECT
-            DATE(sale_date) as sale_day,
-            COALESCE(SUM(CASE WHEN transaction_type = 'sale' THEN total_amount ELSE -ABS(total_amount) END), 0) as daily_sales
-        FROM pos_sales
-        WHERE DATE(sale_date) >= DATE('now', '-' || ? || ' days')
-        GROUP BY DATE(sale_date)
-        ORDER BY sale_day
-    ''', (days,))
-
-    sales_by_day = {row['sale_day']: row['daily_sales'] for row in cursor.fetchall()}
-
-    # Get profit for each day
-    cursor.execute('''
-        SELECT
-            DATE(ps.sale_date) as sale_day,
-            COALESCE(SUM(psi.total_price - (psi.quantity * p.cost_price)), 0) as daily_profit
-        FROM pos_sale_items psi
-        LEFT JOIN pos_sales ps ON psi.sale_id = ps.id
-        LEFT JOIN products p ON psi.product_id = p.id
-        WHERE DATE(ps.sale_date) >= DATE('now', '-' || ? || ' days')
-        AND ps.transaction_type = 'sale'
-        GROUP BY DATE(ps.sale_date)
-        ORDER BY sale_day
-    ''', (days,))
-
-    profit_by_day = {row['sale_day']: row['daily_profit'] for row in cursor.fetchall()}
-
+    # Daily sales and profit come straight from the trigger-maintained rollup
+    daily = read_daily_sales(cursor, days)
     conn.close()
 
+    sales_by_day = {row['sale_day']: row['daily_sales'] for row in daily}
+    profit_by_day = {row['sale_day']: row['daily_profit'] for row in daily}
+
     # Generate labels and data for last N days
     from datetime import datetime, timedelta
     labels = []
@@ -3363,19 +3066,38 @@ def export_template():
             download_name='product_import_template.xlsx'
         )
 
+# Export column keys accepted by ?columns= and the SQL expression behind each
+PRODUCT_EXPORT_COLUMNS = {
+    'sku': 'p.sku',
+    'name': 'p.name',
+    'category': 'c.name',
+    'brand': 'b.name',
+    'model': 'm.name',
+    'cost_price': 'p.cost_price',
+    'selling_price': 'p.selling_price',
+    'current_stock': 'p.current_stock',
+    'status': 'p.status'
+}
+
 @app.route('/api/export/products', methods=['GET'])
 @login_required
 def export_products():
-    conn = get_db()
+    conn = read_only_connection(DATABASE)
     cursor = conn.cursor()
 
     format_type = request.args.get('format', 'excel')
     columns_param = request.args.get('columns', '')
-    selected_columns = columns_param.split(',') if columns_param else []
+    selected_columns = [col for col in columns_param.split(',') if col in PRODUCT_EXPORT_COLUMNS] if columns_param else []
+
+    # Project the requested columns in SQL so rows can be streamed as-is
+    if selected_columns:
+        projection = ', '.join(f'{PRODUCT_EXPORT_COLUMNS[col]} AS {col}' for col in selected_columns)
+    else:
+        projection = 'p.*, c.name as category_name, b.name as brand_name, m.name as model_name'
 
     # Build query based on filters
-    query = '''
-        SELECT p.*, c.name as category_name, b.name as brand_name, m.name as model_name
+    query = f'''
+        SELECT {projection}
         FROM products p
         LEFT JOIN categories c ON p.category_id = c.id
         LEFT JOIN brands b ON p.brand_id = b.id
@@ -3423,166 +3145,79 @@ def export_products():
     query += ' ORDER BY p.name'
 
     cursor.execute(query, params)
-    products = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    # Filter columns if specified
-    if selected_columns:
-        column_mapping = {
-            'sku': 'sku',
-            'name': 'name',
-            'category': 'category_name',
-            'brand': 'brand_name',
-            'model': 'model_name',
-            'cost_price': 'cost_price',
-            'selling_price': 'selling_price',
-            'current_stock': 'current_stock',
-            'status': 'status'
-        }
-
-        filtered_products = []
-        for product in products:
-            filtered_product = {}
-            for col in selected_columns:
-                if col in column_mapping:
-                    filtered_product[col] = product.get(column_mapping[col], '')
-            filtered_products.append(filtered_product)
-        products = filtered_products
-
-    df = pd.DataFrame(products)
 
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     if format_type == 'csv':
-        output = io.StringIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        return send_file(
-            io.BytesIO(output.getvalue().encode()),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'products_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        )
-    else:
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Products')
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'products_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
+        return streaming_download(csv_stream(conn, cursor), f'products_export_{timestamp}.csv', CSV_MIMETYPE)
+    return streaming_download(xlsx_stream(conn, cursor, 'Products'), f'products_export_{timestamp}.xlsx', XLSX_MIMETYPE)
 
 @app.route('/api/import/products/preview', methods=['POST'])
 @login_required
 def import_products_preview():
+    request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
     if 'file' not in request.files:
         return jsonify({'success': False, 'error': 'No file provided'}), 400
 
     file = request.files['file']
-    first_row_headers = request.form.get('first_row_headers', 'true') == 'true'
-    # update_existing = request.form.get('update_existing', 'false') == 'true'
-    skip_errors = request.form.get('skip_errors', 'true') == 'true'
-    # auto_create = request.form.get('auto_create', 'true') == 'true'
 
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-
-        total_rows = len(df)
-        preview_rows = df.head(3).fillna('').to_dict('records')
-        columns = list(df.columns)
-
-        # Basic validation
-        errors = []
-        valid_count = 0
-
-        for index, row in df.iterrows():
-            row_errors = []
-
-            if pd.isna(row.get('name')) or str(row.get('name')).strip() == '':
-                row_errors.append(f"Row {index + 2}: Product name is required")
-            else:
-                valid_count += 1
-
-            if row_errors:
-                errors.extend(row_errors)
+        staged_path = stage_upload(file)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-        return jsonify({
-            'success': True,
-            'total_rows': total_rows,
-            'preview_rows': preview_rows,
-            'columns': columns,
-            'validation': {
-                'valid_count': valid_count,
-                'error_count': len(errors),
-                'errors': errors[:50]  # Return first 50 errors
-            }
-        })
+    try:
+        # Only the first rows are read; validation runs on a leading sample
+        return jsonify({'success': True, **preview_import_file(staged_path)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        os.remove(staged_path)
+
+GRN_EXPORT_QUERY = '''
+    SELECT
+        g.grn_number,
+        g.po_number,
+        g.supplier_name,
+        g.received_date,
+        g.total_items,
+        g.total_quantity,
+        g.payment_status,
+        g.storage_location,
+        g.created_by,
+        gi.product_name,
+        gi.quantity_received,
+        gi.quantity_damaged,
+        gi.damage_reason,
+        gi.cost_price,
+        (gi.quantity_received * gi.cost_price) as line_total
+    FROM grns g
+    LEFT JOIN grn_items gi ON g.id = gi.grn_id
+'''
 
 @app.route('/api/export/grns', methods=['GET'])
 @login_required
 def export_grns():
-    conn = get_db()
+    conn = read_only_connection(DATABASE)
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT
-            g.grn_number,
-            g.po_number,
-            g.supplier_name,
-            g.received_date,
-            g.total_items,
-            g.total_quantity,
-            g.payment_status,
-            g.storage_location,
-            g.created_by,
-            gi.product_name,
-            gi.quantity_received,
-            gi.quantity_damaged,
-            gi.damage_reason,
-            gi.cost_price,
-            (gi.quantity_received * gi.cost_price) as line_total
-        FROM grns g
-        LEFT JOIN grn_items gi ON g.id = gi.grn_id
-        ORDER BY g.received_date DESC, g.grn_number
-    ''')
-
-    grn_data = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    df = pd.DataFrame(grn_data)
-
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='GRN Report')
-
-        workbook = writer.book
-        worksheet = writer.sheets['GRN Report']
-
-        # Auto-adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+    # Column widths are sized from the longest value up front, since a
+    # write-only sheet cannot be adjusted after its rows are written
+    cursor.execute(f'SELECT * FROM ({GRN_EXPORT_QUERY}) LIMIT 0')
+    columns = [column[0] for column in cursor.description]
+    cursor.execute(
+        'SELECT ' + ', '.join(f'MAX(LENGTH({column}))' for column in columns) + f' FROM ({GRN_EXPORT_QUERY})'
+    )
+    longest = cursor.fetchone()
+    column_widths = {
+        column: min(max(len(column), longest[index] or 0) + 2, 50)
+        for index, column in enumerate(columns)
+    }
 
-    output.seek(0)
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'grn_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+    cursor.execute(GRN_EXPORT_QUERY + ' ORDER BY g.received_date DESC, g.grn_number')
+    return streaming_download(
+        xlsx_stream(conn, cursor, 'GRN Report', column_widths),
+        f'grn_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+        XLSX_MIMETYPE
     )
 
 @app.route('/api/business-settings', methods=['GET', 'PUT'])
@@ -3687,189 +3322,227 @@ def business_settings():
             conn.close()
             return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/import/products', methods=['POST'])
+@app.route('/api/changes', methods=['GET'])
 @login_required
-def import_products():
-    if 'file' not in request.files:
-        return jsonify({'success': False, 'error': 'No file provided'}), 400
+def changes():
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', DEFAULT_CHANGE_LIMIT, type=int), MAX_CHANGE_LIMIT)
+    tables_param = request.args.get('tables', '')
+    tables = [table.strip() for table in tables_param.split(',') if table.strip()] if tables_param else list(TRACKED_TABLES)
+
+    unknown = [table for table in tables if table not in TRACKED_TABLES]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Untracked table(s): {', '.join(unknown)}"}), 400
+    if since < 0 or limit < 1:
+        return jsonify({'success': False, 'error': 'since must be >= 0 and limit >= 1'}), 400
+
+    conn = get_db()
+    try:
+        return jsonify(read_changes(conn, since, tables, limit))
+    except ResyncRequired as e:
+        return jsonify({'success': False, 'error': str(e), 'resync_required': True}), 410
+    finally:
+        conn.close()
+
+@app.route('/api/events', methods=['GET'])
+@login_required
+def live_updates():
+    # EventSource sends Last-Event-ID when it reconnects
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'since must be an event id'}), 400
+
+    try:
+        return event_stream_response(since)
+    except TooManyStreams as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+@app.route('/api/admin/backups', methods=['GET', 'POST'])
+@admin_required
+def backups():
+    if request.method == 'GET':
+        return jsonify(list_backups())
+
+    try:
+        manifest = create_backup()
+        deleted = prune_backups()
+    except (BackupError, sqlite3.Error, OSError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    log_audit(user_id=session.get('user_id'), action='create_backup', target_type='backup', details=f"Created backup {manifest['name']}. Pruned {len(deleted)} old backup(s).")
+    return jsonify({'success': True, 'backup': manifest, 'pruned': deleted})
+
+@app.route('/api/admin/backups/<name>/verify', methods=['POST'])
+@admin_required
+def verify_backup_route(name):
+    try:
+        manifest = verify_backup(name)
+    except BackupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'backup': manifest})
+
+@app.route('/api/admin/backups/<name>/restore', methods=['POST'])
+@admin_required
+def restore_backup_route(name):
+    try:
+        safety = restore_backup(name)
+    except BackupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    # Other workers notice the restore through the stamps restore_backup advanced
+    invalidate_dashboard_cache()
+    log_audit(user_id=session.get('user_id'), action='restore_backup', target_type='backup', details=f"Restored backup {name}. Previous data saved as {safety['name']}.")
+    return jsonify({'success': True, 'safety_backup': safety})
+
+@app.route('/api/admin/stock-snapshots', methods=['GET', 'POST'])
+@admin_required
+def stock_snapshots():
+    conn = get_db()
+    try:
+        if request.method == 'GET':
+            return jsonify(list_snapshots(conn.cursor()))
+
+        kind = (request.get_json(silent=True) or {}).get('kind', 'manual')
+        snapshot = take_snapshot(conn, kind)
+        pruned = prune_snapshots(conn)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    log_audit(user_id=session.get('user_id'), action='stock_snapshot', target_type='stock_snapshot', target_id=snapshot['id'], details=f"Took {kind} stock snapshot: {snapshot['product_count']} products, {snapshot['total_quantity']} units. Pruned {pruned} old snapshot(s).")
+    return jsonify({'success': True, 'snapshot': snapshot, 'pruned': pruned})
+
+@app.route('/api/admin/stock-reconciliation', methods=['GET', 'POST'])
+@admin_required
+def stock_reconciliation():
+    conn = get_db()
+    try:
+        if request.method == 'GET':
+            run = get_reconciliation_run(conn.cursor(), request.args.get('run_id', type=int))
+            if not run:
+                return jsonify({'success': False, 'error': 'No reconciliation run found'}), 404
+            return jsonify({'success': True, 'run': run})
+
+        apply = bool((request.get_json(silent=True) or {}).get('apply'))
+        run = reconcile_stock(conn, apply=apply, user_id=session.get('user_id'))
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+
+    log_audit(user_id=session.get('user_id'), action='stock_reconciliation', target_type='stock_reconciliation', target_id=run['id'], details=f"Reconciled {run['products_checked']} products: {run['discrepancies']} discrepancies, {run['corrected']} corrected.")
+    return jsonify({'success': True, 'run': run})
 
+def _create_import_job_from_request():
+    """Stage the uploaded file and record a pending import job; returns the job id"""
     file = request.files['file']
-    # first_row_headers = request.form.get('first_row_headers', 'true') == 'true' # Not used
     update_existing = request.form.get('update_existing', 'false') == 'true'
     skip_errors = request.form.get('skip_errors', 'true') == 'true'
     auto_create = request.form.get('auto_create', 'true') == 'true'
 
+    staged_path = stage_upload(file)
+    conn = get_db()
+    cursor = conn.cursor()
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
+        job_id = create_import_job(cursor, file.filename, staged_path, update_existing,
+                                   skip_errors, auto_create, session.get('user_id'))
+        conn.commit()
+    except Exception:
+        os.remove(staged_path)
+        raise
+    finally:
+        conn.close()
+    return job_id
 
-        conn = get_db()
-        cursor = conn.cursor()
 
-        imported = 0
-        updated = 0
-        errors = []
-        created_categories = 0
-        created_brands = 0
-        created_models = 0
-        category_cache = {}
-        brand_cache = {}
-        model_cache = {}
-
-        for index, row in df.iterrows():
-            try:
-                # Validate required fields
-                if pd.isna(row.get('name')) or str(row.get('name')).strip() == '':
-                    if skip_errors:
-                        errors.append(f"Row {index + 2}: Missing product name - skipped")
-                        continue
-                    else:
-                        raise ValueError("Product name is required")
-
-                # Auto-create category if needed (support both 'category' and 'category_name' columns)
-                category_id = None
-                category_name = row.get('category') or row.get('category_name')
-                if auto_create and not pd.isna(category_name):
-                    category_name = str(category_name).strip()
-                    if category_name:
-                        if category_name in category_cache:
-                            category_id = category_cache[category_name]
-                        else:
-                            cursor.execute('SELECT id FROM categories WHERE name = ?', (category_name,))
-                            existing = cursor.fetchone()
-                            if existing:
-                                category_id = existing['id']
-                            else:
-                                cursor.execute('INSERT INTO categories (name) VALUES (?)', (category_name,))
-                                category_id = cursor.lastrowid
-                                created_categories += 1
-                            category_cache[category_name] = category_id
-
-                # Auto-create brand if needed (support both 'brand' and 'brand_name' columns)
-                brand_id = None
-                brand_name = row.get('brand') or row.get('brand_name')
-                if auto_create and not pd.isna(brand_name):
-                    brand_name = str(brand_name).strip()
-                    if brand_name:
-                        if brand_name in brand_cache:
-                            brand_id = brand_cache[brand_name]
-                        else:
-                            cursor.execute('SELECT id FROM brands WHERE name = ?', (brand_name,))
-                            existing = cursor.fetchone()
-                            if existing:
-                                brand_id = existing['id']
-                            else:
-                                cursor.execute('INSERT INTO brands (name) VALUES (?)', (brand_name,))
-                                brand_id = cursor.lastrowid
-                                created_brands += 1
-                            brand_cache[brand_name] = brand_id
-
-                # Auto-create model if needed (support both 'model' and 'model_name' columns)
-                model_id = None
-                model_name = row.get('model') or row.get('model_name')
-                if auto_create and not pd.isna(model_name) and brand_id:
-                    model_name = str(model_name).strip()
-                    if model_name:
-                        cache_key = f"{brand_id}_{model_name}"
-                        if cache_key in model_cache:
-                            model_id = model_cache[cache_key]
-                        else:
-                            cursor.execute('SELECT id FROM models WHERE name = ? AND brand_id = ?', (model_name, brand_id))
-                            existing = cursor.fetchone()
-                            if existing:
-                                model_id = existing['id']
-                            else:
-                                cursor.execute('INSERT INTO models (name, brand_id) VALUES (?, ?)', (model_name, brand_id))
-                                model_id = cursor.lastrowid
-                                created_models += 1
-                            model_cache[cache_key] = model_id
-
-                # Check if product exists by SKU
-                existing_product = None
-                if update_existing and not pd.isna(row.get('sku')):
-                    cursor.execute('SELECT id FROM products WHERE sku = ?', (row.get('sku'),))
-                    existing_product = cursor.fetchone()
-
-                if existing_product:
-                    # Update existing product
-                    cursor.execute('''
-                        UPDATE products SET
-                            name = ?, category_id = ?, brand_id = ?, model_id = ?, description = ?,
-                            cost_price = ?, selling_price = ?, mrp = ?,
-                            current_stock = ?, min_stock_level = ?, status = ?,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    ''', (
-                        row.get('name'), category_id, brand_id, model_id,
-                        row.get('description', ''),
-                        float(row.get('cost_price', 0) or 0),
-                        float(row.get('selling_price', 0) or 0),
-                        float(row.get('mrp', 0) or 0),
-                        int(row.get('current_stock', 0) or 0),
-                        int(row.get('min_stock_level', 10) or 10),
-                        row.get('status', 'active'),
-                        existing_product['id']
-                    ))
-                    updated += 1
-                else:
-                    # Insert new product
-                    cursor.execute('''
-                        INSERT INTO products (
-                            sku, name, category_id, brand_id, model_id, description,
-                            cost_price, selling_price, mrp, current_stock, opening_stock,
-                            min_stock_level, storage_location, imei, color,
-                            storage_capacity, ram, warranty_period, supplier_name,
-                            supplier_contact, status
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        row.get('sku'), row.get('name'), category_id, brand_id, model_id,
-                        row.get('description', ''),
-                        float(row.get('cost_price', 0) or 0),
-                        float(row.get('selling_price', 0) or 0),
-                        float(row.get('mrp', 0) or 0),
-                        int(row.get('current_stock', 0) or 0),
-                        int(row.get('current_stock', 0) or 0),
-                        int(row.get('min_stock_level', 10) or 10),
-                        row.get('storage_location', ''),
-                        row.get('imei', ''),
-                        row.get('color', ''),
-                        row.get('storage_capacity', ''),
-                        row.get('ram', ''),
-                        row.get('warranty_period', ''),
-                        row.get('supplier_name', ''),
-                        row.get('supplier_contact', ''),
-                        row.get('status', 'active')
-                    ))
-                    imported += 1
-
-            except Exception as e:
-                error_msg = f"Row {index + 2}: {str(e)}"
-                if skip_errors:
-                    errors.append(error_msg)
-                else:
-                    conn.rollback()
-                    conn.close()
-                    return jsonify({'success': False, 'error': error_msg}), 400
+def _log_import_job(job):
+    log_audit(user_id=session.get('user_id'), action='import_products', target_type='import_job', target_id=job['id'], details=f"Imported: {job['imported']}, Updated: {job['updated']}, Created Categories: {job['created_categories']}, Brands: {job['created_brands']}, Models: {job['created_models']}. Errors: {job['error_count']}.")
 
-        conn.commit()
-        conn.close()
 
-        log_audit(user_id=session.get('user_id'), action='import_products', details=f"Imported: {imported}, Updated: {updated}, Created Categories: {created_categories}, Brands: {created_brands}, Models: {created_models}. Errors: {len(errors)}.")
+@app.route('/api/import/products', methods=['POST'])
+@login_required
+def import_products():
+    request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file provided'}), 400
 
-        return jsonify({
-            'success': True,
-            'imported': imported,
-            'updated': updated,
-            'created_categories': created_categories,
-            'created_brands': created_brands,
-            'created_models': created_models,
-            'errors': errors
-        })
+    # Import jobs run in the import slots; this one runs in the request, so the request holds it
+    g.admission_slot = acquire_slot('import')
+    try:
+        # Same job pipeline as /api/import/jobs, run to completion in this request
+        job = run_import_job(_create_import_job_from_request())
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if job['status'] != 'completed':
+        return jsonify({'success': False, 'error': job['error_message'], 'job_id': job['id']}), 400
+
+    _log_import_job(job)
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'imported': job['imported'],
+        'updated': job['updated'],
+        'created_categories': job['created_categories'],
+        'created_brands': job['created_brands'],
+        'created_models': job['created_models'],
+        'errors': job['errors']
+    })
+
+@app.route('/api/import/jobs', methods=['POST'])
+@login_required
+def create_import_job_route():
+    request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file provided'}), 400
+
+    # Taken before the job is created, so a full import class leaves no job behind
+    g.admission_slot = acquire_slot('import')
+    try:
+        job_id = _create_import_job_from_request()
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+    # The job thread holds the slot from here and releases it when the job ends
+    start_import_job(job_id, g.pop('admission_slot'))
+    log_audit(user_id=session.get('user_id'), action='start_import_job', target_type='import_job', target_id=job_id, details=f"Started import job for {request.files['file'].filename}.")
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+@app.route('/api/import/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def import_job_status(job_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    job = get_import_job(cursor, job_id)
+    conn.close()
+
+    if not job:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/import/jobs/<int:job_id>/resume', methods=['POST'])
+@login_required
+def resume_import_job(job_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    job = get_import_job(cursor, job_id)
+    conn.close()
+
+    if not job:
+        return jsonify({'success': False, 'error': 'Import job not found'}), 404
+    if not is_resumable(job):
+        return jsonify({'success': False, 'error': f"Import job is {job['status']} and cannot be resumed"}), 400
+
+    start_import_job(job_id, acquire_slot('import'))
+    log_audit(user_id=session.get('user_id'), action='resume_import_job', target_type='import_job', target_id=job_id, details=f"Resumed import job at row {job['committed_rows']}.")
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
 @app.route('/api/pos/sales', methods=['GET', 'POST'])
 @login_required
 def pos_sales():
@@ -3975,7 +3648,6 @@ def pos_sales():
                 imei_ids = item.get('imei_ids', [])
                 manual_imeis = item.get('manual_imeis', [])
                 imei_string = None
-                created_imei_ids = []
 
                 # Handle selected IMEIs (from inventory)
                 if imei_ids:
@@ -4001,27 +3673,17 @@ def pos_sales():
                     if len(manual_imeis) != quantity:
                         raise ValueError(f'Number of manual IMEIs ({len(manual_imeis)}) must match quantity ({quantity}) for {product["name"]}')
 
-                    # Validate IMEI format (15 digits)
-                    for imei in manual_imeis:
-                        imei_clean = imei.strip()
-                        if not imei_clean or len(imei_clean) != 15 or not imei_clean.isdigit():
-                            raise ValueError(f'Invalid IMEI format: {imei_clean}. IMEI must be exactly 15 digits.')
-
-                    # Check for duplicates within the payload
-                    if len(manual_imeis) != len(set(manual_imeis)):
-                        raise ValueError(f'Duplicate IMEIs found in the submission for {product["name"]}')
-
-                    # Create new IMEI records and mark as sold immediately
-                    for imei in manual_imeis:
-                        try:
-                            cursor.execute('''
-                                INSERT INTO product_imei (
-                                    product_id, imei, status, sale_id, sold_date, received_date
-                                ) VALUES (?, ?, ?, ?, ?, ?)
-                            ''', (product_id, imei.strip(), 'sold', sale_id, datetime.now(), datetime.now()))
-                            created_imei_ids.append(cursor.lastrowid)
-                        except sqlite3.IntegrityError:
-                            raise ValueError(f'IMEI {imei} already exists in the system. Cannot use duplicate IMEI.')
+                    if not all((imei or '').strip() for imei in manual_imeis):
+                        raise ValueError(f'Blank IMEI entered for {product["name"]}')
+
+                    # Validate and create new IMEI records, marked as sold immediately
+                    try:
+                        manual_imeis = [entry['imei'] for entry in ingest_imeis(
+                            cursor, product_id, manual_imeis, status='sold',
+                            sale_id=sale_id, sold_date=datetime.now(), received_date=datetime.now()
+                        )]
+                    except ImeiRejected as e:
+                        raise ValueError(f'{product["name"]}: {e}')
 
                     # Store comma-separated IMEI numbers for display
                     imei_string = ','.join(manual_imeis)
@@ -4129,42 +3791,14 @@ def pos_sales():
         finally:
             conn.close()
 
-    else: # GET request - List all sales
-        cursor.execute('''
-            SELECT * FROM pos_sales
-            ORDER BY created_at DESC
-            LIMIT 100
-        ''')
-        sales = [dict(row) for row in cursor.fetchall()]
+    else: # GET request - List sales, newest first
         conn.close()
-        return jsonify(sales)
+        return _list_response('pos_sales')
 
 @app.route('/api/pos/sales/<int:id>', methods=['GET'])
 @login_required
 def get_pos_sale(id):
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT * FROM pos_sales WHERE id = ?', (id,))
-    sale = cursor.fetchone()
-
-    if not sale:
-        conn.close()
-        return jsonify({'error': 'Sale not found'}), 404
-
-    sale_dict = dict(sale)
-
-    cursor.execute('''
-        SELECT psi.*, p.sku, p.brand_id, p.category_id
-        FROM pos_sale_items psi
-        LEFT JOIN products p ON psi.product_id = p.id
-        WHERE psi.sale_id = ?
-    ''', (id,))
-
-    sale_dict['items'] = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    return jsonify(sale_dict)
+    return _detail_response('pos_sale', id, 'Sale not found')
 
 @app.route('/api/pos/products/search', methods=['GET'])
 @login_required
@@ -4285,27 +3919,8 @@ def customers():
             conn.close()
             return jsonify({'success': False, 'error': str(e)}), 500
     else:
-        search = request.args.get('search', '')
-        status = request.args.get('status', '')
-
-        query = 'SELECT * FROM customers WHERE 1=1'
-        params = []
-
-        if search:
-            query += ' AND (name LIKE ? OR phone LIKE ? OR email LIKE ?)'
-            search_param = f'%{search}%'
-            params.extend([search_param, search_param, search_param])
-
-        if status:
-            query += ' AND status = ?'
-            params.append(status)
-
-        query += ' ORDER BY name'
-
-        cursor.execute(query, params)
-        customers = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        return jsonify(customers)
+        return _list_response('customers')
 
 @app.route('/api/customers/lookup/<phone>', methods=['GET'])
 @login_required
@@ -4436,10 +4051,8 @@ def technicians():
             conn.close()
             return jsonify({'success': False, 'error': str(e)}), 400
     else:
-        cursor.execute('SELECT * FROM technicians ORDER BY name')
-        techs = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        return jsonify(techs)
+        return _list_response('technicians')
 
 @app.route('/api/technicians/<int:id>', methods=['PUT', 'DELETE'])
 @login_required
@@ -4534,32 +4147,36 @@ def service_jobs():
         finally:
             conn.close()
     else:
-        status = request.args.get('status', '')
-        search = request.args.get('search', '')
-
-        query = '''
-            SELECT sj.*, t.name as technician_name
-            FROM service_jobs sj
-            LEFT JOIN technicians t ON sj.technician_id = t.id
-            WHERE 1=1
-        '''
-        params = []
+        conn.close()
+        return _list_response('service_jobs')
 
-        if status:
-            query += ' AND sj.status = ?'
-            params.append(status)
+@app.route('/api/service-jobs/search', methods=['GET'])
+@login_required
+def service_job_search():
+    """Ranked prefix search over job number, customer, phone, IMEI, device, problem and notes"""
+    limit = min(request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT)
+    if limit < 1:
+        return jsonify({'success': False, 'error': 'limit must be >= 1'}), 400
 
-        if search:
-            query += ' AND (sj.job_number LIKE ? OR sj.customer_name LIKE ? OR sj.customer_phone LIKE ? OR sj.imei_number LIKE ?)'
-            search_param = f'%{search}%'
-            params.extend([search_param] * 4)
+    conn = get_db()
+    try:
+        return jsonify(search_service_jobs(conn.cursor(), request.args.get('q', ''), limit))
+    finally:
+        conn.close()
 
-        query += ' ORDER BY sj.created_at DESC'
+@app.route('/api/service-board', methods=['GET'])
+@login_required
+def service_board():
+    months = request.args.get('months', DEFAULT_TURNAROUND_MONTHS, type=int)
+    overdue_limit = min(request.args.get('overdue_limit', DEFAULT_OVERDUE_LIMIT, type=int), 500)
+    if months < 1 or overdue_limit < 0:
+        return jsonify({'success': False, 'error': 'months must be >= 1 and overdue_limit >= 0'}), 400
 
-        cursor.execute(query, params)
-        jobs = [dict(row) for row in cursor.fetchall()]
+    conn = get_db()
+    try:
+        return jsonify(read_service_board(conn.cursor(), months, overdue_limit))
+    finally:
         conn.close()
-        return jsonify(jobs)
 
 @app.route('/api/service-jobs/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
@@ -4568,44 +4185,8 @@ def service_job_detail(id):
     cursor = conn.cursor()
 
     if request.method == 'GET':
-        cursor.execute('''
-            SELECT sj.*, t.name as technician_name
-            FROM service_jobs sj
-            LEFT JOIN technicians t ON sj.technician_id = t.id
-            WHERE sj.id = ?
-        ''', (id,))
-        job = cursor.fetchone()
-
-        if not job:
-            conn.close()
-            return jsonify({'error': 'Job not found'}), 404
-
-        job_dict = dict(job)
-
-        # Get parts used
-        cursor.execute('''
-            SELECT spu.*, p.name as product_name
-            FROM service_parts_used spu
-            LEFT JOIN products p ON spu.product_id = p.id
-            WHERE spu.job_id = ?
-        ''', (id,))
-        job_dict['parts_used'] = [dict(row) for row in cursor.fetchall()]
-
-        # Get labor charges
-        cursor.execute('''
-            SELECT * FROM service_labor_charges WHERE job_id = ?
-        ''', (id,))
-        job_dict['labor_charges'] = [dict(row) for row in cursor.fetchall()]
-
-        # Get status history
-        cursor.execute('''
-            SELECT * FROM service_status_history WHERE job_id = ?
-            ORDER BY created_at DESC
-        ''', (id,))
-        job_dict['status_history'] = [dict(row) for row in cursor.fetchall()]
-
         conn.close()
-        return jsonify(job_dict)
+        return _detail_response('service_job', id, 'Job not found')
 
     elif request.method == 'PUT':
         data = request.json
@@ -4653,8 +4234,9 @@ def service_job_detail(id):
 
     elif request.method == 'DELETE':
         try:
-            # Check for dependencies (e.g., associated parts, labor, history)
-            cursor.execute('DELETE FROM service_parts_used WHERE job_id = ?', (id,))
+            # Check for dependencies (e.g., associated parts, labor, history);
+            # parts go back to stock through the ledger
+            release_service_parts(cursor, id)
             cursor.execute('DELETE FROM service_labor_charges WHERE job_id = ?', (id,))
             cursor.execute('DELETE FROM service_status_history WHERE job_id = ?', (id,))
 
@@ -4675,58 +4257,31 @@ def service_job_detail(id):
 @app.route('/api/service-jobs/<int:job_id>/parts', methods=['POST'])
 @login_required
 def add_service_parts(job_id):
-    conn = get_db()
-    cursor = conn.cursor()
     data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'Invalid request data'}), 400
 
-    try:
-        product_id = data.get('product_id')
-        part_name = data.get('part_name')
-        quantity = data.get('quantity')
-        unit_price = data.get('unit_price')
-
-        if not part_name or not quantity or not unit_price:
-            return jsonify({'success': False, 'error': 'Part name, quantity, and unit price are required.'}), 400
-
-        if not isinstance(quantity, int) or quantity <= 0:
-            return jsonify({'success': False, 'error': 'Quantity must be a positive integer.'}), 400
-
-        total_price = quantity * unit_price
-
-        cursor.execute('''
-            INSERT INTO service_parts_used (job_id, product_id, part_name, quantity, unit_price, total_price)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (job_id, product_id, part_name, quantity, unit_price, total_price))
-        part_id = cursor.lastrowid
-
-                # Update product stock if product_id provided and it's a valid product
-        if product_id:
-            # Verify product exists and has enough stock before deducting
-            cursor.execute('SELECT current_stock, name FROM products WHERE id = ?', (product_id,))
-            product = cursor.fetchone()
-            if not product:
-                raise ValueError(f"Product ID {product_id} not found for part '{part_name}'.")
-
-            if product['current_stock'] < quantity:
-                raise ValueError(f"Insufficient stock for product '{product['name']}'. Available: {product['current_stock']}, Requested: {quantity}.")
-
-            cursor.execute('''
-                UPDATE products SET current_stock = current_stock - ?
-                WHERE id = ?
-            ''', (quantity, product_id))
+    # A batch {"parts": [...]} or a single part
+    parts = data['parts'] if 'parts' in data else [data]
+    if not isinstance(parts, list) or not all(isinstance(part, dict) for part in parts):
+        return jsonify({'success': False, 'error': 'Parts must be a list of parts'}), 400
 
-        conn.commit()
-        log_audit(user_id=session.get('user_id'), action='add_service_part', target_type='service_job', target_id=job_id, details=f"Added part '{part_name}' (Qty: {quantity}) to Service Job ID {job_id}.")
-        return jsonify({'success': True, 'id': part_id})
+    conn = get_db()
+    try:
+        part_ids = consume_service_parts(conn, job_id, parts)
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
     except ValueError as e: # Catch specific validation errors
-        conn.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 400
-    except Exception as e:
-        conn.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
     finally:
         conn.close()
 
+    summary = ', '.join(f"'{part['part_name']}' (Qty: {part['quantity']})" for part in parts)
+    log_audit(user_id=session.get('user_id'), action='add_service_part', target_type='service_job', target_id=job_id, details=f"Added part(s) {summary} to Service Job ID {job_id}.")
+    if 'parts' in data:
+        return jsonify({'success': True, 'ids': part_ids})
+    return jsonify({'success': True, 'id': part_ids[0]})
+
 @app.route('/api/service-jobs/<int:job_id>/parts/<int:part_id>', methods=['DELETE'])
 @login_required
 def delete_service_part(job_id, part_id):
@@ -4734,22 +4289,13 @@ def delete_service_part(job_id, part_id):
     cursor = conn.cursor()
 
     try:
-        # Get part details before deleting for stock restoration and audit log
-        cursor.execute('SELECT product_id, quantity, part_name FROM service_parts_used WHERE id = ? AND job_id = ?', (part_id, job_id))
-        part = cursor.fetchone()
-
-        if not part:
+        # Puts the stock back through the ledger and frees any IMEIs
+        parts = release_service_parts(cursor, job_id, [part_id])
+        if not parts:
             return jsonify({'success': False, 'error': 'Part not found for this job'}), 404
 
-        # Restore stock if a product_id was associated
-        if part['product_id']:
-            cursor.execute('''
-                UPDATE products SET current_stock = current_stock + ?
-                WHERE id = ?
-            ''', (part['quantity'], part['product_id']))
-
-        cursor.execute('DELETE FROM service_parts_used WHERE id = ?', (part_id,))
         conn.commit()
+        part = parts[0]
         log_audit(user_id=session.get('user_id'), action='delete_service_part', target_type='service_job', target_id=job_id, details=f"Deleted part '{part['part_name']}' (Qty: {part['quantity']}) from Service Job ID {job_id}.")
         return jsonify({'success': True})
     except Exception as e:
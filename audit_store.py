@@ -0,0 +1,180 @@
+"""Audit log storage: indexes, keyset pagination, cached counts and archival.
+
+``audit_log`` is the single audit store. Entries are read newest first by
+``id`` (which grows with time), so a page is an index range scan no matter
+how deep the reader has scrolled. Months older than the retention window are
+moved to an attached archive database, which keeps them queryable without
+weighing on the live table.
+
+Usage:
+    python audit_store.py archive [months]
+"""
+import sqlite3
+import threading
+import time
+
+from backup import read_restore_epoch
+
+DATABASE = 'inventory.db'
+ARCHIVE_DATABASE = 'audit_archive.db'
+
+AUDIT_RETENTION_MONTHS = 12
+ARCHIVE_BATCH = 5000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+COUNT_CACHE_TTL_SECONDS = 60
+
+AUDIT_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    action TEXT NOT NULL,
+    target_type TEXT,
+    target_id INTEGER,
+    details TEXT,
+    ip_address TEXT,
+    device_info TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+'''
+
+_count_lock = threading.Lock()
+_count_cache = {}
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_audit_store(cursor):
+    """Add request columns and indexes to audit_log"""
+    cursor.execute('PRAGMA table_info(audit_log)')
+    columns = [column[1] for column in cursor.fetchall()]
+    for column in ('ip_address', 'device_info'):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE audit_log ADD COLUMN {column} TEXT')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log(user_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_action ON audit_log(action, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp)')
+
+
+def _filters(user_id=None, action=None, start_date=None, end_date=None, alias=''):
+    clauses, params = [], []
+    if user_id:
+        clauses.append(f'{alias}user_id = ?')
+        params.append(user_id)
+    if action:
+        clauses.append(f'{alias}action = ?')
+        params.append(action)
+    if start_date:
+        clauses.append(f'{alias}timestamp >= ?')
+        params.append(start_date)
+    if end_date:
+        # A bare date includes that whole day
+        clauses.append(f"{alias}timestamp < DATE(?, '+1 day')" if len(end_date) == 10 else f'{alias}timestamp <= ?')
+        params.append(end_date)
+    return clauses, params
+
+
+def query_audit_logs(cursor, before_id=None, limit=DEFAULT_PAGE_SIZE, **filters):
+    """One page of entries older than ``before_id``, newest first.
+
+    Returns ``(logs, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    clauses, params = _filters(alias='al.', **filters)
+    if before_id:
+        clauses.append('al.id < ?')
+        params.append(before_id)
+    where = ' AND '.join(clauses) or '1=1'
+
+    cursor.execute(f'''
+        SELECT al.*, al.action AS action_type, al.details AS description, al.timestamp AS created_at,
+               u.username, u.full_name AS user_name
+        FROM audit_log al
+        LEFT JOIN users u ON al.user_id = u.id
+        WHERE {where}
+        ORDER BY al.id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    logs = [dict(row) for row in cursor.fetchall()]
+
+    next_cursor = logs[limit - 1]['id'] if len(logs) > limit else None
+    return logs[:limit], next_cursor
+
+
+def count_audit_logs(cursor, **filters):
+    """Entry count for a filter, cached per worker for COUNT_CACHE_TTL_SECONDS"""
+    clauses, params = _filters(**filters)
+    key = tuple(sorted((name, value) for name, value in filters.items() if value))
+    now = time.monotonic()
+    epoch = read_restore_epoch(cursor)
+    with _count_lock:
+        cached = _count_cache.get(key)
+    if cached and now - cached[1] < COUNT_CACHE_TTL_SECONDS and cached[2] == epoch:
+        return cached[0]
+
+    cursor.execute(f"SELECT COUNT(*) AS total FROM audit_log WHERE {' AND '.join(clauses) or '1=1'}", params)
+    total = cursor.fetchone()['total']
+    with _count_lock:
+        if len(_count_cache) > 1000:
+            _count_cache.clear()
+        _count_cache[key] = (total, now, epoch)
+    return total
+
+
+def archive_audit_logs(conn, months=AUDIT_RETENTION_MONTHS, archive_path=ARCHIVE_DATABASE):
+    """Move entries older than ``months`` whole months into the archive database.
+
+    Work is committed one batch at a time so the live table is never locked
+    for long. Returns the number of entries moved.
+    """
+    cursor = conn.cursor()
+    cursor.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+    try:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS archive.audit_log ({AUDIT_COLUMNS})')
+        cursor.execute('CREATE INDEX IF NOT EXISTS archive.idx_audit_log_timestamp ON audit_log(timestamp)')
+        cursor.execute("SELECT DATE('now', 'start of month', ?) AS cutoff", (f'-{months} months',))
+        cutoff = cursor.fetchone()['cutoff']
+
+        moved = 0
+        while True:
+            cursor.execute('''
+                SELECT MAX(id) AS last_id FROM (
+                    SELECT id FROM main.audit_log WHERE timestamp < ? ORDER BY id LIMIT ?
+                )
+            ''', (cutoff, ARCHIVE_BATCH))
+            batch = cursor.fetchone()
+            if batch['last_id'] is None:
+                break
+
+            cursor.execute('BEGIN')
+            cursor.execute('''
+                INSERT OR IGNORE INTO archive.audit_log (id, user_id, action, target_type, target_id, details, ip_address, device_info, timestamp)
+                SELECT id, user_id, action, target_type, target_id, details, ip_address, device_info, timestamp
+                FROM main.audit_log WHERE timestamp < ? AND id <= ?
+            ''', (cutoff, batch['last_id']))
+            cursor.execute('DELETE FROM main.audit_log WHERE timestamp < ? AND id <= ?', (cutoff, batch['last_id']))
+            moved += cursor.rowcount
+            conn.commit()
+    except Exception:
+        # Batches already committed stay moved; a half-done one is undone
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute('DETACH DATABASE archive')
+    return moved
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'archive':
+        print(__doc__)
+        sys.exit(1)
+
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else AUDIT_RETENTION_MONTHS
+    conn = get_db()
+    moved = archive_audit_logs(conn, months)
+    conn.close()
+    print(f"📦 Archived {moved} audit entries older than {months} months to {ARCHIVE_DATABASE}")
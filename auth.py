@@ -1,9 +1,11 @@
 from functools import wraps
-from flask import session, redirect, url_for, request, jsonify
+from flask import session, redirect, url_for, request, jsonify, g, has_request_context
 import sqlite3
-import bcrypt
 from datetime import datetime
 
+from permission_cache import get_user_record, list_user_permissions
+from password_hashing import verify_password, needs_rehash, schedule_rehash
+
 def get_db():
     conn = sqlite3.connect('inventory.db')
     conn.row_factory = sqlite3.Row
@@ -11,80 +13,95 @@ def get_db():
 
 def log_audit(user_id, action, target_type=None, target_id=None, details=None):
     """Log an audit event to the database"""
+    ip_address = device_info = None
+    if has_request_context():
+        ip_address = request.remote_addr
+        device_info = request.headers.get('User-Agent')
+
     conn = get_db()
     cursor = conn.cursor()
 
     try:
         cursor.execute('''
-            INSERT INTO audit_log (user_id, action, target_type, target_id, details)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, action, target_type, target_id, details))
+            INSERT INTO audit_log (user_id, action, target_type, target_id, details, ip_address, device_info)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, action, target_type, target_id, details, ip_address, device_info))
         conn.commit()
     except Exception as e:
         print(f"Error logging audit: {e}")
     finally:
         conn.close()
 
-def check_permission(permission_key):
-    """Check if current user has specific permission"""
-    if 'user_id' not in session:
-        return False
+def log_audit_many(user_id, action, target_type, entries):
+    """Log one audit event per ``(target_id, details)`` in ``entries`` with a single commit"""
+    if not entries:
+        return
+    ip_address = device_info = None
+    if has_request_context():
+        ip_address = request.remote_addr
+        device_info = request.headers.get('User-Agent')
 
     conn = get_db()
     cursor = conn.cursor()
-    try:
-        # Check if user is admin - admins have all permissions
-        cursor.execute('''
-            SELECT r.name as role_name
-            FROM users u
-            JOIN roles r ON u.role_id = r.id
-            WHERE u.id = ?
-        ''', (session['user_id'],))
-        role_result = cursor.fetchone()
-
-        if role_result and role_result['role_name'] == 'Admin':
-            return True
 
-        # Otherwise check specific permission
-        cursor.execute('''
-            SELECT COUNT(*) as count
-            FROM role_permissions rp
-            JOIN permissions p ON rp.permission_id = p.id
-            JOIN users u ON u.role_id = rp.role_id
-            WHERE u.id = ? AND p.permission_key = ?
-        ''', (session['user_id'], permission_key))
-        result = cursor.fetchone()
-        return result['count'] > 0
+    try:
+        cursor.executemany('''
+            INSERT INTO audit_log (user_id, action, target_type, target_id, details, ip_address, device_info)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(user_id, action, target_type, target_id, details, ip_address, device_info)
+              for target_id, details in entries])
+        conn.commit()
+    except Exception as e:
+        print(f"Error logging audit: {e}")
     finally:
         conn.close()
 
+def current_user():
+    """Resolve the session to its cached user record, once per request.
+
+    Returns None when there is no session or the user has been deleted,
+    deactivated or locked since logging in.
+    """
+    if '_current_user' in g:
+        return g._current_user
+
+    user = None
+    if 'user_id' in session:
+        user = get_user_record(session['user_id'])
+        if user is None or not user['active']:
+            # The account changed under a live session; end it
+            session.clear()
+            user = None
+    g._current_user = user
+    return user
+
+def check_permission(permission_key):
+    """Check if current user has specific permission"""
+    user = current_user()
+    if user is None:
+        return False
+
+    # Admins have all permissions
+    return user['is_admin'] or permission_key in user['permissions']
+
 def get_user_permissions():
     """Get all permissions for current user"""
-    if 'user_id' not in session:
+    user = current_user()
+    if user is None:
         return []
 
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            SELECT DISTINCT p.permission_key, p.permission_name, p.module
-            FROM role_permissions rp
-            JOIN permissions p ON rp.permission_id = p.id
-            JOIN users u ON u.role_id = rp.role_id
-            WHERE u.id = ?
-            ORDER BY p.module, p.permission_name
-        ''', (session['user_id'],))
-        return [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
+    return list_user_permissions(user['id'])
+
+def _authentication_required():
+    if request.path.startswith('/api/') or request.is_json:
+        return jsonify({'error': 'Authentication required'}), 401
+    return redirect(url_for('index'))
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            if request.is_json:
-                return jsonify({'error': 'Authentication required'}), 401
-            return redirect(url_for('index'))
+        if current_user() is None:
+            return _authentication_required()
         return f(*args, **kwargs)
     return decorated_function
 
@@ -93,15 +110,11 @@ def permission_required(permission_key):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
-                if request.is_json:
-                    return jsonify({'error': 'Authentication required'}), 401
-                return redirect(url_for('index'))
+            if current_user() is None:
+                return _authentication_required()
 
             if not check_permission(permission_key):
-                if request.is_json:
-                    return jsonify({'error': 'Permission denied'}), 403
-                return jsonify({'error': 'You do not have permission to perform this action'}), 403
+                return jsonify({'error': 'Permission denied'}), 403
 
             return f(*args, **kwargs)
         return decorated_function
@@ -111,28 +124,12 @@ def admin_required(f):
     """Decorator to restrict access to admin users only"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            if request.is_json:
-                return jsonify({'error': 'Authentication required'}), 401
-            return redirect(url_for('index'))
-
-        conn = get_db()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                SELECT r.name as role_name
-                FROM users u
-                JOIN roles r ON u.role_id = r.id
-                WHERE u.id = ?
-            ''', (session['user_id'],))
-            result = cursor.fetchone()
-
-            if not result or result['role_name'] != 'Admin':
-                if request.is_json:
-                    return jsonify({'error': 'Admin access required'}), 403
-                return jsonify({'error': 'Admin access required'}), 403
-        finally:
-            conn.close()
+        user = current_user()
+        if user is None:
+            return _authentication_required()
+
+        if not user['is_admin']:
+            return jsonify({'error': 'Admin access required'}), 403
 
         return f(*args, **kwargs)
     return decorated_function
@@ -169,8 +166,11 @@ def authenticate_user(username, password):
             log_audit(user['id'], 'account_locked', details='Account locked due to multiple failed login attempts')
             return None, "Account locked due to multiple failed login attempts"
 
-        # Verify password
-        if bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        # Verify password on the bounded bcrypt pool; raises HashingBusy when saturated
+        if verify_password(password, user['password_hash']):
+            if needs_rehash(user['password_hash']):
+                schedule_rehash(user['id'], password)
+
             # Reset failed attempts on successful login
             cursor.execute('''
                 UPDATE users 
@@ -0,0 +1,326 @@
+"""Online database backups built on SQLite's backup API.
+
+Snapshots are copied page batch by page batch from a live connection, checked
+with ``PRAGMA integrity_check``, gzip-compressed and stored next to a JSON
+manifest holding their checksum. Restores decompress a verified snapshot and
+copy it into the live database through the same backup API, so connections
+held by the running app stay valid.
+
+Usage:
+    python backup.py create
+    python backup.py list
+    python backup.py verify <name>
+    python backup.py restore <name>
+    python backup.py prune
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+DATABASE = 'inventory.db'
+BACKUP_FOLDER = 'backups'
+
+# Pages copied per step; the source is only read-locked while a step runs
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.01
+# A write from another connection restarts a paced backup; after this many
+# restarts the remaining copy is done in a single step
+BACKUP_MAX_RESTARTS = 3
+
+# Retention: every snapshot from the most recent BACKUP_KEEP_RECENT, plus the
+# newest snapshot of each of the last BACKUP_KEEP_DAYS days
+BACKUP_KEEP_RECENT = 24
+BACKUP_KEEP_DAYS = 30
+
+
+# Single-row version stamps (table, column) that per-worker caches compare
+# against. A restore moves each past its pre-restore value, so every worker
+# reloads rather than serving data from the replaced database.
+RESTORE_STAMPS = (
+    ('auth_version', 'version'),
+    ('dashboard_summary', 'version'),
+    ('restore_epoch', 'epoch'),
+)
+
+
+class BackupError(Exception):
+    """Raised when a snapshot is missing, corrupt or fails verification"""
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def init_backup(cursor):
+    """Create the restore epoch, the stamp of caches that have no version of their own"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS restore_epoch (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO restore_epoch (id, epoch) VALUES (1, 0)')
+
+
+def read_restore_epoch(cursor):
+    """Number of restores into this database; moves whenever its contents are replaced"""
+    cursor.execute('SELECT epoch FROM restore_epoch WHERE id = 1')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _read_stamps(conn):
+    tables = _tables(conn)
+    stamps = {}
+    for table, column in RESTORE_STAMPS:
+        row = conn.execute(f'SELECT {column} FROM {table} WHERE id = 1').fetchone() if table in tables else None
+        stamps[table] = row[0] if row else 0
+    return stamps
+
+
+def _advance_stamps(conn, stamps):
+    """Set ``conn``'s stamps past ``stamps`` (those of the database it will replace)"""
+    init_backup(conn.cursor())
+    tables = _tables(conn)
+    for table, column in RESTORE_STAMPS:
+        if table in tables:
+            conn.execute(f'UPDATE {table} SET {column} = MAX({column}, ?) + 1 WHERE id = 1', (stamps[table],))
+    conn.commit()
+
+
+def _snapshot_path(name):
+    if os.path.basename(name) != name or not name.endswith('.db.gz'):
+        raise BackupError(f'Invalid backup name: {name}')
+    path = os.path.join(BACKUP_FOLDER, name)
+    if not os.path.exists(path):
+        raise BackupError(f'Backup not found: {name}')
+    return path
+
+
+def _manifest_path(snapshot_path):
+    return snapshot_path[:-len('.db.gz')] + '.json'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_database(source, target):
+    """Copy ``source`` into ``target`` without holding a long read lock"""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_SLEEP)
+    except _BackupRestarted:
+        source.backup(target)
+    return restarts
+
+
+def _integrity_check(conn):
+    result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    return result == 'ok', result
+
+
+def create_backup(database=DATABASE):
+    """Take a compressed, verified snapshot of the live database; returns its manifest"""
+    os.makedirs(BACKUP_FOLDER, exist_ok=True)
+    created_at = datetime.now()
+    stem = f"inventory_{created_at.strftime('%Y%m%d_%H%M%S')}"
+    name = f"{stem}.db.gz"
+    suffix = 1
+    while os.path.exists(os.path.join(BACKUP_FOLDER, name)):
+        suffix += 1
+        name = f"{stem}_{suffix}.db.gz"
+    snapshot_path = os.path.join(BACKUP_FOLDER, name)
+
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=BACKUP_FOLDER)
+    os.close(fd)
+    try:
+        source = sqlite3.connect(database)
+        target = sqlite3.connect(raw_path)
+        try:
+            restarts = _copy_database(source, target)
+            ok, result = _integrity_check(target)
+            page_count = target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if not ok:
+            raise BackupError(f'Snapshot failed integrity check: {result}')
+
+        raw_size = os.path.getsize(raw_path)
+        with open(raw_path, 'rb') as raw, gzip.open(snapshot_path + '.part', 'wb', compresslevel=6) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+        os.replace(snapshot_path + '.part', snapshot_path)
+    finally:
+        os.remove(raw_path)
+
+    manifest = {
+        'name': name,
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'database_size': raw_size,
+        'compressed_size': os.path.getsize(snapshot_path),
+        'page_count': page_count,
+        'sha256': _sha256(snapshot_path),
+        'restarts': restarts,
+        'integrity': 'ok'
+    }
+    with open(_manifest_path(snapshot_path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def list_backups():
+    """Manifests of every stored snapshot, newest first"""
+    if not os.path.isdir(BACKUP_FOLDER):
+        return []
+
+    backups = []
+    for filename in os.listdir(BACKUP_FOLDER):
+        if not filename.endswith('.db.gz'):
+            continue
+        manifest_path = _manifest_path(os.path.join(BACKUP_FOLDER, filename))
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                backups.append(json.load(f))
+    backups.sort(key=lambda backup: (backup['created_at'], backup['name']), reverse=True)
+    return backups
+
+
+def _decompress(snapshot_path, directory):
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    with os.fdopen(fd, 'wb') as raw, gzip.open(snapshot_path, 'rb') as compressed:
+        shutil.copyfileobj(compressed, raw, 1024 * 1024)
+    return raw_path
+
+
+def verify_backup(name):
+    """Check a snapshot's checksum and run an integrity check on its contents"""
+    snapshot_path = _snapshot_path(name)
+    manifest_path = _manifest_path(snapshot_path)
+    if not os.path.exists(manifest_path):
+        raise BackupError(f'Manifest missing for {name}')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if _sha256(snapshot_path) != manifest['sha256']:
+        raise BackupError(f'Checksum mismatch for {name}')
+
+    raw_path = _decompress(snapshot_path, BACKUP_FOLDER)
+    try:
+        conn = sqlite3.connect(raw_path)
+        try:
+            ok, result = _integrity_check(conn)
+        finally:
+            conn.close()
+    finally:
+        os.remove(raw_path)
+    if not ok:
+        raise BackupError(f'{name} failed integrity check: {result}')
+    return manifest
+
+
+def restore_backup(name, database=DATABASE):
+    """Replace the live database's contents with a verified snapshot.
+
+    A safety snapshot of the current database is taken first; its manifest
+    is returned so the restore itself can be undone. The version stamps in
+    RESTORE_STAMPS end up past their pre-restore values, so the caches of
+    every worker reload on their next check.
+    """
+    verify_backup(name)
+    safety = create_backup(database)
+
+    raw_path = _decompress(_snapshot_path(name), BACKUP_FOLDER)
+    try:
+        source = sqlite3.connect(raw_path)
+        target = sqlite3.connect(database, timeout=30)
+        try:
+            # The stamps travel with the copy, so no worker sees restored data under an old stamp
+            _advance_stamps(source, _read_stamps(target))
+            # One step, so other connections never see a half-restored file
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(raw_path)
+    return safety
+
+
+def prune_backups(keep_recent=BACKUP_KEEP_RECENT, keep_days=BACKUP_KEEP_DAYS):
+    """Delete snapshots outside the retention policy; returns the deleted names"""
+    backups = list_backups()
+    keep = {backup['name'] for backup in backups[:keep_recent]}
+
+    cutoff = datetime.now().date().toordinal() - keep_days
+    days_seen = set()
+    for backup in backups:
+        day = datetime.fromisoformat(backup['created_at']).date()
+        if day.toordinal() > cutoff and day not in days_seen:
+            days_seen.add(day)
+            keep.add(backup['name'])
+
+    deleted = []
+    for backup in backups:
+        if backup['name'] in keep:
+            continue
+        snapshot_path = os.path.join(BACKUP_FOLDER, backup['name'])
+        os.remove(snapshot_path)
+        os.remove(_manifest_path(snapshot_path))
+        deleted.append(backup['name'])
+    return deleted
+
+
+if __name__ == '__main__':
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    try:
+        if command == 'create':
+            manifest = create_backup()
+            deleted = prune_backups()
+            print(f"✅ Backup created: {manifest['name']} "
+                  f"({manifest['database_size'] / 1048576:.1f} MB -> {manifest['compressed_size'] / 1048576:.1f} MB)")
+            if deleted:
+                print(f"🗑  Pruned {len(deleted)} old backup(s)")
+        elif command == 'list':
+            for backup in list_backups():
+                print(f"{backup['name']}  {backup['created_at']}  {backup['compressed_size'] / 1048576:.1f} MB")
+        elif command == 'verify' and len(sys.argv) == 3:
+            verify_backup(sys.argv[2])
+            print(f"✅ {sys.argv[2]} verified")
+        elif command == 'restore' and len(sys.argv) == 3:
+            safety = restore_backup(sys.argv[2])
+            print(f"✅ Restored {sys.argv[2]} (previous data saved as {safety['name']})")
+        elif command == 'prune':
+            deleted = prune_backups()
+            print(f"🗑  Pruned {len(deleted)} old backup(s)")
+        else:
+            print(__doc__)
+            sys.exit(1)
+    except BackupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
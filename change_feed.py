@@ -0,0 +1,189 @@
+"""Trigger-maintained change feed for incremental client sync.
+
+Every insert, update and delete on a tracked table writes an entry to
+``change_log`` with a monotonically increasing ``seq``. Only the latest entry
+per row is kept, so the log holds one entry per live row plus one tombstone
+per deleted row. Clients remember the last ``seq`` they applied and ask for
+everything after it; rows are read back in the same snapshot as the log.
+"""
+import sqlite3
+
+DATABASE = 'inventory.db'
+
+TRACKED_TABLES = (
+    'products', 'categories', 'brands', 'models',
+    'purchase_orders', 'grns', 'service_jobs'
+)
+
+DEFAULT_CHANGE_LIMIT = 500
+MAX_CHANGE_LIMIT = 5000
+TOMBSTONE_RETENTION_DAYS = 30
+
+
+class ResyncRequired(Exception):
+    """Raised when ``since`` predates tombstones that have been pruned"""
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _log_change(table, row_ref, operation):
+    # Drop the row's previous entry so the log stays one entry per row
+    return f'''
+            DELETE FROM change_log WHERE table_name = '{table}' AND row_id = {row_ref};
+            INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table}', {row_ref}, '{operation}');
+    '''
+
+
+def init_change_feed(cursor):
+    """Create the change log and its triggers; seeds existing rows on first run"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'")
+    first_run = cursor.fetchone() is None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_row ON change_log(table_name, row_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON change_log(table_name, seq)')
+
+    # Highest seq whose tombstones have been pruned; older cursors must resync
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_feed_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            purged_through INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO change_feed_state (id, purged_through) VALUES (1, 0)')
+
+    for table in TRACKED_TABLES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN{_log_change(table, 'NEW.id', 'insert')}END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_update
+            AFTER UPDATE ON {table}
+            BEGIN{_log_change(table, 'NEW.id', 'update')}END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN{_log_change(table, 'OLD.id', 'delete')}END
+        ''')
+
+        if first_run:
+            # Existing rows become 'insert' entries so since=0 is a full snapshot
+            cursor.execute(f'''
+                INSERT INTO change_log (table_name, row_id, operation)
+                SELECT '{table}', id, 'insert' FROM {table} ORDER BY id
+            ''')
+
+
+def _fetch_rows(cursor, table, ids):
+    rows = {}
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', batch)
+        rows.update({row['id']: dict(row) for row in cursor.fetchall()})
+    return rows
+
+
+def read_changes(conn, since=0, tables=TRACKED_TABLES, limit=DEFAULT_CHANGE_LIMIT):
+    """Changes after ``since`` for ``tables``, oldest first, with current row data.
+
+    Returns ``{'changes': [...], 'next_since': seq, 'has_more': bool}``.
+    Deleted rows come back with ``operation == 'delete'`` and ``row`` set to None.
+    """
+    cursor = conn.cursor()
+    # One read transaction so the log and the rows come from the same snapshot
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('''
+            SELECT s.purged_through, COALESCE(q.seq, 0) AS head
+            FROM change_feed_state s
+            LEFT JOIN sqlite_sequence q ON q.name = 'change_log'
+            WHERE s.id = 1
+        ''')
+        state = cursor.fetchone()
+        # A full sync from 0 never needs tombstones, so pruning can't break it
+        if 0 < since < state['purged_through']:
+            raise ResyncRequired(f'Changes before seq {since} are no longer available; reload and sync from 0')
+        if since > state['head']:
+            # The database was restored from an older backup
+            raise ResyncRequired(f'Sequence {since} is ahead of the change log; reload and sync from 0')
+
+        placeholders = ','.join('?' * len(tables))
+        cursor.execute(f'''
+            SELECT seq, table_name, row_id, operation, changed_at
+            FROM change_log
+            WHERE seq > ? AND table_name IN ({placeholders})
+            ORDER BY seq
+            LIMIT ?
+        ''', [since, *tables, limit + 1])
+        entries = [dict(row) for row in cursor.fetchall()]
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        live_ids = {}
+        for entry in entries:
+            if entry['operation'] != 'delete':
+                live_ids.setdefault(entry['table_name'], set()).add(entry['row_id'])
+        rows = {table: _fetch_rows(cursor, table, ids) for table, ids in live_ids.items()}
+
+        # Nothing newer matches the filter, so the cursor can jump to the head
+        next_since = entries[-1]['seq'] if has_more else state['head']
+    finally:
+        conn.rollback()
+
+    changes = [{
+        'seq': entry['seq'],
+        'table': entry['table_name'],
+        'id': entry['row_id'],
+        'operation': entry['operation'],
+        'changed_at': entry['changed_at'],
+        'row': rows.get(entry['table_name'], {}).get(entry['row_id'])
+    } for entry in entries]
+    return {'changes': changes, 'next_since': next_since, 'has_more': has_more}
+
+
+def prune_tombstones(cursor, days=TOMBSTONE_RETENTION_DAYS):
+    """Delete tombstones older than ``days``; returns how many were removed"""
+    cursor.execute('''
+        SELECT MAX(seq) AS last_seq, COUNT(*) AS total FROM change_log
+        WHERE operation = 'delete' AND changed_at < DATETIME('now', ?)
+    ''', (f'-{days} days',))
+    result = cursor.fetchone()
+    if not result['total']:
+        return 0
+
+    cursor.execute('''
+        DELETE FROM change_log WHERE operation = 'delete' AND seq <= ?
+    ''', (result['last_seq'],))
+    cursor.execute('''
+        UPDATE change_feed_state SET purged_through = MAX(purged_through, ?) WHERE id = 1
+    ''', (result['last_seq'],))
+    return result['total']
+
+
+if __name__ == '__main__':
+    import sys
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else TOMBSTONE_RETENTION_DAYS
+    conn = get_db()
+    cursor = conn.cursor()
+    removed = prune_tombstones(cursor, days)
+    conn.commit()
+    conn.close()
+    print(f"🗑  Pruned {removed} tombstone(s) older than {days} days")
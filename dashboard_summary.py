@@ -0,0 +1,375 @@
+"""Dashboard summary maintained by triggers, with a short in-process cache on top.
+
+The product counters live in a single ``dashboard_summary`` row and daily sales
+totals live in ``dashboard_daily_sales``. Both are kept current by triggers so
+every write path (POS, GRN, imports, edits) updates them without extra code.
+Every trigger also bumps ``dashboard_summary.version``, which lets the
+dashboard endpoints serve a cached payload after a single primary-key read.
+"""
+import sqlite3
+import threading
+import time
+
+DATABASE = 'inventory.db'
+CACHE_TTL_SECONDS = 30
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Contribution of one products row to the summary counters
+_PRODUCT_TERMS = {
+    'total_products': "({r}.status = 'active')",
+    'low_stock': "COALESCE({r}.status = 'active' AND {r}.current_stock <= {r}.min_stock_level, 0)",
+    'out_of_stock': "COALESCE({r}.status = 'active' AND {r}.current_stock = 0, 0)",
+    'stock_value': "CASE WHEN {r}.status = 'active' THEN COALESCE({r}.current_stock * {r}.cost_price, 0) ELSE 0 END",
+}
+
+# Quantity of a product sold (transaction_type = 'sale') on one rollup day
+_DAILY_QTY_SOLD = '''
+    SELECT SUM(psi.quantity)
+    FROM pos_sale_items psi
+    JOIN pos_sales ps ON psi.sale_id = ps.id
+    WHERE psi.product_id = {r}.id AND ps.transaction_type = 'sale'
+      AND DATE(ps.sale_date) = dashboard_daily_sales.sale_day
+'''
+
+_DAYS_SOLD = '''
+    SELECT DATE(ps.sale_date)
+    FROM pos_sale_items psi
+    JOIN pos_sales ps ON psi.sale_id = ps.id
+    WHERE psi.product_id = {r}.id AND ps.transaction_type = 'sale'
+'''
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _product_delta(old=None, new=None):
+    assignments = []
+    for column, term in _PRODUCT_TERMS.items():
+        expression = column
+        if old:
+            expression += f' - {term.format(r=old)}'
+        if new:
+            expression += f' + {term.format(r=new)}'
+        assignments.append(f'{column} = {expression}')
+    return ', '.join(assignments)
+
+
+def _sales_delta(sign, ref):
+    return f'''
+        sales_amount = sales_amount {sign} CASE WHEN {ref}.transaction_type = 'sale' THEN COALESCE({ref}.total_amount, 0) ELSE 0 END,
+        returns_amount = returns_amount {sign} CASE WHEN {ref}.transaction_type = 'return' THEN ABS(COALESCE({ref}.total_amount, 0)) ELSE 0 END,
+        other_amount = other_amount {sign} CASE WHEN {ref}.transaction_type NOT IN ('sale', 'return') OR {ref}.transaction_type IS NULL THEN ABS(COALESCE({ref}.total_amount, 0)) ELSE 0 END
+    '''
+
+
+def _item_delta(sign, ref):
+    return f'''
+        revenue = revenue {sign} COALESCE({ref}.total_price, 0),
+        cost = cost {sign} COALESCE({ref}.quantity * (SELECT cost_price FROM products WHERE id = {ref}.product_id), 0)
+    '''
+
+
+def _sale_day_of_item(ref):
+    return f"(SELECT DATE(sale_date) FROM pos_sales WHERE id = {ref}.sale_id AND transaction_type = 'sale')"
+
+
+_BUMP_VERSION = 'UPDATE dashboard_summary SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;'
+
+_TRIGGERS = {
+    'trg_dashboard_products_insert': f'''
+        AFTER INSERT ON products
+        BEGIN
+            UPDATE dashboard_summary SET {_product_delta(new='NEW')},
+                version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+        END
+    ''',
+    'trg_dashboard_products_update': f'''
+        AFTER UPDATE ON products
+        BEGIN
+            UPDATE dashboard_summary SET {_product_delta(old='OLD', new='NEW')},
+                version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+        END
+    ''',
+    'trg_dashboard_products_delete': f'''
+        AFTER DELETE ON products
+        BEGIN
+            UPDATE dashboard_summary SET {_product_delta(old='OLD')},
+                version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = 1;
+            UPDATE dashboard_daily_sales
+            SET cost = cost - COALESCE(({_DAILY_QTY_SOLD.format(r='OLD')}) * OLD.cost_price, 0)
+            WHERE sale_day IN ({_DAYS_SOLD.format(r='OLD')});
+        END
+    ''',
+    # Profit is reported against the current cost price, so re-price past days
+    'trg_dashboard_products_cost': f'''
+        AFTER UPDATE OF cost_price ON products
+        WHEN OLD.cost_price IS NOT NEW.cost_price
+        BEGIN
+            UPDATE dashboard_daily_sales
+            SET cost = cost + COALESCE(({_DAILY_QTY_SOLD.format(r='NEW')}), 0)
+                * (COALESCE(NEW.cost_price, 0) - COALESCE(OLD.cost_price, 0))
+            WHERE sale_day IN ({_DAYS_SOLD.format(r='NEW')});
+        END
+    ''',
+    'trg_dashboard_sales_insert': f'''
+        AFTER INSERT ON pos_sales
+        BEGIN
+            INSERT OR IGNORE INTO dashboard_daily_sales (sale_day) VALUES (DATE(NEW.sale_date));
+            UPDATE dashboard_daily_sales SET {_sales_delta('+', 'NEW')}
+            WHERE sale_day = DATE(NEW.sale_date);
+            {_BUMP_VERSION}
+        END
+    ''',
+    'trg_dashboard_sales_delete': f'''
+        AFTER DELETE ON pos_sales
+        BEGIN
+            UPDATE dashboard_daily_sales SET {_sales_delta('-', 'OLD')}
+            WHERE sale_day = DATE(OLD.sale_date);
+            {_BUMP_VERSION}
+        END
+    ''',
+    'trg_dashboard_sale_items_insert': f'''
+        AFTER INSERT ON pos_sale_items
+        BEGIN
+            UPDATE dashboard_daily_sales SET {_item_delta('+', 'NEW')}
+            WHERE sale_day = {_sale_day_of_item('NEW')};
+            {_BUMP_VERSION}
+        END
+    ''',
+    'trg_dashboard_sale_items_delete': f'''
+        AFTER DELETE ON pos_sale_items
+        BEGIN
+            UPDATE dashboard_daily_sales SET {_item_delta('-', 'OLD')}
+            WHERE sale_day = {_sale_day_of_item('OLD')};
+            {_BUMP_VERSION}
+        END
+    ''',
+    'trg_dashboard_movements_insert': f'''
+        AFTER INSERT ON stock_movements
+        BEGIN
+            {_BUMP_VERSION}
+        END
+    ''',
+}
+
+
+def init_dashboard_summary(cursor):
+    """Create the summary tables, triggers and supporting indexes"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_products INTEGER DEFAULT 0,
+            low_stock INTEGER DEFAULT 0,
+            out_of_stock INTEGER DEFAULT 0,
+            stock_value REAL DEFAULT 0,
+            version INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_daily_sales (
+            sale_day TEXT PRIMARY KEY NOT NULL,
+            sales_amount REAL DEFAULT 0,
+            returns_amount REAL DEFAULT 0,
+            other_amount REAL DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            cost REAL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_status_stock ON products(status, current_stock)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pos_sales_sale_date ON pos_sales(sale_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pos_sale_items_sale_id ON pos_sale_items(sale_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pos_sale_items_product_id ON pos_sale_items(product_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_movements_created_at ON stock_movements(created_at)')
+
+    for name, body in _TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    cursor.execute('SELECT COUNT(*) as count FROM dashboard_summary')
+    if cursor.fetchone()[0] == 0:
+        rebuild_dashboard_summary(cursor)
+
+
+def compute_dashboard_summary(cursor):
+    """Recompute the summary row and daily rollup from the base tables"""
+    cursor.execute('''
+        SELECT
+            COUNT(*) as total_products,
+            COALESCE(SUM(current_stock <= min_stock_level), 0) as low_stock,
+            COALESCE(SUM(current_stock = 0), 0) as out_of_stock,
+            COALESCE(SUM(current_stock * cost_price), 0) as stock_value
+        FROM products
+        WHERE status = 'active'
+    ''')
+    summary = dict(cursor.fetchone())
+
+    cursor.execute('''
+        SELECT
+            DATE(sale_date) as sale_day,
+            COALESCE(SUM(CASE WHEN transaction_type = 'sale' THEN total_amount ELSE 0 END), 0) as sales_amount,
+            COALESCE(SUM(CASE WHEN transaction_type = 'return' THEN ABS(total_amount) ELSE 0 END), 0) as returns_amount,
+            COALESCE(SUM(CASE WHEN transaction_type = 'sale' OR transaction_type = 'return' THEN 0 ELSE ABS(total_amount) END), 0) as other_amount
+        FROM pos_sales
+        WHERE DATE(sale_date) IS NOT NULL
+        GROUP BY DATE(sale_date)
+    ''')
+    days = {row['sale_day']: dict(row, revenue=0, cost=0) for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT
+            DATE(ps.sale_date) as sale_day,
+            COALESCE(SUM(psi.total_price), 0) as revenue,
+            COALESCE(SUM(psi.quantity * p.cost_price), 0) as cost
+        FROM pos_sale_items psi
+        JOIN pos_sales ps ON psi.sale_id = ps.id
+        LEFT JOIN products p ON psi.product_id = p.id
+        WHERE ps.transaction_type = 'sale' AND DATE(ps.sale_date) IS NOT NULL
+        GROUP BY DATE(ps.sale_date)
+    ''')
+    for row in cursor.fetchall():
+        days[row['sale_day']].update(revenue=row['revenue'], cost=row['cost'])
+
+    return summary, list(days.values())
+
+
+def rebuild_dashboard_summary(cursor):
+    """Replace the maintained aggregates with a from-scratch recomputation"""
+    summary, days = compute_dashboard_summary(cursor)
+
+    cursor.execute('SELECT version FROM dashboard_summary WHERE id = 1')
+    row = cursor.fetchone()
+    version = (row[0] if row else 0) + 1
+
+    cursor.execute('''
+        INSERT OR REPLACE INTO dashboard_summary
+            (id, total_products, low_stock, out_of_stock, stock_value, version, updated_at)
+        VALUES (1, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (summary['total_products'], summary['low_stock'], summary['out_of_stock'],
+          summary['stock_value'], version))
+
+    cursor.execute('DELETE FROM dashboard_daily_sales')
+    cursor.executemany('''
+        INSERT INTO dashboard_daily_sales
+            (sale_day, sales_amount, returns_amount, other_amount, revenue, cost)
+        VALUES (:sale_day, :sales_amount, :returns_amount, :other_amount, :revenue, :cost)
+    ''', days)
+
+
+def verify_dashboard_summary(cursor, tolerance=0.01):
+    """Compare the maintained aggregates with a recomputation; return mismatches"""
+    expected_summary, expected_days = compute_dashboard_summary(cursor)
+    mismatches = []
+
+    cursor.execute('SELECT * FROM dashboard_summary WHERE id = 1')
+    row = cursor.fetchone()
+    actual_summary = dict(row) if row else {}
+    for key, expected in expected_summary.items():
+        actual = actual_summary.get(key)
+        if actual is None or abs(actual - expected) > tolerance:
+            mismatches.append(f"{key}: cached {actual}, expected {expected}")
+
+    cursor.execute('SELECT * FROM dashboard_daily_sales')
+    actual_days = {row['sale_day']: dict(row) for row in cursor.fetchall()}
+    for expected in expected_days:
+        actual = actual_days.pop(expected['sale_day'], None)
+        for key in ('sales_amount', 'returns_amount', 'other_amount', 'revenue', 'cost'):
+            actual_value = actual[key] if actual else 0
+            if abs(actual_value - expected[key]) > tolerance:
+                mismatches.append(f"{expected['sale_day']} {key}: cached {actual_value}, expected {expected[key]}")
+
+    # Days left over must have been fully reversed by delete triggers
+    for sale_day, actual in actual_days.items():
+        for key in ('sales_amount', 'returns_amount', 'other_amount', 'revenue', 'cost'):
+            if abs(actual[key]) > tolerance:
+                mismatches.append(f"{sale_day} {key}: cached {actual[key]}, expected 0")
+
+    return mismatches
+
+
+def read_dashboard_summary(cursor):
+    """Read the summary row (one primary-key lookup)"""
+    cursor.execute('SELECT * FROM dashboard_summary WHERE id = 1')
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def read_sales_window(cursor, days):
+    """Totals for the last ``days`` days from the daily rollup"""
+    cursor.execute('''
+        SELECT
+            COALESCE(SUM(sales_amount), 0) as total_sales,
+            COALESCE(SUM(returns_amount), 0) as total_returns,
+            COALESCE(SUM(revenue), 0) as revenue,
+            COALESCE(SUM(cost), 0) as cost
+        FROM dashboard_daily_sales
+        WHERE sale_day >= DATE('now', '-' || ? || ' days')
+    ''', (days,))
+    return dict(cursor.fetchone())
+
+
+def read_daily_sales(cursor, days):
+    """Per-day net sales and profit for the last ``days`` days"""
+    cursor.execute('''
+        SELECT
+            sale_day,
+            sales_amount - returns_amount - other_amount as daily_sales,
+            revenue - cost as daily_profit
+        FROM dashboard_daily_sales
+        WHERE sale_day >= DATE('now', '-' || ? || ' days')
+        ORDER BY sale_day
+    ''', (days,))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def get_cached(key, version, builder):
+    """Return the cached payload for ``key`` if it was built for ``version`` within the TTL"""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == version and entry[1] > now:
+            return entry[2]
+
+    payload = builder()
+    with _cache_lock:
+        _cache[key] = (version, now + CACHE_TTL_SECONDS, payload)
+    return payload
+
+
+def invalidate_dashboard_cache():
+    """Drop every cached dashboard payload held by this worker"""
+    with _cache_lock:
+        _cache.clear()
+
+
+if __name__ == '__main__':
+    import sys
+
+    conn = get_db()
+    cursor = conn.cursor()
+    init_dashboard_summary(cursor)
+
+    if '--rebuild' in sys.argv:
+        rebuild_dashboard_summary(cursor)
+        conn.commit()
+        print("Dashboard summary rebuilt.")
+
+    problems = verify_dashboard_summary(cursor)
+    conn.commit()
+    conn.close()
+
+    if problems:
+        print(f"Dashboard summary drift detected ({len(problems)}):")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("Dashboard summary matches a from-scratch recomputation.")
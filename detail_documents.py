@@ -0,0 +1,130 @@
+"""Nested detail responses assembled by SQLite in a single statement.
+
+Each document is a header row plus child collections. The statement builds
+it with ``json_object`` and correlated ``json_group_array`` subqueries over
+indexed foreign keys and returns one JSON text, which the route sends as is,
+so there is one round trip and no per-row dicts. Objects carry every column
+of their table (read once per worker from ``PRAGMA table_info``, so columns
+added by migrations appear automatically) plus the listed joined fields.
+"""
+import threading
+
+# Foreign keys the child subqueries look up by
+DETAIL_INDEXES = {
+    'idx_purchase_order_items_po_id': 'purchase_order_items(po_id)',
+    'idx_grn_items_grn_id': 'grn_items(grn_id)',
+    'idx_quick_order_items_order_id': 'quick_order_items(order_id)',
+    'idx_service_parts_used_job_id': 'service_parts_used(job_id)',
+    'idx_service_labor_charges_job_id': 'service_labor_charges(job_id)',
+    'idx_service_status_history_job_id': 'service_status_history(job_id, created_at)',
+}
+
+# name -> header table, alias, joins and extra fields, then child collections
+# as key -> (table, alias, joins, extra fields, parent link, order)
+DOCUMENTS = {
+    'purchase_order': {
+        'table': 'purchase_orders', 'alias': 'po', 'joins': '', 'extra': {},
+        'children': {
+            'items': ('purchase_order_items', 'poi', '''
+                LEFT JOIN categories c ON poi.category_id = c.id
+                LEFT JOIN brands b ON poi.brand_id = b.id
+                LEFT JOIN models m ON poi.model_id = m.id
+            ''', {'category_name': 'c.name', 'brand_name': 'b.name', 'model_name': 'm.name'},
+                'poi.po_id = po.id', 'poi.id'),
+        },
+    },
+    'grn': {
+        'table': 'grns', 'alias': 'g', 'joins': '', 'extra': {},
+        'children': {
+            # GRN lines do not keep their PO line, so match it on product
+            'items': ('grn_items', 'gi', 'LEFT JOIN products p ON gi.product_id = p.id', {
+                'sku': 'p.sku', 'brand_id': 'p.brand_id', 'category_id': 'p.category_id',
+                'ordered_quantity': '''(
+                    SELECT SUM(poi.quantity) FROM purchase_order_items poi
+                    WHERE poi.po_id = g.po_id AND (
+                        poi.product_id = gi.product_id
+                        OR (gi.product_id IS NULL AND poi.product_name = gi.product_name)
+                    )
+                )''',
+            }, 'gi.grn_id = g.id', 'gi.id'),
+        },
+    },
+    'pos_sale': {
+        'table': 'pos_sales', 'alias': 's', 'joins': '', 'extra': {},
+        'children': {
+            'items': ('pos_sale_items', 'psi', 'LEFT JOIN products p ON psi.product_id = p.id', {
+                'sku': 'p.sku', 'brand_id': 'p.brand_id', 'category_id': 'p.category_id',
+            }, 'psi.sale_id = s.id', 'psi.id'),
+        },
+    },
+    'quick_order': {
+        'table': 'quick_orders', 'alias': 'qo', 'joins': '', 'extra': {},
+        'children': {
+            'items': ('quick_order_items', 'qoi', 'LEFT JOIN products p ON qoi.product_id = p.id', {
+                'sku': 'p.sku', 'brand_id': 'p.brand_id', 'category_id': 'p.category_id',
+            }, 'qoi.order_id = qo.id', 'qoi.id'),
+        },
+    },
+    'service_job': {
+        'table': 'service_jobs', 'alias': 'sj',
+        'joins': 'LEFT JOIN technicians t ON sj.technician_id = t.id',
+        'extra': {'technician_name': 't.name'},
+        'children': {
+            'parts_used': ('service_parts_used', 'spu', 'LEFT JOIN products p ON spu.product_id = p.id', {
+                'product_name': 'p.name',
+            }, 'spu.job_id = sj.id', 'spu.id'),
+            'labor_charges': ('service_labor_charges', 'slc', '', {}, 'slc.job_id = sj.id', 'slc.id'),
+            'status_history': ('service_status_history', 'ssh', '', {}, 'ssh.job_id = sj.id',
+                               'ssh.created_at DESC, ssh.id DESC'),
+        },
+    },
+}
+
+_lock = threading.Lock()
+_statements = {}
+
+
+def init_detail_documents(cursor):
+    """Index the foreign keys the detail documents are assembled over"""
+    for name, target in DETAIL_INDEXES.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def _object_sql(cursor, table, alias, extra):
+    cursor.execute(f'PRAGMA table_info({table})')
+    fields = {row[1]: f'{alias}.{row[1]}' for row in cursor.fetchall()}
+    # Joined fields replace same-named columns, as they did in the old SELECT alias lists
+    fields.update(extra)
+    return 'json_object(' + ', '.join(f"'{key}', {value}" for key, value in fields.items()) + ')'
+
+
+def _build_statement(cursor, name):
+    spec = DOCUMENTS[name]
+    document = _object_sql(cursor, spec['table'], spec['alias'], spec['extra'])
+    for key, (table, alias, joins, extra, link, order) in spec['children'].items():
+        child = _object_sql(cursor, table, alias, extra)
+        # json() restores the JSON subtype that is lost crossing a subquery
+        document = f'''json_set({document}, '$.{key}', json((
+            SELECT json_group_array(json(item)) FROM (
+                SELECT {child} AS item
+                FROM {table} {alias} {joins}
+                WHERE {link}
+                ORDER BY {order}
+            )
+        )))'''
+    return f'''
+        SELECT {document}
+        FROM {spec['table']} {spec['alias']} {spec['joins']}
+        WHERE {spec['alias']}.id = ?
+    '''
+
+
+def fetch_document(cursor, name, id):
+    """The ``name`` document for row ``id`` as JSON text, or None if there is no such row"""
+    statement = _statements.get(name)
+    if statement is None:
+        with _lock:
+            statement = _statements.setdefault(name, _build_statement(cursor, name))
+    cursor.execute(statement, (id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
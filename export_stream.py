@@ -0,0 +1,89 @@
+"""Streaming CSV/XLSX downloads straight from a database cursor.
+
+Rows are pulled with ``fetchmany`` and written out batch by batch, so an
+export's memory use does not grow with the number of rows. CSV bytes are sent
+as soon as the first batch is read; XLSX rows go through openpyxl's
+write-only workbook into a temporary file that is streamed once the archive
+is finalized.
+"""
+import csv
+import io
+import tempfile
+
+from flask import Response, stream_with_context
+
+EXPORT_BATCH = 1000
+STREAM_CHUNK_BYTES = 64 * 1024
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def cursor_columns(cursor):
+    return [column[0] for column in cursor.description]
+
+
+def iter_cursor(cursor, batch_size=EXPORT_BATCH):
+    """Yield row batches from an executed cursor"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def csv_stream(conn, cursor):
+    """Encode the cursor's result set as CSV, one batch per chunk; closes ``conn``"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    try:
+        writer.writerow(cursor_columns(cursor))
+        for rows in iter_cursor(cursor):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    finally:
+        conn.close()
+
+
+def xlsx_stream(conn, cursor, sheet_name, column_widths=None):
+    """Write the cursor's result set to a write-only workbook and stream it; closes ``conn``"""
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    try:
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheet_name)
+        columns = cursor_columns(cursor)
+        # Write-only sheets need their column widths before the first row
+        for index, column in enumerate(columns, start=1):
+            if column_widths and column in column_widths:
+                worksheet.column_dimensions[get_column_letter(index)].width = column_widths[column]
+
+        worksheet.append(columns)
+        for rows in iter_cursor(cursor):
+            for row in rows:
+                worksheet.append(tuple(row))
+    finally:
+        conn.close()
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def streaming_download(body, filename, mimetype):
+    """Response that sends a generator body as a file attachment"""
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
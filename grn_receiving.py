@@ -0,0 +1,191 @@
+"""Set-based goods receiving against a purchase order.
+
+All PO items, products and existing IMEIs are read with one batched query
+each, inside the write transaction so a concurrent receipt cannot take the
+same IMEIs between the check and the insert. The writes are a handful of
+``executemany`` calls plus one stock update and movement per line (the
+ledger seeds a product's first balance from its stock, so each movement is
+recorded right after its own stock change), so the time spent holding the
+write lock grows with the number of rows rather than with round trips.
+"""
+from datetime import datetime
+
+from imei_filter import add_imeis
+from imei_ingest import check_imeis, accepted_or_raise
+
+# SQLite's default limit on host parameters per statement is 999 on older builds
+LOOKUP_BATCH = 500
+
+
+def _chunks(values, size=LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _select_in(cursor, sql, values):
+    """Run ``sql`` (containing ``{placeholders}``) for ``values`` in batches"""
+    rows = []
+    for batch in _chunks(values):
+        cursor.execute(sql.format(placeholders=','.join('?' * len(batch))), batch)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def _clean_imeis(item):
+    return [imei.strip() for imei in item.get('imeis') or [] if imei and imei.strip()]
+
+
+def receive_purchase_order_items(conn, po_id, items, payment_status='unpaid', storage_location='', created_by='admin'):
+    """Record a GRN for ``items`` of purchase order ``po_id`` and commit it.
+
+    Returns the summary the receive endpoint reports. A missing PO raises
+    LookupError and bad or duplicate IMEIs raise ImeiRejected, and nothing is
+    committed.
+    """
+    cursor = conn.cursor()
+    # Taken before the reads, so the IMEI check still holds at the insert
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT po_number, supplier_name FROM purchase_orders WHERE id = ?', (po_id,))
+        po_data = cursor.fetchone()
+        if not po_data:
+            raise LookupError('Purchase order not found')
+
+        lines = [
+            item for item in items
+            if item.get('received_quantity', 0) > 0 or item.get('damaged_quantity', 0) > 0
+        ]
+        po_items = {
+            row['id']: dict(row) for row in _select_in(
+                cursor,
+                'SELECT * FROM purchase_order_items WHERE id IN ({placeholders})',
+                {item['id'] for item in lines}
+            )
+        }
+        lines = [item for item in lines if item['id'] in po_items]
+
+        product_ids = {po_items[item['id']]['product_id'] for item in lines} - {None}
+        existing_products = {
+            row['id'] for row in _select_in(cursor, 'SELECT id FROM products WHERE id IN ({placeholders})', product_ids)
+        }
+        accepted_or_raise(check_imeis(cursor, [imei for item in lines for imei in item.get('imeis') or []]))
+
+        grn_number = f"GRN-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        cursor.execute('''
+            INSERT INTO grns (grn_number, po_id, po_number, supplier_name, payment_status, storage_location, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (grn_number, po_id, po_data['po_number'], po_data['supplier_name'], payment_status, storage_location, created_by))
+        grn_id = cursor.lastrowid
+
+        # Products that were never created, or deleted since the PO was raised
+        for item in lines:
+            po_item = po_items[item['id']]
+            if po_item['product_id'] in existing_products:
+                continue
+            received_qty = item.get('received_quantity', 0)
+            cursor.execute('''
+                INSERT INTO products (
+                    name, category_id, brand_id, model_id, cost_price,
+                    selling_price, mrp, current_stock, opening_stock,
+                    storage_location, status
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                po_item['product_name'], po_item['category_id'], po_item['brand_id'],
+                po_item['model_id'], po_item['cost_price'],
+                round(po_item['cost_price'] * 1.2, 2),
+                round(po_item['cost_price'] * 1.3, 2),
+                received_qty, received_qty, storage_location, 'active'
+            ))
+            po_item['product_id'] = cursor.lastrowid
+            po_item['created_product'] = True
+
+        created = [po_items[item['id']] for item in lines if po_items[item['id']].get('created_product')]
+        cursor.executemany('UPDATE purchase_order_items SET product_id = ? WHERE id = ?',
+                           [(po_item['product_id'], po_item['id']) for po_item in created])
+
+        cursor.executemany('''
+            UPDATE purchase_order_items
+            SET received_quantity = received_quantity + ?
+            WHERE id = ?
+        ''', [(item.get('received_quantity', 0) + item.get('damaged_quantity', 0), item['id']) for item in lines])
+
+        cursor.executemany('''
+            INSERT INTO grn_items (grn_id, product_id, product_name, quantity_received, quantity_damaged, damage_reason, cost_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(grn_id, po_items[item['id']]['product_id'], po_items[item['id']]['product_name'],
+               item.get('received_quantity', 0), item.get('damaged_quantity', 0), item.get('damage_reason', ''),
+               po_items[item['id']]['cost_price']) for item in lines])
+
+        damaged = [item for item in lines if item.get('damaged_quantity', 0) > 0]
+        cursor.executemany('''
+            INSERT INTO damaged_items (po_id, po_item_id, product_name, quantity, damage_reason)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(po_id, item['id'], po_items[item['id']]['product_name'], item['damaged_quantity'],
+               item.get('damage_reason', '')) for item in damaged])
+
+        stock_sql = 'UPDATE products SET current_stock = current_stock + ?, updated_at = CURRENT_TIMESTAMP'
+        if storage_location:
+            stock_sql += ', storage_location = ?'
+        movement_ids = {}
+        for item in lines:
+            po_item = po_items[item['id']]
+            received_qty = item.get('received_quantity', 0)
+            if not po_item.get('created_product'):
+                cursor.execute(stock_sql + ' WHERE id = ?',
+                               (received_qty, storage_location, po_item['product_id']) if storage_location
+                               else (received_qty, po_item['product_id']))
+            cursor.execute('''
+                INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (po_item['product_id'], 'purchase', received_qty, 'purchase_order', po_id,
+                  f"Initial stock from PO #{po_id}" if po_item.get('created_product') else f"Received from PO #{po_id}"))
+            movement_ids[item['id']] = cursor.lastrowid
+
+        received_date = datetime.now()
+        cursor.executemany('''
+            INSERT INTO product_imei (product_id, imei, status, grn_id, stock_movement_id, received_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(po_items[item['id']]['product_id'], imei, 'available', grn_id, movement_ids[item['id']], received_date)
+              for item in lines for imei in _clean_imeis(item)])
+
+        # Check if all items are fully received
+        cursor.execute('''
+            SELECT SUM(quantity) as total_qty, SUM(received_quantity) as received_qty
+            FROM purchase_order_items WHERE po_id = ?
+        ''', (po_id,))
+        totals = dict(cursor.fetchone())
+
+        if (totals['total_qty'] or 0) <= (totals['received_qty'] or 0):
+            new_status = 'completed'
+        elif totals['received_qty']:
+            new_status = 'partial'
+        else:
+            new_status = 'pending'
+
+        cursor.execute('''
+            UPDATE purchase_orders
+            SET status = ?, payment_status = ?, storage_location = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (new_status, payment_status, storage_location, po_id))
+
+        cursor.execute('''
+            UPDATE grns
+            SET total_items = ?, total_quantity = ?
+            WHERE id = ?
+        ''', (len(lines), sum(item.get('received_quantity', 0) for item in lines), grn_id))
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    add_imeis([imei for item in lines for imei in _clean_imeis(item)])
+    return {
+        'grn_number': grn_number,
+        'grn_id': grn_id,
+        'status': new_status,
+        'total_qty': totals['total_qty'],
+        'received_qty': totals['received_qty'],
+        'damaged_count': len(damaged)
+    }
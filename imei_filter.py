@@ -0,0 +1,141 @@
+"""Per-worker Bloom filter over every IMEI in ``product_imei``.
+
+A scan can be answered "definitely new" from memory in microseconds; only
+probable hits (real duplicates plus about FALSE_POSITIVE_RATE of new IMEIs)
+need the indexed lookup. product_imei ids come from AUTOINCREMENT and rows
+are never renumbered, so ``MAX(id)`` is the version stamp: when it has moved,
+the rows past the last id seen are folded in. Deleted IMEIs only add false
+positives, so the filter is rebuilt from scratch every REBUILD_SECONDS, when
+it fills past its capacity, or when the database has been restored (the
+restore epoch moved), since a restored table may reuse ids with other IMEIs.
+"""
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+
+from backup import read_restore_epoch
+
+DATABASE = 'inventory.db'
+
+FALSE_POSITIVE_RATE = 0.001
+MIN_CAPACITY = 100000
+REBUILD_SECONDS = 15 * 60
+# How stale the scan-time check may be; ingest always syncs first
+SCAN_SYNC_SECONDS = 2
+LOAD_BATCH = 10000
+
+_MASK = (1 << 64) - 1
+
+
+def _hashes(imei):
+    """Two independent 64-bit hashes of an IMEI"""
+    if imei.isdigit():
+        # splitmix64 finaliser over the numeric value; much cheaper than a digest
+        x = (int(imei) + 0x9E3779B97F4A7C15) & _MASK
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+        h1 = x ^ (x >> 31)
+    else:
+        h1 = int.from_bytes(hashlib.blake2b(imei.encode('utf-8'), digest_size=8).digest(), 'little')
+    h2 = ((h1 * 0xD6E8FEB86659FD93) & _MASK) >> 7 | 1
+    return h1, h2
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, imei):
+        h1, h2 = _hashes(imei)
+        bits, size = self.bits, self.size
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, imei):
+        h1, h2 = _hashes(imei)
+        bits, size = self.bits, self.size
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+_lock = threading.Lock()
+_local = threading.local()
+_state = {'filter': None, 'last_id': 0, 'epoch': None, 'built_at': 0, 'synced_at': 0}
+
+
+def _connection():
+    # Our own connection sees only committed rows, so an id is never passed
+    # over while it belongs to a transaction that may yet roll back
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE)
+        _local.conn = conn
+    return conn
+
+
+def _load(cursor, bloom, after_id):
+    """Add IMEIs with id > ``after_id`` to ``bloom``; returns the highest id seen"""
+    while True:
+        cursor.execute('SELECT id, imei FROM product_imei WHERE id > ? ORDER BY id LIMIT ?', (after_id, LOAD_BATCH))
+        rows = cursor.fetchall()
+        for _, imei in rows:
+            bloom.add(imei)
+        if len(rows) < LOAD_BATCH:
+            return rows[-1][0] if rows else after_id
+        after_id = rows[-1][0]
+
+
+def _rebuild(cursor, epoch):
+    cursor.execute('SELECT COUNT(*) FROM product_imei')
+    bloom = BloomFilter(max(MIN_CAPACITY, cursor.fetchone()[0] * 2))
+    last_id = _load(cursor, bloom, 0)
+    now = time.monotonic()
+    _state.update(filter=bloom, last_id=last_id, epoch=epoch, built_at=now, synced_at=now)
+
+
+def sync(max_age=0):
+    """Bring the filter up to date unless it was synced within ``max_age`` seconds"""
+    now = time.monotonic()
+    if _state['filter'] is not None and now - _state['synced_at'] < max_age:
+        return _state['filter']
+
+    cursor = _connection().cursor()
+    with _lock:
+        bloom = _state['filter']
+        epoch = read_restore_epoch(cursor)
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM product_imei')
+        stamp = cursor.fetchone()[0]
+        if (bloom is None or epoch != _state['epoch'] or stamp < _state['last_id']
+                or bloom.count > bloom.capacity or now - _state['built_at'] > REBUILD_SECONDS):
+            _rebuild(cursor, epoch)
+        else:
+            if stamp > _state['last_id']:
+                _state['last_id'] = _load(cursor, bloom, _state['last_id'])
+            _state['synced_at'] = now
+        return _state['filter']
+
+
+def add_imeis(imeis):
+    """Record IMEIs this worker has just inserted, ahead of the next sync"""
+    bloom = _state['filter']
+    if bloom is not None:
+        with _lock:
+            for imei in imeis:
+                bloom.add(imei)
+
+
+def probable_duplicates(imeis, max_age=0):
+    """The subset of ``imeis`` the filter cannot rule out"""
+    bloom = sync(max_age)
+    return [imei for imei in imeis if imei in bloom]
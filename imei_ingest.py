@@ -0,0 +1,142 @@
+"""Shared IMEI ingest: batch validation, duplicate detection and bulk insert.
+
+Every path that adds IMEIs (manual entry, stock adjustments, GRN receiving,
+manual IMEIs at the POS) goes through here. A batch is validated in memory
+first (format, Luhn check digit, repeats within the batch), existing IMEIs
+are found through the worker's Bloom filter plus one lookup on the unique
+index per LOOKUP_BATCH probable hits, and the accepted rows are written with
+a single ``executemany``.
+"""
+import os
+
+from imei_filter import probable_duplicates, add_imeis
+
+LOOKUP_BATCH = 500
+# Set IMEI_CHECK_DIGIT=0 to accept IMEIs that fail the Luhn check
+CHECK_DIGIT_REQUIRED = os.environ.get('IMEI_CHECK_DIGIT', '1') != '0'
+
+# Per-IMEI result codes
+ACCEPTED = 'accepted'
+INVALID_FORMAT = 'invalid_format'
+INVALID_CHECK_DIGIT = 'invalid_check_digit'
+DUPLICATE_IN_BATCH = 'duplicate_in_batch'
+ALREADY_EXISTS = 'already_exists'
+
+REASONS = {
+    INVALID_FORMAT: 'not exactly 15 digits',
+    INVALID_CHECK_DIGIT: 'check digit does not match, likely mistyped',
+    DUPLICATE_IN_BATCH: 'entered more than once',
+    ALREADY_EXISTS: 'already exists in the system',
+}
+
+# Doubled digit -> digit sum, for the Luhn positions that get doubled
+_DOUBLED = [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+
+
+class ImeiRejected(ValueError):
+    """Raised when a batch contains IMEIs that cannot be added; ``rejected`` lists them"""
+
+    def __init__(self, rejected):
+        self.rejected = rejected
+        shown = ', '.join(f"{entry['imei']} ({REASONS[entry['status']]})" for entry in rejected[:10])
+        more = f' and {len(rejected) - 10} more' if len(rejected) > 10 else ''
+        super().__init__(f'{len(rejected)} IMEI(s) rejected: {shown}{more}')
+
+
+def _luhn_sum(digits):
+    digits = [ord(char) - 48 for char in digits]
+    return sum(digits[0::2]) + sum(_DOUBLED[digit] for digit in digits[1::2])
+
+
+def luhn_valid(imei):
+    """True when the last digit of a 15-digit IMEI is its Luhn check digit"""
+    return _luhn_sum(imei) % 10 == 0
+
+
+def check_digit(body):
+    """Luhn check digit to append to a 14-digit IMEI body"""
+    return str(-_luhn_sum(body) % 10)
+
+
+def validate_imeis(imeis):
+    """Classify a batch in memory; returns one ``{'imei', 'status'}`` per non-blank entry"""
+    results = []
+    seen = set()
+    for raw in imeis:
+        imei = (raw or '').strip()
+        if not imei:
+            continue
+        if len(imei) != 15 or not imei.isascii() or not imei.isdigit():
+            status = INVALID_FORMAT
+        elif CHECK_DIGIT_REQUIRED and not luhn_valid(imei):
+            status = INVALID_CHECK_DIGIT
+        elif imei in seen:
+            status = DUPLICATE_IN_BATCH
+        else:
+            status = ACCEPTED
+            seen.add(imei)
+        results.append({'imei': imei, 'status': status})
+    return results
+
+
+def find_existing_imeis(cursor, imeis, max_age=0):
+    """The subset of ``imeis`` already in product_imei.
+
+    The worker's Bloom filter rules most new IMEIs out from memory; only its
+    probable hits are looked up.
+    """
+    imeis = probable_duplicates(imeis, max_age)
+    existing = set()
+    for start in range(0, len(imeis), LOOKUP_BATCH):
+        batch = imeis[start:start + LOOKUP_BATCH]
+        cursor.execute(f"SELECT imei FROM product_imei WHERE imei IN ({','.join('?' * len(batch))})", batch)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def check_imeis(cursor, imeis, max_age=0):
+    """Validate a batch and look up existing IMEIs; returns the per-IMEI results"""
+    results = validate_imeis(imeis)
+    existing = find_existing_imeis(cursor, [entry['imei'] for entry in results if entry['status'] == ACCEPTED], max_age)
+    for entry in results:
+        if entry['status'] == ACCEPTED and entry['imei'] in existing:
+            entry['status'] = ALREADY_EXISTS
+    return results
+
+
+def accepted_or_raise(results):
+    """The accepted IMEIs of a checked batch; raises ImeiRejected if any were not"""
+    rejected = [entry for entry in results if entry['status'] != ACCEPTED]
+    if rejected:
+        raise ImeiRejected(rejected)
+    return [entry['imei'] for entry in results]
+
+
+def insert_imeis(cursor, product_id, imeis, status='available', **columns):
+    """Bulk insert already-checked IMEIs; extra keyword arguments are product_imei columns"""
+    names = ['product_id', 'imei', 'status'] + list(columns)
+    fixed = list(columns.values())
+    cursor.executemany(
+        f"INSERT INTO product_imei ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+        [(product_id, imei, status, *fixed) for imei in imeis]
+    )
+    add_imeis(imeis)
+
+
+def ingest_imeis(cursor, product_id, imeis, status='available', partial=False, **columns):
+    """Check and insert a batch of IMEIs for one product.
+
+    Extra keyword arguments are product_imei columns set on every row
+    (grn_id, stock_movement_id, sale_id, sold_date, received_date). By default
+    the batch is all-or-nothing and ImeiRejected is raised before anything is
+    written; with ``partial=True`` the accepted IMEIs are added and the
+    rejected ones are only reported. Returns the per-IMEI results.
+    """
+    results = check_imeis(cursor, imeis)
+    if partial:
+        accepted = [entry['imei'] for entry in results if entry['status'] == ACCEPTED]
+    else:
+        accepted = accepted_or_raise(results)
+    if accepted:
+        insert_imeis(cursor, product_id, accepted, status, **columns)
+    return results
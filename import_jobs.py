@@ -0,0 +1,340 @@
+"""Resumable product import jobs for very large CSV/XLSX files.
+
+An upload is staged to disk and read back in chunks (CSV via pandas
+``chunksize``, XLSX via openpyxl read-only mode), so memory stays bounded by
+the chunk size. Each chunk is committed together with the job's progress
+counters, which makes a job resumable from its last committed row after a
+crash and lets any worker report progress from the ``import_jobs`` row.
+"""
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import pandas as pd
+from werkzeug.utils import secure_filename
+
+from admission import acquire_slot, release_slot
+from product_import import (
+    import_product_frame, new_import_stats, normalize_import_frame, ImportAborted
+)
+
+DATABASE = 'inventory.db'
+STAGING_FOLDER = 'uploads/imports'
+CHUNK_ROWS = 5000
+PREVIEW_ROWS = 3
+PREVIEW_SAMPLE_ROWS = 1000
+MAX_STORED_ERRORS = 1000
+# A running job whose heartbeat is older than this is treated as interrupted
+JOB_STALE_SECONDS = 300
+
+ALLOWED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_import_jobs(cursor):
+    """Create the import_jobs table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            staged_path TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            update_existing INTEGER DEFAULT 0,
+            skip_errors INTEGER DEFAULT 1,
+            auto_create INTEGER DEFAULT 1,
+            total_rows INTEGER,
+            committed_rows INTEGER DEFAULT 0,
+            imported INTEGER DEFAULT 0,
+            updated INTEGER DEFAULT 0,
+            created_categories INTEGER DEFAULT 0,
+            created_brands INTEGER DEFAULT 0,
+            created_models INTEGER DEFAULT 0,
+            error_count INTEGER DEFAULT 0,
+            errors TEXT DEFAULT '[]',
+            error_message TEXT,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    ''')
+
+
+def stage_upload(file):
+    """Stream an uploaded file to the staging folder; returns the staged path"""
+    filename = secure_filename(file.filename or '')
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise ValueError('Only CSV, XLSX and XLS files can be imported')
+
+    os.makedirs(STAGING_FOLDER, exist_ok=True)
+    path = os.path.join(STAGING_FOLDER, f"{uuid.uuid4().hex}_{filename}")
+    file.save(path)
+    return path
+
+
+def count_rows(path):
+    """Number of data rows in a staged file, without loading it into memory"""
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8', errors='replace') as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+    if lower.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        return max(max_row - 1, 0) if max_row else None
+    return len(pd.read_excel(path, dtype=str))
+
+
+def _xlsx_chunks(path, start_row, chunk_size, max_rows=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ['' if value is None else str(value).strip() for value in header]
+
+        rows = itertools.islice(rows, start_row, None if max_rows is None else start_row + max_rows)
+        offset = start_row
+        while True:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                break
+            # Trailing empty cells are omitted in read-only mode
+            batch = [tuple(row) + (None,) * (len(columns) - len(row)) for row in batch]
+            chunk = pd.DataFrame([row[:len(columns)] for row in batch], columns=columns, dtype=object)
+            chunk = chunk.astype('string')
+            yield offset, chunk
+            offset += len(batch)
+    finally:
+        workbook.close()
+
+
+def iter_import_chunks(path, start_row=0, chunk_size=CHUNK_ROWS, max_rows=None):
+    """Yield ``(row_offset, DataFrame)`` chunks of a staged file from ``start_row``"""
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        reader = pd.read_csv(
+            path, dtype=str, chunksize=chunk_size, nrows=max_rows,
+            skiprows=range(1, start_row + 1) if start_row else None
+        )
+        offset = start_row
+        for chunk in reader:
+            yield offset, chunk
+            offset += len(chunk)
+    elif lower.endswith('.xlsx'):
+        yield from _xlsx_chunks(path, start_row, chunk_size, max_rows)
+    else:
+        # Legacy .xls has no streaming reader; slice it after loading
+        df = pd.read_excel(path, dtype=str)
+        end = len(df) if max_rows is None else min(len(df), start_row + max_rows)
+        for offset in range(start_row, end, chunk_size):
+            yield offset, df.iloc[offset:min(offset + chunk_size, end)]
+
+
+def preview_import_file(path, preview_rows=PREVIEW_ROWS, sample_rows=PREVIEW_SAMPLE_ROWS):
+    """First rows of a staged file plus validation of a leading sample"""
+    chunks = list(iter_import_chunks(path, chunk_size=sample_rows, max_rows=sample_rows))
+    sample = pd.concat([chunk for _, chunk in chunks]) if chunks else pd.DataFrame()
+    total_rows = count_rows(path)
+    if total_rows is None:
+        total_rows = len(sample)
+
+    _, errors = normalize_import_frame(sample)
+    messages = [
+        f"Row {row}: Product name is required" if message is None else f"Row {row}: {message}"
+        for row, message in errors
+    ]
+    sampled = total_rows > len(sample)
+    sample_valid = len(sample) - len(errors)
+    valid_count = round(sample_valid / len(sample) * total_rows) if sampled and len(sample) else sample_valid
+
+    return {
+        'total_rows': total_rows,
+        'preview_rows': sample.head(preview_rows).astype(object).fillna('').to_dict('records'),
+        'columns': list(sample.columns),
+        'validation': {
+            'valid_count': valid_count,
+            'error_count': len(errors),
+            'errors': messages[:50],
+            'sampled': sampled,
+            'sample_size': len(sample)
+        }
+    }
+
+
+def create_import_job(cursor, filename, staged_path, update_existing, skip_errors, auto_create, user_id=None):
+    cursor.execute('''
+        INSERT INTO import_jobs (filename, staged_path, update_existing, skip_errors, auto_create, total_rows, created_by)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (filename, staged_path, int(update_existing), int(skip_errors), int(auto_create),
+          count_rows(staged_path), user_id))
+    return cursor.lastrowid
+
+
+def get_import_job(cursor, job_id):
+    """Job row shaped for the status endpoint"""
+    cursor.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    job = dict(row)
+    job.pop('staged_path')
+    job['errors'] = json.loads(job['errors'] or '[]')
+    job['progress_percent'] = (
+        round(job['committed_rows'] / job['total_rows'] * 100, 1)
+        if job['total_rows'] else (100.0 if job['status'] == 'completed' else 0.0)
+    )
+    return job
+
+
+def is_resumable(job):
+    if job['status'] in ('interrupted', 'pending'):
+        return True
+    if job['status'] == 'running':
+        updated_at = datetime.fromisoformat(str(job['updated_at']))
+        return (datetime.utcnow() - updated_at).total_seconds() > JOB_STALE_SECONDS
+    return False
+
+
+def _save_progress(cursor, job_id, committed_rows, stats, error_count):
+    cursor.execute('''
+        UPDATE import_jobs SET
+            committed_rows = ?, imported = ?, updated = ?,
+            created_categories = ?, created_brands = ?, created_models = ?,
+            error_count = ?, errors = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (committed_rows, stats['imported'], stats['updated'],
+          stats['created_categories'], stats['created_brands'], stats['created_models'],
+          error_count, json.dumps(stats['errors'][:MAX_STORED_ERRORS]), job_id))
+
+
+def _set_status(conn, job_id, status, error_message=None):
+    completed = ", completed_at = CURRENT_TIMESTAMP" if status == 'completed' else ''
+    conn.execute(f'''
+        UPDATE import_jobs SET status = ?, error_message = ?, updated_at = CURRENT_TIMESTAMP{completed}
+        WHERE id = ?
+    ''', (status, error_message, job_id))
+    conn.commit()
+
+
+def run_import_job(job_id):
+    """Process a job from its last committed row; returns the final job dict"""
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,))
+        job = dict(cursor.fetchone())
+        path = job['staged_path']
+        options = {
+            'update_existing': bool(job['update_existing']),
+            'skip_errors': bool(job['skip_errors']),
+            'auto_create': bool(job['auto_create']),
+        }
+
+        stats = new_import_stats()
+        for key in ('imported', 'updated', 'created_categories', 'created_brands', 'created_models'):
+            stats[key] = job[key]
+        stats['errors'] = json.loads(job['errors'] or '[]')
+        error_count = job['error_count']
+
+        try:
+            # Strict imports must not commit anything if any row would fail,
+            # so validate the whole file first without holding the write lock
+            if not options['skip_errors'] and job['committed_rows'] == 0:
+                _set_status(conn, job_id, 'validating')
+                seen_skus = set()
+                for offset, chunk in iter_import_chunks(path):
+                    import_product_frame(conn, chunk, row_offset=offset, seen_skus=seen_skus,
+                                         dry_run=True, **options)
+
+            _set_status(conn, job_id, 'running')
+            seen_skus = set()
+            for offset, chunk in iter_import_chunks(path, start_row=job['committed_rows']):
+                errors_before = len(stats['errors'])
+                import_product_frame(conn, chunk, row_offset=offset, stats=stats,
+                                     seen_skus=seen_skus, **options)
+                error_count += len(stats['errors']) - errors_before
+                del stats['errors'][MAX_STORED_ERRORS:]
+                _save_progress(cursor, job_id, offset + len(chunk), stats, error_count)
+                conn.commit()
+
+            _set_status(conn, job_id, 'completed')
+            if os.path.exists(path):
+                os.remove(path)
+        except ImportAborted as e:
+            conn.rollback()
+            cursor.execute('SELECT committed_rows FROM import_jobs WHERE id = ?', (job_id,))
+            committed_rows = cursor.fetchone()[0]
+            if committed_rows:
+                # A row passed validation but failed on write (e.g. its SKU was
+                # created meanwhile): earlier chunks are in, so keep the file
+                # and let the job resume once the conflict is fixed
+                _set_status(conn, job_id, 'interrupted',
+                            f'Stopped after {committed_rows} rows: {e}. Fix the conflict and resume the job.')
+            else:
+                # Nothing was written and rerunning would fail the same way
+                _set_status(conn, job_id, 'failed', str(e))
+                if os.path.exists(path):
+                    os.remove(path)
+        except Exception as e:
+            # Committed chunks stay; the job can be resumed from committed_rows
+            conn.rollback()
+            _set_status(conn, job_id, 'interrupted', str(e))
+
+        return get_import_job(cursor, job_id)
+    finally:
+        conn.close()
+
+
+def _run_in_slot(job_id, slot):
+    try:
+        run_import_job(job_id)
+    finally:
+        release_slot(slot)
+
+
+def start_import_job(job_id, slot):
+    """Run a job on a background thread of this worker.
+
+    ``slot`` is an import admission slot the caller acquired; the thread holds
+    it until the job ends, so the import limit covers the job and not just the
+    request that started it.
+    """
+    thread = threading.Thread(target=_run_in_slot, args=(job_id, slot), daemon=True,
+                              name=f'import-job-{job_id}')
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python import_jobs.py <job_id>  (resume an interrupted import job)")
+        sys.exit(1)
+
+    slot = acquire_slot('import')
+    try:
+        result = run_import_job(int(sys.argv[1]))
+    finally:
+        release_slot(slot)
+    print(f"Job {result['id']}: {result['status']} - {result['committed_rows']}/{result['total_rows']} rows, "
+          f"{result['imported']} imported, {result['updated']} updated, {result['error_count']} errors")
@@ -0,0 +1,217 @@
+"""Point-in-time inventory valuation from periodic stock snapshots.
+
+A snapshot records every product's quantity and cost price, together with
+the id of the last stock movement it includes. Stock at any moment D is
+then the nearest snapshot - or the live ``products`` table, which is a
+snapshot of now - adjusted by the ledger between the two: movements the
+snapshot does not include but dated at or before D are added, movements it
+includes but dated after D are taken off. Both sets are range scans on
+``stock_movements`` (by id and by created_at), so a valuation reads the
+movements of the gap rather than the whole history, and back-dated
+movements are accounted for on either side. Values use the cost price
+recorded in that snapshot.
+
+Usage:
+    python inventory_snapshots.py take [daily|monthly]   # run nightly from cron
+    python inventory_snapshots.py prune                  # drop daily snapshots past retention
+"""
+import sqlite3
+from datetime import date, datetime
+
+DATABASE = 'inventory.db'
+
+SNAPSHOT_KINDS = ('daily', 'monthly', 'manual')
+# Daily snapshots are kept this long; monthly and manual ones are kept
+DAILY_RETENTION_DAYS = 62
+
+# Stock status filter -> condition on the as-of quantity
+STOCK_LEVELS = {
+    'low': 'quantity <= min_stock_level AND quantity > 0',
+    'out': 'quantity = 0',
+    'good': 'quantity > min_stock_level',
+}
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_inventory_snapshots(cursor):
+    """Create the snapshot tables and the created_at index the as-of delta scans"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL DEFAULT 'manual',
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_movement_id INTEGER NOT NULL,
+            product_count INTEGER NOT NULL,
+            total_quantity INTEGER NOT NULL,
+            total_value REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_snapshots_taken_at ON stock_snapshots(taken_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+            snapshot_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            cost_price REAL,
+            PRIMARY KEY (snapshot_id, product_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_movements_created_at ON stock_movements(created_at)')
+
+
+def take_snapshot(conn, kind='manual'):
+    """Record every product's stock and cost and commit; returns the snapshot"""
+    if kind not in SNAPSHOT_KINDS:
+        raise ValueError(f"Unknown snapshot kind '{kind}'")
+
+    cursor = conn.cursor()
+    # Stock and the last movement id must be read at the same point
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            INSERT INTO stock_snapshots (kind, last_movement_id, product_count, total_quantity, total_value)
+            SELECT ?, (SELECT COALESCE(MAX(id), 0) FROM stock_movements),
+                   COUNT(*), COALESCE(SUM(current_stock), 0), COALESCE(SUM(current_stock * cost_price), 0)
+            FROM products
+        ''', (kind,))
+        snapshot_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO stock_snapshot_items (snapshot_id, product_id, quantity, cost_price)
+            SELECT ?, id, current_stock, cost_price FROM products
+        ''', (snapshot_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    cursor.execute('SELECT * FROM stock_snapshots WHERE id = ?', (snapshot_id,))
+    return dict(cursor.fetchone())
+
+
+def prune_snapshots(conn, retention_days=DAILY_RETENTION_DAYS):
+    """Delete daily snapshots older than ``retention_days``; returns how many"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id FROM stock_snapshots
+        WHERE kind = 'daily' AND taken_at < datetime('now', ?)
+    ''', (f'-{int(retention_days)} days',))
+    ids = [row['id'] for row in cursor.fetchall()]
+    cursor.executemany('DELETE FROM stock_snapshot_items WHERE snapshot_id = ?', [(id,) for id in ids])
+    cursor.executemany('DELETE FROM stock_snapshots WHERE id = ?', [(id,) for id in ids])
+    conn.commit()
+    return len(ids)
+
+
+def list_snapshots(cursor):
+    cursor.execute('SELECT * FROM stock_snapshots ORDER BY taken_at DESC, id DESC')
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def parse_as_of(value):
+    """Ledger timestamp for an as-of date or datetime; a bare date means the end of that day"""
+    try:
+        return f'{date.fromisoformat(value).isoformat()} 23:59:59.999999'
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S.%f')
+    except (TypeError, ValueError):
+        raise ValueError('as_of must be a date (YYYY-MM-DD) or datetime')
+
+
+def nearest_snapshot(cursor, as_of):
+    """The snapshot closest in time to ``as_of``, or None if the live stock is closer"""
+    cursor.execute('''
+        SELECT *, ABS(julianday(taken_at) - julianday(?)) AS distance
+        FROM stock_snapshots
+        ORDER BY distance, id DESC
+        LIMIT 1
+    ''', (as_of,))
+    snapshot = cursor.fetchone()
+    cursor.execute("SELECT ABS(julianday('now') - julianday(?))", (as_of,))
+    if snapshot is None or cursor.fetchone()[0] <= snapshot['distance']:
+        return None
+    return dict(snapshot)
+
+
+def read_valuation(cursor, as_of, category_id=None, stock_status=None):
+    """Per-product stock and value at ledger time ``as_of`` (see ``parse_as_of``).
+
+    Returns ``(snapshot, items)``: the snapshot the figures were derived
+    from (None for the live stock) and the products with stock or movements
+    on record by then, by name.
+    """
+    snapshot = nearest_snapshot(cursor, as_of)
+    if snapshot:
+        base = 'SELECT product_id, quantity, cost_price FROM stock_snapshot_items WHERE snapshot_id = ?'
+        base_params = [snapshot['id']]
+        last_movement_id = snapshot['last_movement_id']
+    else:
+        base = 'SELECT id AS product_id, current_stock AS quantity, cost_price FROM products'
+        base_params = []
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM stock_movements')
+        last_movement_id = cursor.fetchone()[0]
+
+    category = 'AND p.category_id = ?' if category_id else ''
+    level = f'WHERE {STOCK_LEVELS[stock_status]}' if stock_status in STOCK_LEVELS else ''
+    cursor.execute(f'''
+        WITH base AS ({base}),
+        gap AS (
+            SELECT product_id, quantity FROM stock_movements WHERE id > ? AND created_at <= ?
+            UNION ALL
+            SELECT product_id, -quantity FROM stock_movements INDEXED BY idx_stock_movements_created_at
+            WHERE created_at > ? AND id <= ?
+        ),
+        delta AS (
+            SELECT product_id, SUM(quantity) AS quantity FROM gap GROUP BY product_id
+        ),
+        valuation AS (
+            SELECT
+                p.sku,
+                p.name,
+                c.name AS category,
+                b.name AS brand,
+                m.name AS model,
+                COALESCE(base.quantity, 0) + COALESCE(delta.quantity, 0) AS quantity,
+                p.min_stock_level,
+                COALESCE(base.cost_price, p.cost_price) AS cost_price
+            FROM products p
+            LEFT JOIN base ON base.product_id = p.id
+            LEFT JOIN delta ON delta.product_id = p.id
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN brands b ON p.brand_id = b.id
+            LEFT JOIN models m ON p.model_id = m.id
+            WHERE (base.product_id IS NOT NULL OR delta.product_id IS NOT NULL)
+              AND p.created_at <= ? {category}
+        )
+        SELECT *, quantity * cost_price AS stock_value
+        FROM valuation
+        {level}
+        ORDER BY name
+    ''', base_params + [last_movement_id, as_of, as_of, last_movement_id, as_of]
+         + ([category_id] if category_id else []))
+    return snapshot, [dict(row) for row in cursor.fetchall()]
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('take', 'prune'):
+        print(__doc__)
+        sys.exit(1)
+
+    conn = get_db()
+    init_inventory_snapshots(conn.cursor())
+    conn.commit()
+    if sys.argv[1] == 'take':
+        snapshot = take_snapshot(conn, sys.argv[2] if len(sys.argv) > 2 else 'daily')
+        print(f"📸 Snapshot {snapshot['id']}: {snapshot['product_count']} products, "
+              f"{snapshot['total_quantity']} units, value {snapshot['total_value']:.2f}")
+    else:
+        print(f"🧹 Pruned {prune_snapshots(conn)} daily snapshots")
+    conn.close()
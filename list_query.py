@@ -0,0 +1,307 @@
+"""Keyset-paginated list queries shared by the list endpoints.
+
+Each entry in LISTS describes one endpoint: its table and joins, the fields
+a client may project with ``?fields=``, the sorts it may ask for and the
+whitelisted filters. Every sort is on an indexed key with the row id as tie
+breaker, and a page continues from an opaque cursor holding the last row's
+key and id, so reading any page is one index range scan of ``limit`` rows
+however much history sits before it. Sort keys must be NOT NULL or have a
+default, otherwise rows with a NULL key would be skipped.
+
+Totals are optional (``?total=1``) and come from a per-worker count cache,
+so they may trail the data by up to COUNT_CACHE_TTL_SECONDS (a restore
+drops them at once).
+"""
+import base64
+import json
+import threading
+import time
+
+from backup import read_restore_epoch
+from service_search import MATCHING_JOB_IDS, search_words
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+COUNT_CACHE_TTL_SECONDS = 60
+
+# Indexes behind the sorts and the filters that are combined with them
+LIST_INDEXES = {
+    'idx_purchase_orders_created_at': 'purchase_orders(created_at)',
+    'idx_purchase_orders_status_created_at': 'purchase_orders(status, created_at)',
+    'idx_purchase_orders_order_date': 'purchase_orders(order_date)',
+    'idx_grns_created_at': 'grns(created_at)',
+    'idx_grns_po_id': 'grns(po_id)',
+    'idx_service_jobs_created_at': 'service_jobs(created_at)',
+    'idx_service_jobs_status_created_at': 'service_jobs(status, created_at)',
+    'idx_service_jobs_technician': 'service_jobs(technician_id, created_at)',
+    'idx_customers_name': 'customers(name)',
+    'idx_customers_status_name': 'customers(status, name)',
+    'idx_customers_created_at': 'customers(created_at)',
+    'idx_stock_movements_type_created_at': 'stock_movements(type, created_at)',
+    'idx_product_imei_stock_movement_id': 'product_imei(stock_movement_id)',
+    'idx_quick_orders_created_at': 'quick_orders(created_at)',
+    'idx_technicians_name': 'technicians(name)',
+    'idx_pos_sales_created_at': 'pos_sales(created_at)',
+    # Also created by dashboard_summary; the sale_date sort and date filters need it too
+    'idx_pos_sales_sale_date': 'pos_sales(sale_date)',
+}
+
+# name -> table, alias, joins, base condition, extra fields (name -> SQL),
+# sorts (name -> SQL; a leading '-' in the request means descending), the
+# default sort, and filters as query parameter -> (condition, match) where
+# every '?' in the condition is bound to the value; match 'contains' wraps
+# it in % for LIKE and a function rewrites it (returning None drops the filter)
+LISTS = {
+    'purchase_orders': {
+        'table': 'purchase_orders', 'alias': 'po', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'created_at': 'po.created_at', 'order_date': 'po.order_date'},
+        'default_sort': '-created_at',
+        'filters': {
+            'status': ('po.status = ?', None),
+            'payment_status': ('po.payment_status = ?', None),
+            'supplier': ('po.supplier_name LIKE ?', 'contains'),
+            'search': ('(po.po_number LIKE ? OR po.supplier_name LIKE ?)', 'contains'),
+            'from_date': ('po.order_date >= ?', None),
+            'to_date': ("po.order_date < DATE(?, '+1 day')", None),
+        },
+    },
+    'grns': {
+        'table': 'grns', 'alias': 'g', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'created_at': 'g.created_at'},
+        'default_sort': '-created_at',
+        'filters': {
+            'po_id': ('g.po_id = ?', None),
+            'payment_status': ('g.payment_status = ?', None),
+            'search': ('(g.grn_number LIKE ? OR g.po_number LIKE ? OR g.supplier_name LIKE ?)', 'contains'),
+            'from_date': ('g.created_at >= ?', None),
+            'to_date': ("g.created_at < DATE(?, '+1 day')", None),
+        },
+    },
+    'service_jobs': {
+        'table': 'service_jobs', 'alias': 'sj',
+        'joins': 'LEFT JOIN technicians t ON sj.technician_id = t.id', 'where': '',
+        'extra': {'technician_name': 't.name'},
+        'sorts': {'created_at': 'sj.created_at'},
+        'default_sort': '-created_at',
+        'filters': {
+            'status': ('sj.status = ?', None),
+            'technician_id': ('sj.technician_id = ?', None),
+            'search': (f'sj.id IN ({MATCHING_JOB_IDS})', search_words),
+            'from_date': ('sj.created_at >= ?', None),
+            'to_date': ("sj.created_at < DATE(?, '+1 day')", None),
+        },
+    },
+    'customers': {
+        'table': 'customers', 'alias': 'c', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'name': 'c.name', 'created_at': 'c.created_at'},
+        'default_sort': 'name',
+        'filters': {
+            'status': ('c.status = ?', None),
+            'city': ('c.city = ?', None),
+            'search': ('(c.name LIKE ? OR c.phone LIKE ? OR c.email LIKE ?)', 'contains'),
+        },
+    },
+    'stock_adjustments': {
+        'table': 'stock_movements', 'alias': 'sm',
+        'joins': 'LEFT JOIN products p ON sm.product_id = p.id',
+        'where': "sm.type = 'adjustment'",
+        'columns': ('id', 'product_id', 'quantity', 'notes', 'created_at'),
+        'extra': {
+            'product_name': 'p.name',
+            'sku': 'p.sku',
+            'imei_count': '(SELECT COUNT(*) FROM product_imei pi WHERE pi.stock_movement_id = sm.id)',
+        },
+        'sorts': {'created_at': 'sm.created_at'},
+        'default_sort': '-created_at',
+        'filters': {
+            'product_id': ('sm.product_id = ?', None),
+            'from_date': ('sm.created_at >= ?', None),
+            'to_date': ("sm.created_at < DATE(?, '+1 day')", None),
+        },
+    },
+    'quick_orders': {
+        'table': 'quick_orders', 'alias': 'qo', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'created_at': 'qo.created_at'},
+        'default_sort': '-created_at',
+        'filters': {
+            'created_by': ('qo.created_by = ?', None),
+            'search': ('qo.order_number LIKE ?', 'contains'),
+            'from_date': ('qo.created_at >= ?', None),
+            'to_date': ("qo.created_at < DATE(?, '+1 day')", None),
+        },
+    },
+    'technicians': {
+        'table': 'technicians', 'alias': 't', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'name': 't.name'},
+        'default_sort': 'name',
+        'filters': {
+            'status': ('t.status = ?', None),
+            'specialization': ('t.specialization = ?', None),
+            'search': ('(t.name LIKE ? OR t.phone LIKE ?)', 'contains'),
+        },
+    },
+    'pos_sales': {
+        'table': 'pos_sales', 'alias': 's', 'joins': '', 'where': '', 'extra': {},
+        'sorts': {'created_at': 's.created_at', 'sale_date': 's.sale_date'},
+        'default_sort': '-created_at',
+        'filters': {
+            'transaction_type': ('s.transaction_type = ?', None),
+            'payment_method': ('s.payment_method = ?', None),
+            'customer_phone': ('s.customer_phone = ?', None),
+            'search': ('(s.sale_number LIKE ? OR s.customer_name LIKE ? OR s.customer_phone LIKE ?)', 'contains'),
+            'from_date': ('s.sale_date >= ?', None),
+            'to_date': ("s.sale_date < DATE(?, '+1 day')", None),
+        },
+    },
+}
+
+_lock = threading.Lock()
+_fields = {}
+_count_cache = {}
+
+
+class ListQueryError(ValueError):
+    """Raised for an unknown field, sort or filter value, or a malformed cursor"""
+
+
+def init_list_queries(cursor):
+    """Index the sort keys and filters of the list endpoints"""
+    for name, target in LIST_INDEXES.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def _list_fields(cursor, name):
+    """Output field -> SQL for a list, read once per worker"""
+    fields = _fields.get(name)
+    if fields is None:
+        spec = LISTS[name]
+        columns = spec.get('columns')
+        if columns is None:
+            cursor.execute(f"PRAGMA table_info({spec['table']})")
+            columns = [row[1] for row in cursor.fetchall()]
+        fields = {column: f"{spec['alias']}.{column}" for column in columns}
+        fields.update(spec['extra'])
+        with _lock:
+            fields = _fields.setdefault(name, fields)
+    return fields
+
+
+def encode_cursor(sort, key, id):
+    return base64.urlsafe_b64encode(json.dumps([sort, key, id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """The (key, id) a page continues after; the cursor must come from the same sort"""
+    try:
+        token_sort, key, id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ListQueryError('Malformed cursor')
+    if token_sort != sort or not isinstance(id, int) or isinstance(id, bool):
+        raise ListQueryError('Cursor does not belong to this sort')
+    # Keys are bound straight into the page query, so only scalar JSON values pass
+    if key is not None and (isinstance(key, bool) or not isinstance(key, (str, int, float))):
+        raise ListQueryError('Malformed cursor')
+    return key, id
+
+
+def _conditions(spec, args):
+    clauses = [spec['where']] if spec['where'] else []
+    params = []
+    applied = []
+    for param, (condition, match) in spec['filters'].items():
+        value = args.get(param, '').strip()
+        if not value:
+            continue
+        if match == 'contains':
+            value = f'%{value}%'
+        elif match:
+            value = match(value)
+            if value is None:
+                continue
+        clauses.append(condition)
+        params.extend([value] * condition.count('?'))
+        applied.append((param, value))
+    return clauses, params, tuple(applied)
+
+
+def count_list(cursor, name, args):
+    """Row count for a list and filter, cached per worker for COUNT_CACHE_TTL_SECONDS"""
+    spec = LISTS[name]
+    clauses, params, applied = _conditions(spec, args)
+    key = (name, applied)
+    now = time.monotonic()
+    epoch = read_restore_epoch(cursor)
+    with _lock:
+        cached = _count_cache.get(key)
+    if cached and now - cached[1] < COUNT_CACHE_TTL_SECONDS and cached[2] == epoch:
+        return cached[0]
+
+    # Filters never touch the joined tables' columns, so the joins are left out
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM {spec['table']} {spec['alias']}
+        WHERE {' AND '.join(clauses) or '1=1'}
+    ''', params)
+    total = cursor.fetchone()[0]
+    with _lock:
+        if len(_count_cache) > 1000:
+            _count_cache.clear()
+        _count_cache[key] = (total, now, epoch)
+    return total
+
+
+def read_list(cursor, name, args):
+    """One page of the ``name`` list for the request arguments ``args``.
+
+    Understands ``limit``, ``cursor``, ``sort`` (a sort name, '-' for
+    descending), ``fields`` (comma separated) and the list's filters.
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    Raises ListQueryError for anything outside the whitelists.
+    """
+    spec = LISTS[name]
+    fields = _list_fields(cursor, name)
+
+    sort = args.get('sort') or spec['default_sort']
+    descending = sort.startswith('-')
+    key_sql = spec['sorts'].get(sort.lstrip('-'))
+    if key_sql is None:
+        raise ListQueryError(f"Unknown sort '{sort}'; use one of: {', '.join(spec['sorts'])}")
+
+    requested = [field.strip() for field in args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in requested if field not in fields]
+    if unknown:
+        raise ListQueryError(f"Unknown field(s): {', '.join(unknown)}")
+    projected = requested or list(fields)
+
+    try:
+        limit = int(args.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise ListQueryError('limit must be a number')
+    if limit < 1:
+        raise ListQueryError('limit must be >= 1')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    clauses, params, _ = _conditions(spec, args)
+    alias = spec['alias']
+    if args.get('cursor'):
+        key, id = decode_cursor(args['cursor'], sort)
+        # Range on the key first so the index bounds the scan, then the tie
+        op = '<' if descending else '>'
+        clauses.append(f'{key_sql} {op}= ? AND ({key_sql} {op} ? OR {alias}.id {op} ?)')
+        params.extend([key, key, id])
+
+    direction = 'DESC' if descending else 'ASC'
+    select = ', '.join(f'{fields[field]} AS "{field}"' for field in projected)
+    cursor.execute(f'''
+        SELECT {select}, {key_sql} AS _list_key, {alias}.id AS _list_id
+        FROM {spec['table']} {alias} {spec['joins']}
+        WHERE {' AND '.join(clauses) or '1=1'}
+        ORDER BY {key_sql} {direction}, {alias}.id {direction}
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(sort, last['_list_key'], last['_list_id'])
+    return [{field: row[field] for field in projected} for row in rows[:limit]], next_cursor
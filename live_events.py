@@ -0,0 +1,269 @@
+"""Server-Sent Events for screens that follow sales, stock and service jobs.
+
+Write paths don't publish anything themselves: triggers on ``pos_sales``,
+``products`` and ``service_jobs`` append a compact event to ``live_events``
+in the same transaction as the change, so an event exists exactly when its
+change commits, whichever route, script or worker made it. SQLite runs one
+write transaction at a time, so ``seq`` order is commit order.
+
+Each worker process runs one broker thread with its own connection. It
+checks ``PRAGMA data_version`` (which moves whenever another connection
+commits) every POLL_SECONDS and only then reads the events past the last
+seq it saw, handing them to that worker's open streams. An open browser
+costs a queue rather than a poll, and the database sees one cheap check per
+worker. ``seq`` is also the SSE event id, so a reconnecting EventSource
+resumes from Last-Event-ID; a client that has fallen behind the retained
+events, or outside a restored database, gets a ``resync`` event instead.
+After a restore (the restore epoch moved) the broker starts over from the
+restored head and every open stream is told to resync.
+
+Streams hold a thread each, so the app runs on gthread workers (see
+.replit) and a worker serves at most MAX_STREAMS of them, fewer than its
+threads, leaving the rest for regular requests. Under sync workers every
+open tab would pin a whole worker.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import Response
+
+from backup import read_restore_epoch
+
+DATABASE = 'inventory.db'
+
+POLL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+EVENT_RETENTION = 5000
+# Keep below gunicorn's --threads
+MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', 24))
+# Events a slow stream may fall behind before it is told to resync
+STREAM_BUFFER = 1000
+
+_TRIGGERS = {
+    'trg_live_events_sale': '''
+        AFTER INSERT ON pos_sales
+        BEGIN
+            INSERT INTO live_events (event, data) VALUES ('sale', json_object(
+                'id', NEW.id, 'sale_number', NEW.sale_number, 'customer_name', NEW.customer_name,
+                'total_amount', NEW.total_amount, 'transaction_type', NEW.transaction_type));
+        END
+    ''',
+    # One trigger for both stock events, so 'stock' always precedes the
+    # threshold event of the same update
+    'trg_live_events_stock': '''
+        AFTER UPDATE OF current_stock ON products
+        WHEN OLD.current_stock IS NOT NEW.current_stock
+        BEGIN
+            INSERT INTO live_events (event, data) VALUES ('stock', json_object(
+                'product_id', NEW.id, 'current_stock', NEW.current_stock,
+                'change', NEW.current_stock - OLD.current_stock, 'min_stock_level', NEW.min_stock_level));
+            INSERT INTO live_events (event, data)
+            SELECT 'low_stock', json_object(
+                'product_id', NEW.id, 'name', NEW.name, 'sku', NEW.sku,
+                'current_stock', NEW.current_stock, 'min_stock_level', NEW.min_stock_level)
+            WHERE OLD.current_stock > NEW.min_stock_level AND NEW.current_stock <= NEW.min_stock_level;
+        END
+    ''',
+    'trg_live_events_service_insert': '''
+        AFTER INSERT ON service_jobs
+        BEGIN
+            INSERT INTO live_events (event, data) VALUES ('service_status', json_object(
+                'id', NEW.id, 'job_number', NEW.job_number, 'old_status', NULL, 'new_status', NEW.status,
+                'technician_id', NEW.technician_id));
+        END
+    ''',
+    'trg_live_events_service_status': '''
+        AFTER UPDATE OF status ON service_jobs
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            INSERT INTO live_events (event, data) VALUES ('service_status', json_object(
+                'id', NEW.id, 'job_number', NEW.job_number, 'old_status', OLD.status, 'new_status', NEW.status,
+                'technician_id', NEW.technician_id));
+        END
+    ''',
+    'trg_live_events_trim': f'''
+        AFTER INSERT ON live_events
+        BEGIN
+            DELETE FROM live_events WHERE seq <= NEW.seq - {EVENT_RETENTION};
+        END
+    ''',
+}
+
+# Earlier databases emitted low_stock from its own trigger
+_RETIRED_TRIGGERS = ('trg_live_events_low_stock',)
+
+_lock = threading.Lock()
+_streams = set()
+_state = {'thread': None, 'last_seq': 0, 'epoch': None}
+
+
+class TooManyStreams(Exception):
+    """Raised when this worker already serves MAX_STREAMS streams"""
+
+
+def init_live_events(cursor):
+    """Create the event table and the triggers that fill it"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS live_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute(f'''
+        SELECT name FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ({','.join('?' * len(_RETIRED_TRIGGERS))})
+    ''', _RETIRED_TRIGGERS)
+    retired = [row[0] for row in cursor.fetchall()]
+    if retired:
+        # The stock trigger from that layout lacks the low_stock insert
+        for name in retired + ['trg_live_events_stock']:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for name, body in _TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def _read_events(cursor, since):
+    cursor.execute('SELECT seq, event, data FROM live_events WHERE seq > ? ORDER BY seq', (since,))
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def _head(cursor):
+    """(oldest retained seq, newest seq), from the AUTOINCREMENT counter so trimming can't hide the head"""
+    cursor.execute('''
+        SELECT (SELECT MIN(seq) FROM live_events),
+               COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'live_events'), 0)
+    ''')
+    return cursor.fetchone()
+
+
+def _overflow(stream):
+    """End ``stream`` with a resync event"""
+    stream.overflowed = True
+    try:
+        # Wakes a stream waiting for its next event; seq 0 is never sent
+        stream.put_nowait((0, None, None))
+    except queue.Full:
+        pass
+
+
+def _broker():
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    version = None
+    while True:
+        time.sleep(POLL_SECONDS)
+        cursor.execute('PRAGMA data_version')
+        current = cursor.fetchone()[0]
+        if current == version:
+            continue
+        version = current
+        epoch = read_restore_epoch(cursor)
+        if epoch != _state['epoch']:
+            # Restored: the old seqs mean nothing here, so start from the
+            # restored head and have every stream resync
+            _state['epoch'] = epoch
+            _state['last_seq'] = _head(cursor)[1]
+            with _lock:
+                streams = list(_streams)
+            for stream in streams:
+                _overflow(stream)
+            continue
+        events = _read_events(cursor, _state['last_seq'])
+        if not events:
+            continue
+        _state['last_seq'] = events[-1][0]
+        with _lock:
+            streams = list(_streams)
+        for stream in streams:
+            for event in events:
+                try:
+                    stream.put_nowait(event)
+                except queue.Full:
+                    # Behind by a full buffer: it will be told to resync
+                    _overflow(stream)
+                    break
+
+
+def _ensure_broker():
+    with _lock:
+        if _state['thread'] is None or not _state['thread'].is_alive():
+            # Read before any stream subscribes, so the broker never starts past an event a stream needs
+            conn = sqlite3.connect(DATABASE)
+            try:
+                cursor = conn.cursor()
+                _state['epoch'] = read_restore_epoch(cursor)
+                _state['last_seq'] = _head(cursor)[1]
+            finally:
+                conn.close()
+            _state['thread'] = threading.Thread(target=_broker, name='live-events', daemon=True)
+            _state['thread'].start()
+
+
+def _format(seq, event, data):
+    return f'id: {seq}\nevent: {event}\ndata: {data}\n\n'
+
+
+def _stream(since):
+    stream = queue.Queue(STREAM_BUFFER)
+    stream.overflowed = False
+    if len(_streams) >= MAX_STREAMS:
+        raise TooManyStreams('Too many live update streams are open; try again later')
+
+    def body():
+        # Subscribed once the response starts, so an abandoned response never holds a slot
+        with _lock:
+            _streams.add(stream)
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+
+            # Subscribed first, so nothing committed from here on is missed;
+            # the backlog read and the queue may overlap and are deduplicated by seq
+            conn = sqlite3.connect(DATABASE)
+            try:
+                cursor = conn.cursor()
+                oldest, head = _head(cursor)
+                last = head if since is None else since
+                if since is not None and (since > head or (oldest is not None and since < oldest - 1)):
+                    yield _format(head, 'resync', '{}')
+                    last = head
+                backlog = _read_events(cursor, last)
+            finally:
+                conn.close()
+            for seq, event, data in backlog:
+                yield _format(seq, event, data)
+                last = seq
+
+            while not stream.overflowed:
+                try:
+                    seq, event, data = stream.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if seq > last:
+                    yield _format(seq, event, data)
+                    last = seq
+            yield _format(last, 'resync', '{}')
+        finally:
+            with _lock:
+                _streams.discard(stream)
+
+    return body()
+
+
+def event_stream_response(since=None):
+    """SSE response of the events after ``since`` (None: from now on).
+
+    Raises TooManyStreams when this worker is at MAX_STREAMS.
+    """
+    _ensure_broker()
+    return Response(
+        _stream(since),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,50 @@
+"""Token-bucket throttling of login attempts per username and per client IP.
+
+Buckets live in worker memory: a rejected attempt costs a dict lookup and
+never touches the database, so a brute-force script cannot add write
+contention to checkouts. With several workers the effective limit is the
+per-worker limit times the worker count; the per-account lockout in
+``authenticate_user`` remains the shared backstop.
+"""
+import threading
+import time
+
+# (capacity, tokens refilled per second)
+USERNAME_BUCKET = (5, 1 / 10)
+# Generous enough for a whole shift logging in from one store network
+IP_BUCKET = (30, 1 / 2)
+MAX_BUCKETS = 10000
+
+_lock = threading.Lock()
+_buckets = {}
+
+
+def _take(key, capacity, rate, now):
+    """Take a token from ``key``'s bucket; returns seconds to wait, or 0 if allowed"""
+    tokens, updated_at = _buckets.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens < 1:
+        _buckets[key] = (tokens, now)
+        return (1 - tokens) / rate
+    _buckets[key] = (tokens - 1, now)
+    return 0
+
+
+def _prune(now):
+    # Drop buckets that have refilled completely; they hold no state
+    for key, (tokens, updated_at) in list(_buckets.items()):
+        capacity, rate = USERNAME_BUCKET if key[0] == 'user' else IP_BUCKET
+        if tokens + (now - updated_at) * rate >= capacity:
+            del _buckets[key]
+
+
+def check_login_rate(username, remote_addr):
+    """Seconds the caller must wait before another attempt, or 0 if allowed"""
+    now = time.monotonic()
+    with _lock:
+        if len(_buckets) > MAX_BUCKETS:
+            _prune(now)
+        wait = _take(('ip', remote_addr), *IP_BUCKET, now)
+        if wait:
+            return wait
+        return _take(('user', (username or '').lower()), *USERNAME_BUCKET, now)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Migration script to fold the legacy audit_logs table into audit_log
+Older versions of migrate_user_management.py created audit_logs and copied
+audit_log into it, so rows that carry the id, action and time of an
+audit_log entry are copies and are skipped; the rest are appended in time
+order. Without --apply it only reports what it would do.
+
+Usage:
+    python migrate_audit_logs.py           # dry run
+    python migrate_audit_logs.py --apply   # copy the missing rows and drop audit_logs
+"""
+import sqlite3
+import sys
+
+from audit_store import AUDIT_COLUMNS
+
+DATABASE = 'inventory.db'
+
+# Legacy rows whose id, action and time already exist in audit_log
+DUPLICATE = '''
+    EXISTS (SELECT 1 FROM audit_log al
+            WHERE al.id = legacy.id AND al.action = legacy.action_type AND al.timestamp IS legacy.created_at)
+'''
+
+
+def migrate(apply=False):
+    print("Starting migration: Fold audit_logs into audit_log")
+    print("=" * 60)
+
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'audit_logs'")
+        if not cursor.fetchone():
+            print("✅ No audit_logs table; nothing to migrate")
+            return True
+
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS audit_log ({AUDIT_COLUMNS})')
+        cursor.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM({DUPLICATE}), 0) FROM audit_logs legacy
+        ''')
+        total, duplicates = cursor.fetchone()
+        print(f"audit_logs holds {total} row(s): {duplicates} already in audit_log, {total - duplicates} to copy")
+
+        if not apply:
+            print("\nDry run - rerun with --apply to copy the rows and drop audit_logs")
+            return True
+
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            INSERT INTO audit_log (user_id, action, details, ip_address, device_info, timestamp)
+            SELECT user_id, action_type, description, ip_address, device_info, created_at
+            FROM audit_logs legacy
+            WHERE NOT {DUPLICATE}
+            ORDER BY created_at, id
+        ''')
+        copied = cursor.rowcount
+        cursor.execute('DROP TABLE audit_logs')
+        conn.commit()
+        print(f"✅ Copied {copied} row(s) into audit_log and dropped audit_logs")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(0 if migrate(apply='--apply' in sys.argv) else 1)
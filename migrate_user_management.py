@@ -2,6 +2,8 @@ import sqlite3
 import bcrypt
 from datetime import datetime
 
+from audit_store import AUDIT_COLUMNS
+
 DATABASE = 'inventory.db'
 
 def migrate():
@@ -72,40 +74,10 @@ def migrate():
                 except sqlite3.OperationalError as e:
                     print(f"⚠ Column {col_name} migration skipped: {e}")
         
-        # Rename audit_log to audit_logs if needed
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='audit_log'")
-        if cursor.fetchone():
-            print("Found audit_log table, creating audit_logs...")
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action_type TEXT NOT NULL,
-                    description TEXT,
-                    ip_address TEXT,
-                    device_info TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            # Copy data if audit_log exists
-            cursor.execute("INSERT OR IGNORE INTO audit_logs SELECT * FROM audit_log")
-            print("✓ Created audit_logs table and migrated data")
-        else:
-            # Just create audit_logs if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action_type TEXT NOT NULL,
-                    description TEXT,
-                    ip_address TEXT,
-                    device_info TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            print("✓ Created audit_logs table")
+        # Audit entries live in audit_log (see audit_store.py); an audit_logs
+        # table from an earlier run is folded in by migrate_audit_logs.py
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS audit_log ({AUDIT_COLUMNS})")
+        print("✓ audit_log table ready")
         
         # Migrate existing user if password field exists but password_hash doesn't
         if "password" in columns and "password_hash" in columns:
@@ -0,0 +1,79 @@
+"""Bounded bcrypt hashing and verification.
+
+bcrypt is deliberately slow and releases the GIL while it runs, so it is
+executed on a small shared thread pool. Each hash needs one of HASH_WORKERS
+slots, taken without waiting: when every slot is busy a login is refused at
+once with HashingBusy instead of queueing behind the others, so a login
+storm costs the rejected requests no bcrypt time.
+
+The caller still waits for its own hash, so an admitted login occupies its
+request thread (a whole sync worker) for one bcrypt run; at most
+HASH_WORKERS such logins run per process at a time.
+"""
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+DATABASE = 'inventory.db'
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+HASH_WORKERS = int(os.environ.get('BCRYPT_WORKERS', min(4, os.cpu_count() or 1)))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(HASH_WORKERS)
+
+
+class HashingBusy(Exception):
+    """Raised when every bcrypt slot is taken"""
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy('Too many logins in progress. Please try again in a moment.')
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def hash_password(password):
+    """bcrypt hash of ``password`` at the configured cost"""
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _run(bcrypt.hashpw, password.encode('utf-8'), salt).result().decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    return _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8')).result()
+
+
+def needs_rehash(password_hash):
+    """True when a hash was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def _rehash(user_id, password):
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def schedule_rehash(user_id, password):
+    """Upgrade a stored hash to the current cost in the background, if a slot is free"""
+    try:
+        _run(_rehash, user_id, password)
+    except HashingBusy:
+        # Try again on the user's next login
+        pass
@@ -0,0 +1,172 @@
+"""In-process cache of users, roles and permissions.
+
+The whole authorization model is small, so each worker loads it in one pass
+and answers permission checks from dicts. Triggers on ``users``, ``roles``,
+``permissions`` and ``role_permissions`` bump a version stamp in
+``auth_version``; every request reads that single row (once, over a
+thread-local connection) and reloads the cache when it has moved, so an edit
+made through any worker or script takes effect on the next request everywhere.
+A short TTL bounds staleness for changes the triggers do not see.
+"""
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context
+
+DATABASE = 'inventory.db'
+
+ADMIN_ROLE = 'Admin'
+USER_CACHE_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_local = threading.local()
+_cache = {'version': None, 'loaded_at': 0}
+
+
+def init_permission_cache(cursor):
+    """Create the version stamp and the triggers that bump it"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS auth_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO auth_version (id, version) VALUES (1, 0)')
+
+    bump = 'UPDATE auth_version SET version = version + 1 WHERE id = 1;'
+    events = {
+        'users': ('INSERT', 'DELETE', 'UPDATE OF role_id, status, is_active'),
+        'roles': ('INSERT', 'DELETE', 'UPDATE'),
+        'permissions': ('INSERT', 'DELETE', 'UPDATE'),
+        'role_permissions': ('INSERT', 'DELETE', 'UPDATE'),
+    }
+    for table, table_events in events.items():
+        for event in table_events:
+            name = event.split()[0].lower()
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_auth_version_{table}_{name}
+                AFTER {event} ON {table}
+                BEGIN
+                    {bump}
+                END
+            ''')
+
+
+def _stamp_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE)
+        _local.conn = conn
+    return conn
+
+
+def _current_version():
+    """The database's auth version, read at most once per request"""
+    if has_request_context() and '_auth_version' in g:
+        return g._auth_version
+
+    row = _stamp_connection().execute('SELECT version FROM auth_version WHERE id = 1').fetchone()
+    version = row[0] if row else 0
+    if has_request_context():
+        g._auth_version = version
+    return version
+
+
+def _load(version):
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        # Both the original (name) and migrated (role_name / permission_key) schemas exist in the wild
+        cursor.execute('SELECT * FROM roles')
+        roles = {}
+        for row in cursor.fetchall():
+            keys = row.keys()
+            roles[row['id']] = row['role_name'] if 'role_name' in keys else row['name']
+
+        cursor.execute('SELECT * FROM permissions')
+        permissions = {}
+        for row in cursor.fetchall():
+            keys = row.keys()
+            key = row['permission_key'] if 'permission_key' in keys else row['name']
+            permissions[row['id']] = {
+                'permission_key': key,
+                'permission_name': row['permission_name'] if 'permission_name' in keys else row['name'],
+                'module': row['module'] if 'module' in keys else None
+            }
+
+        role_permissions = {}
+        cursor.execute('SELECT role_id, permission_id FROM role_permissions')
+        for row in cursor.fetchall():
+            if row['permission_id'] in permissions:
+                role_permissions.setdefault(row['role_id'], set()).add(row['permission_id'])
+
+        cursor.execute('SELECT id, username, role_id, is_active, status FROM users')
+        users = {
+            row['id']: {
+                'id': row['id'],
+                'username': row['username'],
+                'role_id': row['role_id'],
+                'active': bool(row['is_active']) and (row['status'] or 'active') == 'active'
+            }
+            for row in cursor.fetchall()
+        }
+    finally:
+        conn.close()
+
+    return {
+        'version': version,
+        'loaded_at': time.monotonic(),
+        'roles': roles,
+        'permissions': permissions,
+        'role_permissions': role_permissions,
+        'role_keys': {
+            role_id: frozenset(permissions[permission_id]['permission_key'] for permission_id in ids)
+            for role_id, ids in role_permissions.items()
+        },
+        'users': users,
+    }
+
+
+def _snapshot():
+    global _cache
+    version = _current_version()
+    cache = _cache
+    if cache['version'] != version or time.monotonic() - cache['loaded_at'] > USER_CACHE_TTL_SECONDS:
+        with _lock:
+            if _cache is cache:
+                _cache = _load(version)
+            cache = _cache
+    return cache
+
+
+def invalidate_permission_cache():
+    """Force this worker to reload on its next check"""
+    global _cache
+    with _lock:
+        _cache = {'version': None, 'loaded_at': 0}
+
+
+def get_user_record(user_id):
+    """Cached ``{id, username, role_id, role_name, active, is_admin, permissions}`` or None"""
+    cache = _snapshot()
+    user = cache['users'].get(user_id)
+    if user is None:
+        return None
+    role_name = cache['roles'].get(user['role_id'])
+    return {
+        **user,
+        'role_name': role_name,
+        'is_admin': role_name == ADMIN_ROLE,
+        'permissions': cache['role_keys'].get(user['role_id'], frozenset())
+    }
+
+
+def list_user_permissions(user_id):
+    """Permission dicts for a user's role, ordered by module and name"""
+    cache = _snapshot()
+    user = cache['users'].get(user_id)
+    role_id = user['role_id'] if user else None
+    permissions = [dict(cache['permissions'][permission_id]) for permission_id in cache['role_permissions'].get(role_id, ())]
+    return sorted(permissions, key=lambda p: (p['module'] or '', p['permission_name'] or ''))
@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 import random
 import string
 
+from imei_ingest import check_digit
+
 DATABASE = 'inventory.db'
 
 def generate_sku(prefix, index):
@@ -11,8 +13,9 @@ def generate_sku(prefix, index):
     return f"{prefix}-{index:05d}"
 
 def generate_imei():
-    """Generate a random 15-digit IMEI"""
-    return ''.join([str(random.randint(0, 9)) for _ in range(15)])
+    """Generate a random 15-digit IMEI with a valid check digit"""
+    body = ''.join([str(random.randint(0, 9)) for _ in range(14)])
+    return body + check_digit(body)
 
 def generate_phone():
     """Generate Indian phone number"""
@@ -0,0 +1,242 @@
+"""Rule-based bulk updates of products.
+
+A bulk update picks products by a filter (explicit IDs and/or the product
+list filters: category, brand, model, status, stock status, search) and
+applies rules to their fields: constants, or for prices an expression -
+percentage change, fixed amount, markup or margin on cost - with an
+optional rounding rule (to a step, or to a price ending such as .99).
+
+Both the filter and the rules compile to SQL, so the new values are worked
+out by one SELECT (the plan) and written by one UPDATE ... FROM that plan;
+only rows whose values actually change are touched. Every expression sees
+the values from before the update, so a rule on selling_price using cost
+is unaffected by a cost_price rule in the same request. A preview runs the
+same plan without writing and returns the before/after diff.
+"""
+import json
+
+from product_deletion import ARCHIVED_STATUS
+
+PREVIEW_LIMIT = 50
+
+PRICE_FIELDS = ('selling_price', 'cost_price', 'mrp')
+
+# Field -> type of constant it accepts
+CONSTANT_FIELDS = {
+    'category_id': int,
+    'brand_id': int,
+    'model_id': int,
+    'status': str,
+    'min_stock_level': int,
+    'storage_location': str,
+    'supplier_name': str,
+    'selling_price': float,
+    'cost_price': float,
+    'mrp': float,
+}
+
+# Filter param -> condition on products p
+FILTERS = {
+    'category_id': 'p.category_id = ?',
+    'brand_id': 'p.brand_id = ?',
+    'model_id': 'p.model_id = ?',
+    'status': 'p.status = ?',
+}
+
+STOCK_STATUS = {
+    'low': 'p.current_stock <= p.min_stock_level',
+    'out': 'p.current_stock = 0',
+    'in': 'p.current_stock > 0',
+}
+
+SEARCH = '''(p.name LIKE ? OR p.sku LIKE ? OR p.description LIKE ?
+             OR EXISTS (SELECT 1 FROM product_imei pi WHERE pi.product_id = p.id AND pi.imei LIKE ?))'''
+
+# Price op -> expression of the current value, the rule's value and cost;
+# cost-based ops leave products without a cost price unchanged
+PRICE_OPS = {
+    'set': '?',
+    'percent': '{field} * (1 + ? / 100.0)',
+    'add': '{field} + ?',
+    'markup_on_cost': 'CASE WHEN p.cost_price > 0 THEN p.cost_price * (1 + ? / 100.0) ELSE {field} END',
+    'margin_on_cost': 'CASE WHEN p.cost_price > 0 THEN p.cost_price / (1 - ? / 100.0) ELSE {field} END',
+}
+
+ROUNDING_MODES = {'nearest': 'ROUND', 'up': 'CEIL', 'down': 'FLOOR'}
+
+
+class BulkUpdateError(ValueError):
+    """A filter or rule the bulk update cannot apply"""
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise BulkUpdateError(f'{what} must be a number')
+    return value
+
+
+def _where(ids, filters):
+    clauses, params = [], []
+    if ids:
+        try:
+            ids = [int(id) for id in ids]
+        except (TypeError, ValueError):
+            raise BulkUpdateError('Product IDs must be integers')
+        clauses.append('p.id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(ids))
+
+    for name, value in (filters or {}).items():
+        if value in (None, ''):
+            continue
+        if name in FILTERS:
+            clauses.append(FILTERS[name])
+            params.append(value)
+        elif name == 'stock_status':
+            if value not in STOCK_STATUS:
+                raise BulkUpdateError(f"Unknown stock status '{value}'")
+            clauses.append(STOCK_STATUS[value])
+        elif name == 'search':
+            clauses.append(SEARCH)
+            params.extend([f'%{value}%'] * 4)
+        else:
+            raise BulkUpdateError(f"Unknown filter '{name}'")
+
+    if not clauses:
+        raise BulkUpdateError('Select products by ID or by a filter')
+    if not ids and not (filters or {}).get('status'):
+        # Like the product list, a filter only reaches archived products when it
+        # asks for them; products picked by ID are updated whatever their status
+        clauses.append('p.status IS NOT ?')
+        params.append(ARCHIVED_STATUS)
+    return ' AND '.join(clauses), params
+
+
+def _rounded(expression, rounding):
+    if not rounding:
+        return expression, []
+    if 'ending' in rounding:
+        ending = _number(rounding['ending'], 'Rounding ending')
+        if not 0 <= ending < 1:
+            raise BulkUpdateError('Rounding ending must be between 0 and 1')
+        # Smallest price at or above the value that ends in ``ending``
+        return f'CEIL(({expression}) - ?) + ?', [ending, ending]
+    step = _number(rounding.get('step'), 'Rounding step')
+    if step <= 0:
+        raise BulkUpdateError('Rounding step must be positive')
+    mode = rounding.get('mode', 'nearest')
+    if mode not in ROUNDING_MODES:
+        raise BulkUpdateError(f"Unknown rounding mode '{mode}'")
+    return f'{ROUNDING_MODES[mode]}(({expression}) / ?) * ?', [step, step]
+
+
+def _expression(field, rule):
+    """SQL for the new value of ``field`` and its params"""
+    if field not in CONSTANT_FIELDS:
+        raise BulkUpdateError(f"Field '{field}' cannot be bulk updated")
+
+    if not isinstance(rule, dict):
+        if rule is None:
+            if field in PRICE_FIELDS or field == 'status':
+                raise BulkUpdateError(f"'{field}' cannot be cleared")
+            return '?', [None]
+        try:
+            return '?', [CONSTANT_FIELDS[field](rule)]
+        except (TypeError, ValueError):
+            raise BulkUpdateError(f"Invalid value for '{field}'")
+
+    if field not in PRICE_FIELDS:
+        raise BulkUpdateError(f"Only prices take expressions, not '{field}'")
+    op = rule.get('op', 'set')
+    if op not in PRICE_OPS:
+        raise BulkUpdateError(f"Unknown price operation '{op}'")
+    value = _number(rule.get('value'), f"Value for '{field}'")
+    if op == 'margin_on_cost' and not 0 <= value < 100:
+        raise BulkUpdateError('Margin must be between 0 and 100 percent')
+
+    expression, params = _rounded(PRICE_OPS[op].format(field=f'p.{field}'), rule.get('round'))
+    return f'ROUND(MAX({expression}, 0), 2)', [value] + params
+
+
+def _plan(ids, filters, updates):
+    """The SELECT computing old and new values per matching product, its params and the fields it sets"""
+    if not updates:
+        raise BulkUpdateError('No updates provided')
+    where, where_params = _where(ids, filters)
+
+    columns, params = [], []
+    for field, rule in updates.items():
+        expression, expression_params = _expression(field, rule)
+        columns.append(f'p.{field} AS old_{field}, {expression} AS new_{field}')
+        params.extend(expression_params)
+
+    sql = f'''
+        SELECT p.id, p.sku, p.name, {', '.join(columns)}
+        FROM products p
+        WHERE {where}
+    '''
+    return sql, params + where_params, list(updates)
+
+
+def _changed(fields, ref='plan'):
+    return '(' + ' OR '.join(f'{ref}.old_{field} IS NOT {ref}.new_{field}' for field in fields) + ')'
+
+
+def preview_bulk_update(cursor, ids, filters, updates, limit=PREVIEW_LIMIT):
+    """Counts of matching and changing products, and the before/after diff of the first ``limit`` changes"""
+    sql, params, fields = _plan(ids, filters, updates)
+
+    cursor.execute(f'''
+        SELECT COUNT(*) AS matched, COALESCE(SUM({_changed(fields)}), 0) AS changed
+        FROM ({sql}) plan
+    ''', params)
+    counts = cursor.fetchone()
+
+    cursor.execute(f'''
+        SELECT * FROM ({sql}) plan
+        WHERE {_changed(fields)}
+        ORDER BY plan.id
+        LIMIT ?
+    ''', params + [limit])
+    items = [{
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'changes': {
+            field: {'before': row[f'old_{field}'], 'after': row[f'new_{field}']}
+            for field in fields if row[f'old_{field}'] != row[f'new_{field}']
+        },
+    } for row in cursor.fetchall()]
+
+    return {'matched': counts['matched'], 'changed': counts['changed'], 'items': items}
+
+
+def apply_bulk_update(conn, ids, filters, updates):
+    """Apply ``updates`` to the matching products in one UPDATE; returns the preview taken
+    inside the same transaction with ``updated`` set to the number of rows written"""
+    sql, params, fields = _plan(ids, filters, updates)
+    assignments = ', '.join(f'{field} = plan.new_{field}' for field in fields)
+
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        result = preview_bulk_update(cursor, ids, filters, updates)
+        cursor.execute(f'''
+            UPDATE products SET {assignments}, updated_at = CURRENT_TIMESTAMP
+            FROM ({sql}) plan
+            WHERE products.id = plan.id AND {_changed(fields)}
+        ''', params)
+        result['updated'] = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def audit_details(ids, filters, updates, result):
+    """One compact line describing a bulk update for the audit log"""
+    selection = {name: value for name, value in (filters or {}).items() if value not in (None, '')}
+    if ids:
+        selection['ids'] = len(ids)
+    return (f"Bulk updated {result['updated']} of {result['matched']} matching products; "
+            f"filter: {json.dumps(selection, sort_keys=True)}; rules: {json.dumps(updates, sort_keys=True)}")
@@ -0,0 +1,93 @@
+"""Set-based bulk deletion and archiving of products.
+
+The dependencies that block deleting a product are checked for the whole ID
+set in one statement (an indexed EXISTS probe per dependency table and
+product), then every deletable product goes in one DELETE, all inside one
+write transaction so nothing can gain history in between. Products that
+have history can be archived instead: their status becomes 'archived',
+which hides them from the product list and the POS without losing the
+records that reference them.
+"""
+import json
+
+ARCHIVED_STATUS = 'archived'
+
+# Checked in order; a product is reported against the first that applies
+DEPENDENCIES = (
+    ('purchase_order_items', 'Associated with purchase orders'),
+    ('stock_movements', 'Has stock movement history'),
+    ('pos_sale_items', 'Associated with sales'),
+    ('product_imei', 'Has associated IMEI numbers'),
+)
+
+# Product foreign keys the EXISTS probes look up by
+DELETION_INDEXES = {
+    'idx_purchase_order_items_product_id': 'purchase_order_items(product_id)',
+    'idx_product_imei_product_id': 'product_imei(product_id)',
+}
+
+_BLOCKER = 'CASE ' + ' '.join(
+    f"WHEN EXISTS (SELECT 1 FROM {table} WHERE product_id = p.id) THEN '{reason}'"
+    for table, reason in DEPENDENCIES
+) + ' END'
+
+
+def init_product_deletion(cursor):
+    """Index the product foreign keys the dependency checks probe"""
+    for name, target in DELETION_INDEXES.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
+def find_blockers(cursor, ids):
+    """Product id -> (name, sku, status, first blocking dependency or None) for the ids that exist"""
+    cursor.execute(f'''
+        SELECT p.id, p.name, p.sku, p.status, {_BLOCKER} AS blocker
+        FROM products p
+        WHERE p.id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(ids),))
+    return {row['id']: (row['name'], row['sku'], row['status'], row['blocker']) for row in cursor.fetchall()}
+
+
+def delete_products(conn, ids, archive=False):
+    """Delete the products in ``ids`` that have no history.
+
+    Products with history are reported as failed, or with ``archive`` set
+    to ARCHIVED_STATUS instead. Returns ``(deleted, archived, failed)``: the
+    deleted and archived products as (id, name, sku) and the failure
+    messages in request order.
+    """
+    ids = list(dict.fromkeys(int(id) for id in ids))
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        products = find_blockers(cursor, ids)
+
+        deleted, archived, failed = [], [], []
+        for product_id in ids:
+            product = products.get(product_id)
+            if product is None:
+                failed.append(f"Product ID {product_id}: Not found")
+                continue
+            name, sku, status, blocker = product
+            if blocker is None:
+                deleted.append((product_id, name, sku))
+            elif archive:
+                if status != ARCHIVED_STATUS:
+                    archived.append((product_id, name, sku))
+            else:
+                failed.append(f"Product ID {product_id}: {blocker}")
+
+        if deleted:
+            cursor.execute('DELETE FROM products WHERE id IN (SELECT value FROM json_each(?))',
+                           (json.dumps([id for id, _, _ in deleted]),))
+        if archived:
+            cursor.execute('''
+                UPDATE products SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (ARCHIVED_STATUS, json.dumps([id for id, _, _ in archived])))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return deleted, archived, failed
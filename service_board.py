@@ -0,0 +1,295 @@
+"""Service desk board: per-status counters and turnaround aggregates kept by triggers.
+
+``service_board_counts`` holds the number of jobs per (status, technician)
+and ``service_turnaround_stats`` the delivered count, summed turnaround hours
+and on-time deliveries per (month, technician). Triggers on ``service_jobs``
+and ``service_status_history`` keep both current on every write path (the
+edit form, job creation and deletion), so the board reads a few dozen rows
+however many historical jobs there are.
+
+A job's turnaround runs from its 'received' status entry to the status entry
+that marked it delivered and is kept per job in ``service_job_turnaround``;
+reopening a delivered job takes it back out. Technician 0 stands for
+unassigned jobs. Overdue jobs are read off a partial index over the jobs
+still on the bench.
+
+Usage:
+    python service_board.py rebuild
+"""
+import sqlite3
+
+DATABASE = 'inventory.db'
+
+# Jobs still being worked on; these can be overdue
+OPEN_STATUSES = ('received', 'in_progress')
+DEFAULT_TURNAROUND_MONTHS = 3
+DEFAULT_OVERDUE_LIMIT = 50
+
+_TECHNICIAN_KEY = 'COALESCE({r}.technician_id, 0)'
+
+
+def _count_delta(ref, sign):
+    key = _TECHNICIAN_KEY.format(r=ref)
+    insert = '' if sign == '-' else f'''
+            INSERT OR IGNORE INTO service_board_counts (status, technician_key) VALUES ({ref}.status, {key});'''
+    return f'''{insert}
+            UPDATE service_board_counts SET jobs = jobs {sign} 1
+            WHERE status = {ref}.status AND technician_key = {key};'''
+
+
+def _stats_delta(ref, sign):
+    month = f"strftime('%Y-%m', {ref}.delivered_at)"
+    insert = '' if sign == '-' else f'''
+            INSERT OR IGNORE INTO service_turnaround_stats (delivered_month, technician_key)
+            VALUES ({month}, {ref}.technician_key);'''
+    return f'''{insert}
+            UPDATE service_turnaround_stats SET
+                delivered = delivered {sign} 1,
+                total_hours = total_hours {sign} {ref}.hours,
+                with_estimate = with_estimate {sign} ({ref}.on_time IS NOT NULL),
+                on_time = on_time {sign} COALESCE({ref}.on_time, 0)
+            WHERE delivered_month = {month} AND technician_key = {ref}.technician_key;'''
+
+
+_ON_TIME = '''CASE WHEN COALESCE({r}.estimated_delivery, '') = '' THEN NULL
+                  ELSE DATE({delivered}) <= DATE({r}.estimated_delivery) END'''
+
+_TRIGGERS = {
+    'trg_service_board_jobs_insert': f'''
+        AFTER INSERT ON service_jobs
+        BEGIN{_count_delta('NEW', '+')}
+        END
+    ''',
+    'trg_service_board_jobs_status': f'''
+        AFTER UPDATE OF status, technician_id ON service_jobs
+        WHEN OLD.status IS NOT NEW.status OR OLD.technician_id IS NOT NEW.technician_id
+        BEGIN{_count_delta('OLD', '-')}{_count_delta('NEW', '+')}
+        END
+    ''',
+    # A delivered job follows its technician and estimate in the turnaround stats
+    'trg_service_board_jobs_turnaround': f'''
+        AFTER UPDATE OF technician_id, estimated_delivery ON service_jobs
+        WHEN OLD.technician_id IS NOT NEW.technician_id OR OLD.estimated_delivery IS NOT NEW.estimated_delivery
+        BEGIN
+            UPDATE service_job_turnaround SET
+                technician_key = {_TECHNICIAN_KEY.format(r='NEW')},
+                on_time = {_ON_TIME.format(r='NEW', delivered='delivered_at')}
+            WHERE job_id = NEW.id;
+        END
+    ''',
+    'trg_service_board_jobs_delete': f'''
+        AFTER DELETE ON service_jobs
+        BEGIN{_count_delta('OLD', '-')}
+            DELETE FROM service_job_turnaround WHERE job_id = OLD.id;
+        END
+    ''',
+    'trg_service_board_history_insert': f'''
+        AFTER INSERT ON service_status_history
+        WHEN NEW.new_status = 'delivered' OR NEW.old_status = 'delivered'
+        BEGIN
+            DELETE FROM service_job_turnaround WHERE job_id = NEW.job_id;
+            INSERT INTO service_job_turnaround (job_id, technician_key, delivered_at, hours, on_time)
+            SELECT sj.id, {_TECHNICIAN_KEY.format(r='sj')}, NEW.created_at,
+                   (julianday(NEW.created_at) - julianday(COALESCE(
+                       (SELECT MIN(created_at) FROM service_status_history
+                        WHERE job_id = sj.id AND new_status = 'received'),
+                       sj.created_at))) * 24,
+                   {_ON_TIME.format(r='sj', delivered='NEW.created_at')}
+            FROM service_jobs sj
+            WHERE sj.id = NEW.job_id AND NEW.new_status = 'delivered';
+        END
+    ''',
+    'trg_service_turnaround_insert': f'''
+        AFTER INSERT ON service_job_turnaround
+        BEGIN{_stats_delta('NEW', '+')}
+        END
+    ''',
+    'trg_service_turnaround_update': f'''
+        AFTER UPDATE ON service_job_turnaround
+        BEGIN{_stats_delta('OLD', '-')}{_stats_delta('NEW', '+')}
+        END
+    ''',
+    'trg_service_turnaround_delete': f'''
+        AFTER DELETE ON service_job_turnaround
+        BEGIN{_stats_delta('OLD', '-')}
+        END
+    ''',
+}
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_service_board(cursor):
+    """Create the board tables, triggers and overdue index; fills them on first run"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'service_board_counts'")
+    first_run = cursor.fetchone() is None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS service_board_counts (
+            status TEXT NOT NULL,
+            technician_key INTEGER NOT NULL,
+            jobs INTEGER DEFAULT 0,
+            PRIMARY KEY (status, technician_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS service_job_turnaround (
+            job_id INTEGER PRIMARY KEY,
+            technician_key INTEGER NOT NULL,
+            delivered_at TIMESTAMP NOT NULL,
+            hours REAL NOT NULL,
+            on_time INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS service_turnaround_stats (
+            delivered_month TEXT NOT NULL,
+            technician_key INTEGER NOT NULL,
+            delivered INTEGER DEFAULT 0,
+            total_hours REAL DEFAULT 0,
+            with_estimate INTEGER DEFAULT 0,
+            on_time INTEGER DEFAULT 0,
+            PRIMARY KEY (delivered_month, technician_key)
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_service_jobs_open_due ON service_jobs(estimated_delivery)
+        WHERE status IN {OPEN_STATUSES}
+    ''')
+
+    for name, body in _TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    if first_run:
+        rebuild_service_board(cursor)
+
+
+def rebuild_service_board(cursor):
+    """Recompute the counters and turnaround stats from service_jobs and its history"""
+    cursor.execute('DELETE FROM service_board_counts')
+    cursor.execute(f'''
+        INSERT INTO service_board_counts (status, technician_key, jobs)
+        SELECT status, {_TECHNICIAN_KEY.format(r='sj')}, COUNT(*)
+        FROM service_jobs sj
+        WHERE status IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+
+    cursor.execute('DELETE FROM service_job_turnaround')
+    cursor.execute('DELETE FROM service_turnaround_stats')
+    # The insert trigger rolls each job into service_turnaround_stats
+    cursor.execute(f'''
+        INSERT INTO service_job_turnaround (job_id, technician_key, delivered_at, hours, on_time)
+        SELECT sj.id, {_TECHNICIAN_KEY.format(r='sj')}, delivery.created_at,
+               (julianday(delivery.created_at) - julianday(COALESCE(received.created_at, sj.created_at))) * 24,
+               {_ON_TIME.format(r='sj', delivered='delivery.created_at')}
+        FROM service_jobs sj
+        JOIN (
+            SELECT job_id, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY created_at DESC, id DESC) AS position
+            FROM service_status_history
+            WHERE new_status = 'delivered'
+        ) AS delivery ON delivery.job_id = sj.id AND delivery.position = 1
+        LEFT JOIN (
+            SELECT job_id, MIN(created_at) AS created_at
+            FROM service_status_history
+            WHERE new_status = 'received'
+            GROUP BY job_id
+        ) AS received ON received.job_id = sj.id
+        WHERE sj.status = 'delivered'
+    ''')
+    return cursor.rowcount
+
+
+def _turnaround(row):
+    delivered = row['delivered'] or 0
+    return {
+        'delivered': delivered,
+        'avg_turnaround_hours': round(row['total_hours'] / delivered, 1) if delivered else None,
+        'on_time_rate': round(row['on_time'] / row['with_estimate'], 3) if row['with_estimate'] else None,
+    }
+
+
+def read_service_board(cursor, months=DEFAULT_TURNAROUND_MONTHS, overdue_limit=DEFAULT_OVERDUE_LIMIT):
+    """Status counts, per-technician workload and turnaround, and the most overdue jobs"""
+    cursor.execute('''
+        SELECT c.status, c.technician_key, c.jobs, t.name AS technician_name
+        FROM service_board_counts c
+        LEFT JOIN technicians t ON t.id = c.technician_key
+        WHERE c.jobs != 0
+    ''')
+    counts = {}
+    technicians = {}
+    for row in cursor.fetchall():
+        counts[row['status']] = counts.get(row['status'], 0) + row['jobs']
+        technician = technicians.setdefault(row['technician_key'], {
+            'technician_id': row['technician_key'] or None,
+            'technician_name': row['technician_name'] or ('Unassigned' if not row['technician_key'] else None),
+            'counts': {},
+        })
+        technician['counts'][row['status']] = row['jobs']
+
+    # Whole calendar months, counting the current one
+    cursor.execute('''
+        SELECT technician_key, SUM(delivered) AS delivered, SUM(total_hours) AS total_hours,
+               SUM(with_estimate) AS with_estimate, SUM(on_time) AS on_time
+        FROM service_turnaround_stats
+        WHERE delivered_month >= strftime('%Y-%m', 'now', 'start of month', '-' || ? || ' months')
+        GROUP BY technician_key
+    ''', (max(months - 1, 0),))
+    overall = {'delivered': 0, 'total_hours': 0, 'with_estimate': 0, 'on_time': 0}
+    for row in cursor.fetchall():
+        for key in overall:
+            overall[key] += row[key] or 0
+        if row['technician_key'] in technicians:
+            technicians[row['technician_key']]['turnaround'] = _turnaround(row)
+
+    # Named so the planner cannot prefer the (status, created_at) list index,
+    # which would walk every open job instead of the overdue range
+    overdue_where = f'''
+        sj.status IN {OPEN_STATUSES}
+        AND sj.estimated_delivery > '' AND sj.estimated_delivery < DATE('now', 'localtime')
+    '''
+    cursor.execute(f'SELECT COUNT(*) FROM service_jobs sj INDEXED BY idx_service_jobs_open_due WHERE {overdue_where}')
+    overdue_count = cursor.fetchone()[0]
+    cursor.execute(f'''
+        SELECT sj.id, sj.job_number, sj.customer_name, sj.customer_phone, sj.device_brand,
+               sj.device_model, sj.status, sj.estimated_delivery, sj.technician_id,
+               t.name AS technician_name,
+               CAST(julianday(DATE('now', 'localtime')) - julianday(sj.estimated_delivery) AS INTEGER) AS days_overdue
+        FROM service_jobs sj INDEXED BY idx_service_jobs_open_due
+        LEFT JOIN technicians t ON sj.technician_id = t.id
+        WHERE {overdue_where}
+        ORDER BY sj.estimated_delivery, sj.id
+        LIMIT ?
+    ''', (overdue_limit,))
+    overdue = [dict(row) for row in cursor.fetchall()]
+
+    return {
+        'counts': counts,
+        'total_jobs': sum(counts.values()),
+        'technicians': sorted(technicians.values(), key=lambda t: t['technician_name'] or ''),
+        'turnaround': dict(_turnaround(overall), months=months),
+        'overdue_count': overdue_count,
+        'overdue': overdue,
+    }
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(__doc__)
+        sys.exit(1)
+
+    conn = get_db()
+    cursor = conn.cursor()
+    init_service_board(cursor)
+    delivered = rebuild_service_board(cursor)
+    conn.commit()
+    conn.close()
+    print(f"🔁 Rebuilt the service board ({delivered} delivered jobs)")
@@ -0,0 +1,190 @@
+"""Service job parts, consumed from stock through the stock ledger.
+
+A batch of parts for a job is taken in one write transaction: stock for
+every stocked part is reserved with a conditional decrement (the row only
+changes if enough stock is left) followed by that part's ``service_part``
+movement with ``reference_type='service_job'`` so parts usage shows in the
+stock history and reconciliation, and IMEI/serial-numbered parts move the
+scanned units from 'available' to 'used' against the part row. Any part
+that cannot be taken rolls back the whole batch.
+
+Removing a part reverses it the same way: a ``service_part_return``
+movement puts the stock back and its units become available again.
+"""
+import json
+
+USED_STATUS = 'used'
+AVAILABLE_STATUSES = ('available', 'in_stock')
+
+
+def init_service_parts(cursor):
+    """Add the IMEI column to parts and the part link to product IMEIs"""
+    for table, column in (('service_parts_used', 'imei TEXT'), ('product_imei', 'service_part_id INTEGER')):
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column.split()[0] not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_imei_service_part ON product_imei(service_part_id)')
+
+
+def _clean(parts):
+    """Validated part lines; raises ValueError naming the first bad one"""
+    lines = []
+    for number, part in enumerate(parts, 1):
+        part_name = part.get('part_name')
+        quantity = part.get('quantity')
+        unit_price = part.get('unit_price')
+        product_id = part.get('product_id')
+        imeis = [imei.strip() for imei in part.get('imeis') or [] if imei and imei.strip()]
+
+        if not part_name or not quantity or unit_price is None:
+            raise ValueError(f'Part {number}: Part name, quantity, and unit price are required.')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise ValueError(f'Part {number}: Quantity must be a positive integer.')
+        if not isinstance(unit_price, (int, float)) or unit_price < 0:
+            raise ValueError(f'Part {number}: Unit price must be a non-negative number.')
+        if imeis and not product_id:
+            raise ValueError(f"Part {number}: IMEIs can only be taken from a stocked product.")
+        if imeis and len(imeis) != quantity:
+            raise ValueError(f"Part {number}: Number of IMEIs ({len(imeis)}) must match quantity ({quantity}) for '{part_name}'.")
+        lines.append({
+            'product_id': int(product_id) if product_id else None,
+            'part_name': part_name,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'imeis': imeis,
+        })
+
+    all_imeis = [imei for line in lines for imei in line['imeis']]
+    if len(set(all_imeis)) != len(all_imeis):
+        raise ValueError('The same IMEI is listed more than once.')
+    return lines
+
+
+def consume_service_parts(conn, job_id, parts):
+    """Consume ``parts`` for service job ``job_id`` and commit; returns the new part ids.
+
+    Raises LookupError for a missing job and ValueError, before anything is
+    committed, for a bad line, a missing product, short stock or an IMEI
+    that is not available for its product.
+    """
+    lines = _clean(parts)
+    if not lines:
+        raise ValueError('No parts provided.')
+
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT job_number FROM service_jobs WHERE id = ?', (job_id,))
+        job = cursor.fetchone()
+        if not job:
+            raise LookupError('Service job not found')
+
+        needed = {}
+        for line in lines:
+            if line['product_id']:
+                needed[line['product_id']] = needed.get(line['product_id'], 0) + line['quantity']
+
+        cursor.execute('''
+            SELECT id, name, current_stock FROM products
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(needed)),))
+        products = {row['id']: row for row in cursor.fetchall()}
+        for line in lines:
+            product_id = line['product_id']
+            if product_id and product_id not in products:
+                raise ValueError(f"Product ID {product_id} not found for part '{line['part_name']}'.")
+        for product_id, quantity in needed.items():
+            product = products[product_id]
+            if product['current_stock'] < quantity:
+                raise ValueError(f"Insufficient stock for product '{product['name']}'. Available: {product['current_stock']}, Requested: {quantity}.")
+
+        all_imeis = [imei for line in lines for imei in line['imeis']]
+        if all_imeis:
+            cursor.execute(f'''
+                SELECT imei, product_id FROM product_imei
+                WHERE imei IN (SELECT value FROM json_each(?)) AND status IN ({','.join('?' * len(AVAILABLE_STATUSES))})
+            ''', (json.dumps(all_imeis), *AVAILABLE_STATUSES))
+            available = {row['imei']: row['product_id'] for row in cursor.fetchall()}
+            for line in lines:
+                for imei in line['imeis']:
+                    if available.get(imei) != line['product_id']:
+                        raise ValueError(f"IMEI {imei} is not available for '{line['part_name']}'.")
+
+        # Line by line, each stock change is followed by its own movement as
+        # the ledger requires; the conditional decrement is the guard should
+        # the checks above ever race
+        part_ids = []
+        for line in lines:
+            if line['product_id']:
+                cursor.execute('''
+                    UPDATE products SET current_stock = current_stock - ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND current_stock >= ?
+                ''', (line['quantity'], line['product_id'], line['quantity']))
+                if cursor.rowcount != 1:
+                    raise ValueError('Stock changed while the parts were being taken; please try again.')
+
+            cursor.execute('''
+                INSERT INTO service_parts_used (job_id, product_id, part_name, quantity, unit_price, total_price, imei)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, line['product_id'], line['part_name'], line['quantity'], line['unit_price'],
+                  line['quantity'] * line['unit_price'], ','.join(line['imeis']) or None))
+            part_id = cursor.lastrowid
+            part_ids.append(part_id)
+
+            if line['product_id']:
+                cursor.execute('''
+                    INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (line['product_id'], 'service_part', -line['quantity'], 'service_job', job_id,
+                      f"Service job {job['job_number']}: {line['part_name']}"))
+
+            cursor.executemany('''
+                UPDATE product_imei SET status = ?, service_part_id = ?
+                WHERE imei = ?
+            ''', [(USED_STATUS, part_id, imei) for imei in line['imeis']])
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return part_ids
+
+
+def release_service_parts(cursor, job_id, part_ids=None):
+    """Return the stock and units of a job's parts (all, or ``part_ids``) and delete the parts.
+
+    Runs inside the caller's transaction; returns the removed parts.
+    """
+    query = '''
+        SELECT spu.id, spu.product_id, spu.part_name, spu.quantity, sj.job_number
+        FROM service_parts_used spu
+        JOIN service_jobs sj ON sj.id = spu.job_id
+        WHERE spu.job_id = ?
+    '''
+    params = [job_id]
+    if part_ids is not None:
+        query += ' AND spu.id IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps(part_ids))
+    cursor.execute(query, params)
+    parts = [dict(row) for row in cursor.fetchall()]
+    stocked = [part for part in parts if part['product_id']]
+
+    for part in stocked:
+        # Each return's stock change, then its movement, as the ledger requires
+        cursor.execute('''
+            UPDATE products SET current_stock = current_stock + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (part['quantity'], part['product_id']))
+        cursor.execute('''
+            INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (part['product_id'], 'service_part_return', part['quantity'], 'service_job', job_id,
+              f"Removed from service job {part['job_number']}: {part['part_name']}"))
+
+    ids = json.dumps([part['id'] for part in parts])
+    cursor.execute('''
+        UPDATE product_imei SET status = 'available', service_part_id = NULL
+        WHERE service_part_id IN (SELECT value FROM json_each(?))
+    ''', (ids,))
+    cursor.execute('DELETE FROM service_parts_used WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+    return parts
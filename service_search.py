@@ -0,0 +1,182 @@
+"""Full-text search over service jobs.
+
+``service_jobs_fts`` is an external-content FTS5 index over the searchable
+text of ``service_jobs`` (job number, customer, phone, IMEI, device,
+problem description and notes); the text itself stays in service_jobs and
+triggers keep the index in step with every insert, edit and delete.
+``service_jobs_ids_fts`` indexes the job number, phone and IMEI a second
+time with the trigram tokenizer, because staff often type the tail of one
+(the last digits of a phone or IMEI, the time part of a job number).
+
+A job matches when every word of the search is a prefix of one of its
+words, with prefix indexes for the short prefixes typed at the front desk,
+or (from three characters) appears anywhere in its job number, phone or
+IMEI. Prefix matches come first, ranked by bm25 with identifying columns
+weighted above free text, then substring-only matches newest first.
+
+Usage:
+    python service_search.py rebuild
+"""
+import json
+import re
+import sqlite3
+
+DATABASE = 'inventory.db'
+
+# Indexed column -> bm25 weight
+FTS_COLUMNS = {
+    'job_number': 10.0,
+    'customer_name': 5.0,
+    'customer_phone': 8.0,
+    'imei_number': 8.0,
+    'device_brand': 2.0,
+    'device_model': 2.0,
+    'problem_description': 1.0,
+    'notes': 1.0,
+}
+# Identifier columns also searched by substring through the trigram index
+ID_COLUMNS = ('job_number', 'customer_phone', 'imei_number')
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+_COLUMNS = ', '.join(FTS_COLUMNS)
+_ID_COLUMNS = ', '.join(ID_COLUMNS)
+_BM25 = f"bm25(service_jobs_fts, {', '.join(str(weight) for weight in FTS_COLUMNS.values())})"
+
+
+def _values(ref, columns=FTS_COLUMNS):
+    return ', '.join(f'{ref}.{column}' for column in columns)
+
+
+def _triggers(table, columns):
+    names = ', '.join(columns)
+    return {
+        f'trg_{table}_insert': f'''
+            AFTER INSERT ON service_jobs
+            BEGIN
+                INSERT INTO {table} (rowid, {names}) VALUES (NEW.id, {_values('NEW', columns)});
+            END
+        ''',
+        f'trg_{table}_update': f'''
+            AFTER UPDATE OF {names} ON service_jobs
+            BEGIN
+                INSERT INTO {table} ({table}, rowid, {names}) VALUES ('delete', OLD.id, {_values('OLD', columns)});
+                INSERT INTO {table} (rowid, {names}) VALUES (NEW.id, {_values('NEW', columns)});
+            END
+        ''',
+        f'trg_{table}_delete': f'''
+            AFTER DELETE ON service_jobs
+            BEGIN
+                INSERT INTO {table} ({table}, rowid, {names}) VALUES ('delete', OLD.id, {_values('OLD', columns)});
+            END
+        ''',
+    }
+
+
+_TRIGGERS = {**_triggers('service_jobs_fts', FTS_COLUMNS), **_triggers('service_jobs_ids_fts', ID_COLUMNS)}
+
+# Ids of the jobs matching every word of a JSON array of search words (every
+# '?' is bound to the same array): a word matches as a prefix in the full
+# index or as a substring of an identifier. UNION keeps one row per job and
+# word, so a job matches when its count equals the number of words.
+MATCHING_JOB_IDS = '''
+    SELECT id FROM (
+        SELECT service_jobs_fts.rowid AS id, w.key AS word
+        FROM json_each(?) w JOIN service_jobs_fts ON service_jobs_fts MATCH '"' || w.value || '"*'
+        UNION
+        SELECT service_jobs_ids_fts.rowid, w.key
+        FROM json_each(?) w JOIN service_jobs_ids_fts ON service_jobs_ids_fts MATCH '"' || w.value || '"'
+    )
+    GROUP BY id HAVING COUNT(*) = json_array_length(?)
+'''
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_service_search(cursor):
+    """Create the FTS indexes and their triggers; indexes existing jobs on first run"""
+    cursor.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name IN ('service_jobs_fts', 'service_jobs_ids_fts')
+    ''')
+    existing = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS service_jobs_fts USING fts5(
+            {_COLUMNS},
+            content='service_jobs', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS service_jobs_ids_fts USING fts5(
+            {_ID_COLUMNS},
+            content='service_jobs', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    for name, body in _TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    if 'service_jobs_fts' not in existing:
+        cursor.execute("INSERT INTO service_jobs_fts (service_jobs_fts) VALUES ('rebuild')")
+    if 'service_jobs_ids_fts' not in existing:
+        cursor.execute("INSERT INTO service_jobs_ids_fts (service_jobs_ids_fts) VALUES ('rebuild')")
+
+
+def rebuild_service_search(cursor):
+    """Re-index every service job from the service_jobs table"""
+    cursor.execute("INSERT INTO service_jobs_fts (service_jobs_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO service_jobs_ids_fts (service_jobs_ids_fts) VALUES ('rebuild')")
+
+
+def fts_query(text):
+    """FTS5 query matching every word of ``text`` as a prefix, or None if it has no words"""
+    words = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{word}"*' for word in words) or None
+
+
+def search_words(text):
+    """The words of ``text`` as the JSON array MATCHING_JOB_IDS takes, or None if it has none"""
+    words = re.findall(r'\w+', text or '')
+    return json.dumps(words) if words else None
+
+
+def search_service_jobs(cursor, text, limit=DEFAULT_SEARCH_LIMIT):
+    """Service jobs matching ``text``, best match first"""
+    words = search_words(text)
+    if words is None:
+        return []
+    cursor.execute(f'''
+        SELECT sj.*, t.name AS technician_name, ranked.score
+        FROM service_jobs sj
+        LEFT JOIN (
+            SELECT rowid AS id, {_BM25} AS score
+            FROM service_jobs_fts WHERE service_jobs_fts MATCH ?
+        ) ranked ON ranked.id = sj.id
+        LEFT JOIN technicians t ON sj.technician_id = t.id
+        WHERE sj.id IN ({MATCHING_JOB_IDS})
+        ORDER BY ranked.score IS NULL, ranked.score, sj.created_at DESC
+        LIMIT ?
+    ''', (fts_query(text), words, words, words, limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(__doc__)
+        sys.exit(1)
+
+    conn = get_db()
+    cursor = conn.cursor()
+    init_service_search(cursor)
+    rebuild_service_search(cursor)
+    conn.commit()
+    conn.close()
+    print("🔁 Rebuilt the service job search index")
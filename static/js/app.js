@@ -4,6 +4,8 @@ let inventoryTable = null;
 let poItemCounter = 0;
 let isAuthenticated = false;
 let salesChart = null;
+let liveEvents = null;
+let liveRefreshTimers = {};
 
 let currentPOSProductForIMEI = null;
 let currentPOSCartIndex = null;
@@ -53,6 +55,7 @@ function checkAuth() {
             $('#navbar-menu').show();
             $('#logoutBtn').show();
             initNavigation();
+            startLiveUpdates();
             loadPage('dashboard');
         } else {
             showLoginModal();
@@ -95,6 +98,7 @@ function performLogin() {
                 $('#loginForm')[0].reset();
                 $('#loginError').hide();
                 initNavigation();
+                startLiveUpdates();
                 loadPage('dashboard');
             }
         },
@@ -112,11 +116,75 @@ function performLogout() {
         method: 'POST',
         success: function() {
             isAuthenticated = false;
+            stopLiveUpdates();
             showLoginModal();
         }
     });
 }
 
+function startLiveUpdates() {
+    // Pushed from /api/events; screens patch themselves instead of reloading
+    if (liveEvents || !window.EventSource) return;
+    liveEvents = new EventSource(`${API_BASE}/events`);
+
+    liveEvents.addEventListener('stock', function(e) {
+        applyStockEvent(JSON.parse(e.data));
+    });
+    liveEvents.addEventListener('sale', function(e) {
+        if (currentPage !== 'dashboard') return;
+        const sale = JSON.parse(e.data);
+        const amountClass = sale.transaction_type === 'return' ? 'text-danger' : 'text-success';
+        const transactionsBody = $('#recentTransactionsTable tbody');
+        transactionsBody.find('td[colspan]').closest('tr').remove();
+        transactionsBody.prepend(`
+            <tr>
+                <td><small>${sale.sale_number}</small></td>
+                <td><small>${sale.customer_name || 'Walk-in'}</small></td>
+                <td class="${amountClass}"><strong>$${Math.abs(sale.total_amount).toFixed(2)}</strong></td>
+                <td><small>${new Date().toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' })}</small></td>
+            </tr>
+        `);
+        refreshLive('dashboard', loadDashboardData);
+    });
+    liveEvents.addEventListener('low_stock', function() {
+        if (currentPage === 'dashboard') refreshLive('dashboard', loadDashboardData);
+    });
+    liveEvents.addEventListener('service_status', function() {
+        if (currentPage === 'service-management') refreshLive('serviceBoard', loadServiceBoard);
+    });
+    liveEvents.addEventListener('resync', function() {
+        // Events were missed; reload the screen once
+        loadPage(currentPage);
+    });
+}
+
+function stopLiveUpdates() {
+    if (liveEvents) {
+        liveEvents.close();
+        liveEvents = null;
+    }
+}
+
+function refreshLive(key, load) {
+    // Collapse a burst of events into one reload
+    clearTimeout(liveRefreshTimers[key]);
+    liveRefreshTimers[key] = setTimeout(load, 2000);
+}
+
+function applyStockEvent(data) {
+    const cell = $(`#inventoryTable td[data-stock-product="${data.product_id}"]`);
+    if (cell.length) {
+        const stockClass = data.current_stock === 0 ? 'stock-out' :
+                         (data.current_stock <= data.min_stock_level ? 'stock-low' : 'stock-ok');
+        if (inventoryTable) {
+            inventoryTable.cell(cell).data(String(data.current_stock));
+        } else {
+            cell.text(data.current_stock);
+        }
+        cell.removeClass('stock-out stock-low stock-ok').addClass(stockClass);
+    }
+}
+
 function initNavigation() {
     // Handle regular nav links
     $('.nav-link[data-page]').on('click', function(e) {
@@ -772,6 +840,7 @@ function loadInventory() {
                 <button class="btn btn-success" onclick="showAddProduct()"><i class="bi bi-plus-circle"></i> Add Product</button>
                 <button class="btn btn-primary" onclick="exportProducts()"><i class="bi bi-download"></i> Export</button>
                 <button class="btn btn-secondary" onclick="showImportModal()"><i class="bi bi-upload"></i> Import</button>
+                <button class="btn btn-warning" onclick="showPriceRule()"><i class="bi bi-percent"></i> Reprice</button>
             </div>
         </div>
 
@@ -807,6 +876,7 @@ function loadInventory() {
                         <option value="">All</option>
                         <option value="active">Active</option>
                         <option value="inactive">Inactive</option>
+                        <option value="archived">Archived</option>
                     </select>
                 </div>
                 <div class="col-md-1 d-flex align-items-end">
@@ -949,7 +1019,7 @@ function loadInventoryData() {
                         <td>${product.model_name || '-'}</td>
                         <td>$${parseFloat(product.cost_price || 0).toFixed(2)}</td>
                         <td>$${parseFloat(product.selling_price || 0).toFixed(2)}</td>
-                        <td class="${stockClass}">${product.current_stock}</td>
+                        <td class="${stockClass}" data-stock-product="${product.id}">${product.current_stock}</td>
                         <td><span class="badge bg-${product.status === 'active' ? 'success' : 'secondary'}">${product.status}</span></td>
                         <td>
                             <button class="btn btn-sm btn-success action-btn" onclick="viewProductDetails(${product.id})" title="View Details">
@@ -1022,8 +1092,28 @@ function bulkDelete() {
         method: 'POST',
         contentType: 'application/json',
         data: JSON.stringify({ ids: ids }),
-        success: function() {
-            alert('Products deleted successfully');
+        success: function(result) {
+            if (result.success) {
+                alert('Products deleted successfully');
+            } else if (confirm(`${result.deleted} product(s) deleted. ${result.failed.length} could not be deleted:\n\n` +
+                    `${result.failed.slice(0, 10).join('\n')}${result.failed.length > 10 ? '\n...' : ''}\n\n` +
+                    'Archive the products with history instead? They will be hidden but keep their records.')) {
+                bulkArchive(ids);
+                return;
+            }
+            loadInventoryData();
+        }
+    });
+}
+
+function bulkArchive(ids) {
+    $.ajax({
+        url: `${API_BASE}/products/bulk-delete`,
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ ids: ids, mode: 'archive' }),
+        success: function(result) {
+            alert(`${result.archived} product(s) archived`);
             loadInventoryData();
         }
     });
@@ -1073,6 +1163,75 @@ function showBulkUpdate() {
     });
 }
 
+function inventoryFilter() {
+    const filter = {
+        search: $('#searchProduct').val(),
+        category_id: $('#filterCategory').val(),
+        brand_id: $('#filterBrand').val(),
+        stock_status: $('#filterStockStatus').val(),
+        status: $('#filterStatus').val()
+    };
+    Object.keys(filter).forEach(key => { if (!filter[key]) delete filter[key]; });
+    return filter;
+}
+
+function showPriceRule() {
+    // Applies to the checked products, or else to everything the filters match
+    const ids = $('input[name="productCheck"]:checked').map(function() {
+        return parseInt($(this).val());
+    }).get();
+    const filter = ids.length ? {} : inventoryFilter();
+    if (!ids.length && Object.keys(filter).length === 0) {
+        alert('Select products or set a filter to reprice');
+        return;
+    }
+
+    const op = prompt('Selling price rule:\n1. Change by percent\n2. Markup on cost (%)\n3. Margin on cost (%)\n4. Add amount');
+    const ops = { '1': 'percent', '2': 'markup_on_cost', '3': 'margin_on_cost', '4': 'add' };
+    if (!ops[op]) return;
+    const value = parseFloat(prompt('Value:'));
+    if (isNaN(value)) return;
+
+    const rule = { op: ops[op], value: value };
+    const ending = prompt('Round up to a price ending (e.g. .99), or leave empty:');
+    if (ending) rule.round = { ending: parseFloat(ending) };
+
+    const request = { ids: ids, filter: filter, updates: { selling_price: rule } };
+    $.ajax({
+        url: `${API_BASE}/products/bulk-update`,
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ ...request, preview: true }),
+        success: function(preview) {
+            if (preview.changed === 0) {
+                alert(`${preview.matched} product(s) match; none would change`);
+                return;
+            }
+            const lines = preview.items.slice(0, 10).map(item =>
+                `${item.sku || item.name}: ${item.changes.selling_price.before} -> ${item.changes.selling_price.after}`);
+            if (!confirm(`${preview.changed} of ${preview.matched} product(s) will change:\n\n${lines.join('\n')}` +
+                    `${preview.changed > lines.length ? '\n...' : ''}\n\nApply?`)) return;
+
+            $.ajax({
+                url: `${API_BASE}/products/bulk-update`,
+                method: 'POST',
+                contentType: 'application/json',
+                data: JSON.stringify(request),
+                success: function(result) {
+                    alert(`${result.updated} product(s) repriced`);
+                    loadInventoryData();
+                },
+                error: function(xhr) {
+                    alert(xhr.responseJSON?.error || 'Error applying price rule');
+                }
+            });
+        },
+        error: function(xhr) {
+            alert(xhr.responseJSON?.error || 'Error previewing price rule');
+        }
+    });
+}
+
 function showAddProduct() {
     $('#productId').val('');
     $('#productForm')[0].reset();
@@ -1188,9 +1347,12 @@ function saveProduct() {
         opening_stock: parseInt($('#productOpeningStock').val()) || 0,
         current_stock: parseInt($('#productCurrentStock').val()) || 0,
         min_stock_level: parseInt($('#productMinStockLevel').val()) || 10,
-        storage_location: $('#productStorageLocation').val(),
-        status: $('#productStatus').val()
+        storage_location: $('#productStorageLocation').val()
     };
+    // Only forms with a status field send one; the server keeps the stored status otherwise
+    if ($('#productStatus').length) {
+        data.status = $('#productStatus').val();
+    }
 
     const url = id ? `${API_BASE}/products/${id}` : `${API_BASE}/products`;
     const method = id ? 'PUT' : 'POST';
@@ -1737,7 +1899,7 @@ function showImportPreview(data) {
     if (validation.errors.length > 0) {
         html += `
             <div class="alert alert-warning">
-                <strong>⚠ ${validation.errors.length} validation error(s) found:</strong>
+                <strong>⚠ ${validation.error_count} validation error(s) found${validation.sampled ? ` in the first ${validation.sample_size} rows` : ''}:</strong>
                 <ul class="mb-0 mt-2">
         `;
         validation.errors.slice(0, 10).forEach(err => {
@@ -1752,6 +1914,7 @@ function showImportPreview(data) {
     html += `
         <div class="alert alert-success">
             <strong>✓ ${validation.valid_count} valid products ready to import</strong>
+            ${validation.sampled ? `<br><small>Estimated from the first ${validation.sample_size} rows</small>` : ''}
         </div>
     `;
 
@@ -1776,7 +1939,7 @@ function confirmImport() {
     $('#importProgressText').text('Starting import...');
 
     $.ajax({
-        url: `${API_BASE}/import/products`,
+        url: `${API_BASE}/import/jobs`,
         method: 'POST',
         data: formData,
         processData: false,
@@ -1793,57 +1956,84 @@ function confirmImport() {
             return xhr;
         },
         success: function(response) {
-            $('#importProgressBar').css('width', '100%').removeClass('progress-bar-animated');
-            $('#importProgressText').text('Import completed!');
-
-            let resultHtml = `
-                <div class="alert alert-success">
-                    <h6>✓ Import Completed Successfully!</h6>
-                    <p class="mb-1"><strong>${response.imported}</strong> products imported</p>
-                    ${response.updated ? `<p class="mb-1"><strong>${response.updated}</strong> products updated</p>` : ''}
-                    ${response.created_categories ? `<p class="mb-1"><strong>${response.created_categories}</strong> new categories created</p>` : ''}
-                    ${response.created_brands ? `<p class="mb-1"><strong>${response.created_brands}</strong> new brands created</p>` : ''}
-                </div>
-            `;
-
-            if (response.errors && response.errors.length > 0) {
-                resultHtml += `
-                    <div class="alert alert-warning">
-                        <h6>⚠ ${response.errors.length} error(s) encountered:</h6>
-                        <ul class="mb-0">
-                `;
-                response.errors.slice(0, 10).forEach(err => {
-                    resultHtml += `<li>${err}</li>`;
-                });
-                if (response.errors.length > 10) {
-                    resultHtml += `<li><em>... and ${response.errors.length - 10} more errors</em></li>`;
-                }
-                resultHtml += `</ul></div>`;
-            }
-
-            $('#importProgress').hide();
-            $('#importResult').html(resultHtml).show();
-
-            setTimeout(() => {
-                bootstrap.Modal.getInstance($('#importModal')).hide();
-                loadInventoryData();
-            }, 3000);
+            $('#importProgressBar').css('width', '0%');
+            $('#importProgressText').text('Processing...');
+            pollImportJob(response.job_id);
         },
         error: function(xhr) {
-            $('#importProgressBar').removeClass('progress-bar-animated').addClass('bg-danger');
-            $('#importProgressText').text('Import failed!');
-
-            const errorMsg = xhr.responseJSON?.error || 'Unknown error';
-            $('#importResult').html(`
-                <div class="alert alert-danger">
-                    <h6>✗ Import Failed</h6>
-                    <p>${errorMsg}</p>
-                </div>
-            `).show();
+            showImportFailure(xhr.responseJSON?.error || 'Unknown error');
+        }
+    });
+}
+
+function pollImportJob(jobId) {
+    $.get(`${API_BASE}/import/jobs/${jobId}`, function(job) {
+        if (job.status === 'completed') {
+            showImportResult(job);
+        } else if (job.status === 'failed' || job.status === 'interrupted') {
+            showImportFailure(job.error_message || 'Unknown error');
+        } else {
+            const label = job.status === 'validating' ? 'Validating' : 'Importing';
+            $('#importProgressBar').css('width', job.progress_percent + '%');
+            $('#importProgressText').text(`${label}... ${job.committed_rows} of ${job.total_rows || '?'} rows`);
+            setTimeout(() => pollImportJob(jobId), 1000);
         }
+    }).fail(function(xhr) {
+        showImportFailure(xhr.responseJSON?.error || 'Unknown error');
     });
 }
 
+function showImportResult(response) {
+    $('#importProgressBar').css('width', '100%').removeClass('progress-bar-animated');
+    $('#importProgressText').text('Import completed!');
+
+    const errorCount = response.error_count ?? response.errors.length;
+    let resultHtml = `
+        <div class="alert alert-success">
+            <h6>✓ Import Completed Successfully!</h6>
+            <p class="mb-1"><strong>${response.imported}</strong> products imported</p>
+            ${response.updated ? `<p class="mb-1"><strong>${response.updated}</strong> products updated</p>` : ''}
+            ${response.created_categories ? `<p class="mb-1"><strong>${response.created_categories}</strong> new categories created</p>` : ''}
+            ${response.created_brands ? `<p class="mb-1"><strong>${response.created_brands}</strong> new brands created</p>` : ''}
+        </div>
+    `;
+
+    if (errorCount > 0) {
+        resultHtml += `
+            <div class="alert alert-warning">
+                <h6>⚠ ${errorCount} error(s) encountered:</h6>
+                <ul class="mb-0">
+        `;
+        response.errors.slice(0, 10).forEach(err => {
+            resultHtml += `<li>${err}</li>`;
+        });
+        if (errorCount > 10) {
+            resultHtml += `<li><em>... and ${errorCount - 10} more errors</em></li>`;
+        }
+        resultHtml += `</ul></div>`;
+    }
+
+    $('#importProgress').hide();
+    $('#importResult').html(resultHtml).show();
+
+    setTimeout(() => {
+        bootstrap.Modal.getInstance($('#importModal')).hide();
+        loadInventoryData();
+    }, 3000);
+}
+
+function showImportFailure(errorMsg) {
+    $('#importProgressBar').removeClass('progress-bar-animated').addClass('bg-danger');
+    $('#importProgressText').text('Import failed!');
+
+    $('#importResult').html(`
+        <div class="alert alert-danger">
+            <h6>✗ Import Failed</h6>
+            <p>${errorMsg}</p>
+        </div>
+    `).show();
+}
+
 function loadCategories() {
     $('#content-area').html(`
         <div class="page-header d-flex justify-content-between align-items-center">
@@ -2350,49 +2540,52 @@ function loadPurchaseOrders() {
         </div>
     `);
 
-    $.get(`${API_BASE}/purchase-orders`, function(data) {
+    $.get(`${API_BASE}/purchase-orders`, function(data, status, xhr) {
         const tbody = $('#poTable tbody');
         tbody.empty();
 
-        data.forEach(po => {
-            const orderDate = new Date(po.order_date);
-            const expectedDate = po.expected_delivery ? new Date(po.expected_delivery).toLocaleDateString() : '-';
-
-            let statusBadge = 'secondary';
-            if (po.status === 'completed') statusBadge = 'success';
-            else if (po.status === 'partial') statusBadge = 'warning';
-            else if (po.status === 'pending') statusBadge = 'info';
-
-            let paymentBadge = 'danger';
-            if (po.payment_status === 'paid') paymentBadge = 'success';
-            else if (po.payment_status === 'partial') paymentBadge = 'warning';
-
-            tbody.append(`
-                <tr>
-                    <td>${po.po_number}</td>
-                    <td>${po.supplier_name}</td>
-                    <td>${orderDate.toLocaleDateString()}</td>
-                    <td>${expectedDate}</td>
-                    <td>$${parseFloat(po.total_amount || 0).toFixed(2)}</td>
-                    <td><span class="badge bg-${statusBadge}">${po.status}</span></td>
-                    <td>
-                        <button class="btn btn-sm btn-info action-btn" onclick="viewPO(${po.id})">
-                            <i class="bi bi-eye"></i>
-                        </button>
-                        <button class="btn btn-sm btn-success action-btn" onclick="receivePO(${po.id})" ${po.status === 'completed' ? 'disabled' : ''}>
-                            <i class="bi bi-check-circle"></i> Receive
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(data.map(purchaseOrderRow).join(''));
 
         $('#poTable').DataTable({
             order: [[0, 'desc']]
         });
+        setListCursor('poTable', `${API_BASE}/purchase-orders`, {}, xhr, purchaseOrderRow);
     });
 }
 
+function purchaseOrderRow(po) {
+    const orderDate = new Date(po.order_date);
+    const expectedDate = po.expected_delivery ? new Date(po.expected_delivery).toLocaleDateString() : '-';
+
+    let statusBadge = 'secondary';
+    if (po.status === 'completed') statusBadge = 'success';
+    else if (po.status === 'partial') statusBadge = 'warning';
+    else if (po.status === 'pending') statusBadge = 'info';
+
+    let paymentBadge = 'danger';
+    if (po.payment_status === 'paid') paymentBadge = 'success';
+    else if (po.payment_status === 'partial') paymentBadge = 'warning';
+
+    return `
+        <tr>
+            <td>${po.po_number}</td>
+            <td>${po.supplier_name}</td>
+            <td>${orderDate.toLocaleDateString()}</td>
+            <td>${expectedDate}</td>
+            <td>$${parseFloat(po.total_amount || 0).toFixed(2)}</td>
+            <td><span class="badge bg-${statusBadge}">${po.status}</span></td>
+            <td>
+                <button class="btn btn-sm btn-info action-btn" onclick="viewPO(${po.id})">
+                    <i class="bi bi-eye"></i>
+                </button>
+                <button class="btn btn-sm btn-success action-btn" onclick="receivePO(${po.id})" ${po.status === 'completed' ? 'disabled' : ''}>
+                    <i class="bi bi-check-circle"></i> Receive
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 function showAddPO() {
     $('#poForm')[0].reset();
     $('#poItemsBody').empty();
@@ -2714,11 +2907,57 @@ function loadServiceManagement() {
             </button>
         </div>
 
+        <!-- Service Board -->
+        <div class="row mb-4" id="serviceBoard">
+            <div class="col-md-2">
+                <div class="card stats-card" role="button" onclick="filterServiceJobsByStatus('received')">
+                    <div class="stats-icon text-info"><i class="bi bi-inbox"></i></div>
+                    <div class="stats-value" id="boardReceived">0</div>
+                    <div class="stats-label">Received</div>
+                </div>
+            </div>
+            <div class="col-md-2">
+                <div class="card stats-card" role="button" onclick="filterServiceJobsByStatus('in_progress')">
+                    <div class="stats-icon text-warning"><i class="bi bi-wrench"></i></div>
+                    <div class="stats-value" id="boardInProgress">0</div>
+                    <div class="stats-label">In Progress</div>
+                </div>
+            </div>
+            <div class="col-md-2">
+                <div class="card stats-card" role="button" onclick="filterServiceJobsByStatus('ready')">
+                    <div class="stats-icon text-success"><i class="bi bi-check2-circle"></i></div>
+                    <div class="stats-value" id="boardReady">0</div>
+                    <div class="stats-label">Ready</div>
+                </div>
+            </div>
+            <div class="col-md-2">
+                <div class="card stats-card">
+                    <div class="stats-icon text-danger"><i class="bi bi-alarm"></i></div>
+                    <div class="stats-value" id="boardOverdue">0</div>
+                    <div class="stats-label">Overdue</div>
+                </div>
+            </div>
+            <div class="col-md-2">
+                <div class="card stats-card">
+                    <div class="stats-icon text-primary"><i class="bi bi-hourglass-split"></i></div>
+                    <div class="stats-value" id="boardTurnaround">-</div>
+                    <div class="stats-label">Avg Turnaround (3 mo)</div>
+                </div>
+            </div>
+            <div class="col-md-2">
+                <div class="card stats-card">
+                    <div class="stats-icon text-secondary"><i class="bi bi-calendar-check"></i></div>
+                    <div class="stats-value" id="boardOnTime">-</div>
+                    <div class="stats-label">On Time (3 mo)</div>
+                </div>
+            </div>
+        </div>
+
         <div class="filter-section">
             <div class="row">
                 <div class="col-md-3">
                     <label class="form-label">Search</label>
-                    <input type="text" class="form-control" id="searchServiceJob" placeholder="Job #, Customer, Phone, IMEI...">
+                    <input type="text" class="form-control" id="searchServiceJob" placeholder="Job #, customer, phone, IMEI, device, problem...">
                 </div>
                 <div class="col-md-2">
                     <label class="form-label">Status</label>
@@ -2758,6 +2997,26 @@ function loadServiceManagement() {
         </div>
     `);
 
+    loadServiceBoard();
+    loadServiceJobs();
+}
+
+function loadServiceBoard() {
+    $.get(`${API_BASE}/service-board`, function(board) {
+        $('#boardReceived').text(board.counts.received || 0);
+        $('#boardInProgress').text(board.counts.in_progress || 0);
+        $('#boardReady').text(board.counts.ready || 0);
+        $('#boardOverdue').text(board.overdue_count);
+
+        const hours = board.turnaround.avg_turnaround_hours;
+        $('#boardTurnaround').text(hours === null ? '-' : hours >= 48 ? `${(hours / 24).toFixed(1)}d` : `${hours}h`);
+        const onTime = board.turnaround.on_time_rate;
+        $('#boardOnTime').text(onTime === null ? '-' : `${Math.round(onTime * 100)}%`);
+    });
+}
+
+function filterServiceJobsByStatus(status) {
+    $('#filterServiceStatus').val(status);
     loadServiceJobs();
 }
 
@@ -2765,61 +3024,21 @@ function loadServiceJobs() {
     const status = $('#filterServiceStatus').val();
     const search = $('#searchServiceJob').val();
 
-    const params = new URLSearchParams();
-    if (status) params.append('status', status);
-    if (search) params.append('search', search);
+    const params = {};
+    if (status) params.status = status;
+    if (search) params.search = search;
 
-    $.get(`${API_BASE}/service-jobs?${params.toString()}`, function(jobs) {
+    $.get(`${API_BASE}/service-jobs`, params, function(jobs, textStatus, xhr) {
         const tbody = $('#serviceJobsTable tbody');
         tbody.empty();
+        setListCursor('serviceJobsTable', `${API_BASE}/service-jobs`, params, xhr, serviceJobRow);
 
         if (jobs.length === 0) {
             tbody.append('<tr><td colspan="9" class="text-center text-muted">No service jobs found</td></tr>');
             return;
         }
 
-        jobs.forEach(job => {
-            let statusBadge = 'secondary';
-            let statusText = job.status;
-
-            if (job.status === 'received') {
-                statusBadge = 'info';
-                statusText = 'Received';
-            } else if (job.status === 'in_progress') {
-                statusBadge = 'warning';
-                statusText = 'In Progress';
-            } else if (job.status === 'ready') {
-                statusBadge = 'success';
-                statusText = 'Ready';
-            } else if (job.status === 'delivered') {
-                statusBadge = 'dark';
-                statusText = 'Delivered';
-            }
-
-            tbody.append(`
-                <tr>
-                    <td><strong>${job.job_number}</strong></td>
-                    <td>${job.customer_name}<br><small class="text-muted">${job.customer_phone}</small></td>
-                    <td>${job.device_brand || 'N/A'} ${job.device_model || ''}</td>
-                    <td><small>${job.imei_number || 'N/A'}</small></td>
-                    <td><small>${job.problem_description.substring(0, 50)}${job.problem_description.length > 50 ? '...' : ''}</small></td>
-                    <td>${job.technician_name || 'Unassigned'}</td>
-                    <td><span class="badge bg-${statusBadge}">${statusText}</span></td>
-                    <td>₹${parseFloat(job.estimated_cost || 0).toFixed(2)}</td>
-                    <td>
-                        <button class="btn btn-sm btn-info action-btn" onclick="viewServiceJob(${job.id})">
-                            <i class="bi bi-eye"></i>
-                        </button>
-                        <button class="btn btn-sm btn-primary action-btn" onclick="editServiceJob(${job.id})">
-                            <i class="bi bi-pencil"></i>
-                        </button>
-                        <button class="btn btn-sm btn-success action-btn" onclick="printServiceReceipt(${job.id})">
-                            <i class="bi bi-printer"></i>
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(jobs.map(serviceJobRow).join(''));
 
         $('#serviceJobsTable').DataTable({
             order: [[0, 'desc']]
@@ -2827,6 +3046,49 @@ function loadServiceJobs() {
     });
 }
 
+function serviceJobRow(job) {
+    let statusBadge = 'secondary';
+    let statusText = job.status;
+
+    if (job.status === 'received') {
+        statusBadge = 'info';
+        statusText = 'Received';
+    } else if (job.status === 'in_progress') {
+        statusBadge = 'warning';
+        statusText = 'In Progress';
+    } else if (job.status === 'ready') {
+        statusBadge = 'success';
+        statusText = 'Ready';
+    } else if (job.status === 'delivered') {
+        statusBadge = 'dark';
+        statusText = 'Delivered';
+    }
+
+    return `
+        <tr>
+            <td><strong>${job.job_number}</strong></td>
+            <td>${job.customer_name}<br><small class="text-muted">${job.customer_phone}</small></td>
+            <td>${job.device_brand || 'N/A'} ${job.device_model || ''}</td>
+            <td><small>${job.imei_number || 'N/A'}</small></td>
+            <td><small>${job.problem_description.substring(0, 50)}${job.problem_description.length > 50 ? '...' : ''}</small></td>
+            <td>${job.technician_name || 'Unassigned'}</td>
+            <td><span class="badge bg-${statusBadge}">${statusText}</span></td>
+            <td>₹${parseFloat(job.estimated_cost || 0).toFixed(2)}</td>
+            <td>
+                <button class="btn btn-sm btn-info action-btn" onclick="viewServiceJob(${job.id})">
+                    <i class="bi bi-eye"></i>
+                </button>
+                <button class="btn btn-sm btn-primary action-btn" onclick="editServiceJob(${job.id})">
+                    <i class="bi bi-pencil"></i>
+                </button>
+                <button class="btn btn-sm btn-success action-btn" onclick="printServiceReceipt(${job.id})">
+                    <i class="bi bi-printer"></i>
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 function showAddServiceJob() {
     $('#serviceJobId').val('');
     $('#serviceJobForm')[0].reset();
@@ -2834,7 +3096,7 @@ function showAddServiceJob() {
     $('#partsUsedBody, #laborChargesBody').empty();
 
     // Load technicians
-    $.get(`${API_BASE}/technicians`, function(techs) {
+    $.get(`${API_BASE}/technicians`, { limit: 500 }, function(techs) {
         const select = $('#serviceJobTechnician');
         select.empty().append('<option value="">Select Technician</option>');
         techs.forEach(tech => {
@@ -2952,7 +3214,7 @@ function editServiceJob(id) {
         $('#serviceJobNotes').val(job.notes || '');
 
         // Load technicians
-        $.get(`${API_BASE}/technicians`, function(techs) {
+        $.get(`${API_BASE}/technicians`, { limit: 500 }, function(techs) {
             const select = $('#serviceJobTechnician');
             select.empty().append('<option value="">Select Technician</option>');
             techs.forEach(tech => {
@@ -3081,6 +3343,7 @@ function saveServiceJob() {
         success: function() {
             alert('Service job saved successfully!');
             bootstrap.Modal.getInstance($('#serviceJobModal')).hide();
+            loadServiceBoard();
             loadServiceJobs();
         },
         error: function(xhr) {
@@ -3198,34 +3461,37 @@ function loadTechnicians() {
         </div>
     `);
 
-    $.get(`${API_BASE}/technicians`, function(techs) {
+    $.get(`${API_BASE}/technicians`, function(techs, status, xhr) {
         const tbody = $('#techniciansTable tbody');
         tbody.empty();
 
-        techs.forEach(tech => {
-            tbody.append(`
-                <tr>
-                    <td>${tech.name}</td>
-                    <td>${tech.phone || 'N/A'}</td>
-                    <td>${tech.email || 'N/A'}</td>
-                    <td>${tech.specialization || 'N/A'}</td>
-                    <td><span class="badge bg-${tech.status === 'active' ? 'success' : 'secondary'}">${tech.status}</span></td>
-                    <td>
-                        <button class="btn btn-sm btn-primary action-btn" onclick="editTechnician(${tech.id})">
-                            <i class="bi bi-pencil"></i>
-                        </button>
-                        <button class="btn btn-sm btn-danger action-btn" onclick="deleteTechnician(${tech.id})">
-                            <i class="bi bi-trash"></i>
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(techs.map(technicianRow).join(''));
 
         $('#techniciansTable').DataTable();
+        setListCursor('techniciansTable', `${API_BASE}/technicians`, {}, xhr, technicianRow);
     });
 }
 
+function technicianRow(tech) {
+    return `
+        <tr>
+            <td>${tech.name}</td>
+            <td>${tech.phone || 'N/A'}</td>
+            <td>${tech.email || 'N/A'}</td>
+            <td>${tech.specialization || 'N/A'}</td>
+            <td><span class="badge bg-${tech.status === 'active' ? 'success' : 'secondary'}">${tech.status}</span></td>
+            <td>
+                <button class="btn btn-sm btn-primary action-btn" onclick="editTechnician(${tech.id})">
+                    <i class="bi bi-pencil"></i>
+                </button>
+                <button class="btn btn-sm btn-danger action-btn" onclick="deleteTechnician(${tech.id})">
+                    <i class="bi bi-trash"></i>
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 function showAddTechnician() {
     $('#technicianId').val('');
     $('#technicianForm')[0].reset();
@@ -3235,7 +3501,7 @@ function showAddTechnician() {
 }
 
 function editTechnician(id) {
-    $.get(`${API_BASE}/technicians`, function(techs) {
+    $.get(`${API_BASE}/technicians`, { limit: 500 }, function(techs) {
         const tech = techs.find(t => t.id === id);
         if (!tech) return;
 
@@ -3322,34 +3588,37 @@ function loadGRNs() {
         </div>
     `);
 
-    $.get(`${API_BASE}/grns`, function(data) {
+    $.get(`${API_BASE}/grns`, function(data, status, xhr) {
         const tbody = $('#grnTable tbody');
         tbody.empty();
 
-        data.forEach(grn => {
-            const receivedDate = new Date(grn.received_date).toLocaleDateString();
-            tbody.append(`
-                <tr>
-                    <td>${grn.grn_number}</td>
-                    <td>${grn.po_number || '-'}</td>
-                    <td>${grn.supplier_name || '-'}</td>
-                    <td>${receivedDate}</td>
-                    <td>$${parseFloat(grn.total_amount || 0).toFixed(2)}</td>
-                    <td>
-                        <button class="btn btn-sm btn-info action-btn" onclick="viewGRN(${grn.id})">
-                            <i class="bi bi-eye"></i> View
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(data.map(grnRow).join(''));
 
         $('#grnTable').DataTable({
             order: [[0, 'desc']]
         });
+        setListCursor('grnTable', `${API_BASE}/grns`, {}, xhr, grnRow);
     });
 }
 
+function grnRow(grn) {
+    const receivedDate = new Date(grn.received_date).toLocaleDateString();
+    return `
+        <tr>
+            <td>${grn.grn_number}</td>
+            <td>${grn.po_number || '-'}</td>
+            <td>${grn.supplier_name || '-'}</td>
+            <td>${receivedDate}</td>
+            <td>$${parseFloat(grn.total_amount || 0).toFixed(2)}</td>
+            <td>
+                <button class="btn btn-sm btn-info action-btn" onclick="viewGRN(${grn.id})">
+                    <i class="bi bi-eye"></i> View
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 function viewGRN(id) {
     $.get(`${API_BASE}/grns/${id}`, function(grn) {
         const receivedDate = new Date(grn.received_date).toLocaleDateString();
@@ -3695,9 +3964,43 @@ function generateIMEIFields() {
         } else {
             $(this).val(value);
         }
+
+        $(this).removeClass('is-invalid').removeAttr('title');
+        if ($(this).val().length === 15) {
+            checkScannedIMEI($(this));
+        }
     });
 }
 
+// Flag a scanned IMEI that is mistyped or already in stock as soon as it is complete
+function checkScannedIMEI(input) {
+    const imei = input.val();
+    $.ajax({
+        url: `${API_BASE}/imeis/check`,
+        method: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ imeis: [imei] }),
+        success: function(data) {
+            const result = data.results[0];
+            // Ignore answers for a value that has since been edited
+            if (input.val() !== imei || !result || result.status === 'accepted') return;
+            const messages = {
+                invalid_format: 'IMEI must be exactly 15 digits',
+                invalid_check_digit: 'Check digit does not match - rescan this IMEI',
+                already_exists: 'This IMEI is already in the system'
+            };
+            input.addClass('is-invalid').attr('title', messages[result.status] || result.status);
+        }
+    });
+
+    const duplicate = $('.imei-input').filter(function() {
+        return this !== input[0] && $(this).val() === imei;
+    }).length > 0;
+    if (duplicate) {
+        input.addClass('is-invalid').attr('title', 'Duplicate IMEI in this adjustment');
+    }
+}
+
 function autoFillIMEI() {
     const quantity = parseInt($('#adjustmentQuantity').val()) || 0;
     if (quantity <= 0) return;
@@ -3706,17 +4009,31 @@ function autoFillIMEI() {
         return;
     }
 
-    // Generate random but valid-looking IMEI numbers for testing
+    // Generate random IMEI numbers with a valid check digit for testing
     for (let i = 1; i <= quantity; i++) {
         const timestamp = Date.now().toString().substring(3);
         const random = Math.floor(Math.random() * 10000).toString().padStart(4, '0');
-        const testIMEI = (timestamp + random + i.toString().padStart(2, '0')).substring(0, 15);
-        $(`#imei_${i}`).val(testIMEI);
+        const body = (timestamp + random + i.toString().padStart(2, '0')).substring(0, 14);
+        $(`#imei_${i}`).val(body + imeiCheckDigit(body));
     }
 
     $('#imeiCount').text(quantity);
 }
 
+// Luhn check digit for a 14-digit IMEI body
+function imeiCheckDigit(body) {
+    let sum = 0;
+    for (let i = 0; i < body.length; i++) {
+        let digit = parseInt(body[i]);
+        if (i % 2 === 1) {
+            digit *= 2;
+            if (digit > 9) digit -= 9;
+        }
+        sum += digit;
+    }
+    return ((10 - sum % 10) % 10).toString();
+}
+
 function collectIMEINumbers() {
     const imeiList = [];
     const quantity = parseInt($('#adjustmentQuantity').val()) || 0;
@@ -3816,9 +4133,10 @@ function submitStockAdjustment() {
 }
 
 function loadAdjustmentHistory() {
-    $.get(`${API_BASE}/stock-adjustments`, function(adjustments) {
+    $.get(`${API_BASE}/stock-adjustments`, function(adjustments, status, xhr) {
         const tbody = $('#adjustmentHistoryBody');
         tbody.empty();
+        setListCursor('adjustmentHistoryTable', `${API_BASE}/stock-adjustments`, {}, xhr, adjustmentHistoryRow);
 
         if (adjustments.length === 0) {
             tbody.append(`
@@ -3831,32 +4149,7 @@ function loadAdjustmentHistory() {
             return;
         }
 
-        adjustments.forEach((adj, index) => {
-            const date = new Date(adj.created_at);
-            const formattedDate = date.toLocaleString();
-            const imeiText = adj.imei_count > 0 ? `<span class="badge bg-info">${adj.imei_count} IMEI</span>` : '-';
-            const notes = adj.notes || '-';
-
-            tbody.append(`
-                <tr>
-                    <td>${index + 1}</td>
-                    <td>${formattedDate}</td>
-                    <td>${adj.product_name || 'N/A'}</td>
-                    <td>${adj.sku || 'N/A'}</td>
-                    <td><span class="badge bg-success">+${adj.quantity}</span></td>
-                    <td>${imeiText}</td>
-                    <td>${notes}</td>
-                    <td>
-                        <button class="btn btn-sm btn-info" onclick="viewAdjustmentDetail(${adj.id})" title="View Details">
-                            <i class="bi bi-eye"></i>
-                        </button>
-                        <button class="btn btn-sm btn-danger" onclick="deleteAdjustment(${adj.id}, '${adj.product_name}')" title="Delete">
-                            <i class="bi bi-trash"></i>
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(adjustments.map(adjustmentHistoryRow).join(''));
     }).fail(function(xhr) {
         $('#adjustmentHistoryBody').html(`
             <tr>
@@ -3868,6 +4161,33 @@ function loadAdjustmentHistory() {
     });
 }
 
+function adjustmentHistoryRow(adj, index) {
+    const date = new Date(adj.created_at);
+    const formattedDate = date.toLocaleString();
+    const imeiText = adj.imei_count > 0 ? `<span class="badge bg-info">${adj.imei_count} IMEI</span>` : '-';
+    const notes = adj.notes || '-';
+
+    return `
+        <tr>
+            <td>${index + 1}</td>
+            <td>${formattedDate}</td>
+            <td>${adj.product_name || 'N/A'}</td>
+            <td>${adj.sku || 'N/A'}</td>
+            <td><span class="badge bg-success">+${adj.quantity}</span></td>
+            <td>${imeiText}</td>
+            <td>${notes}</td>
+            <td>
+                <button class="btn btn-sm btn-info" onclick="viewAdjustmentDetail(${adj.id})" title="View Details">
+                    <i class="bi bi-eye"></i>
+                </button>
+                <button class="btn btn-sm btn-danger" onclick="deleteAdjustment(${adj.id}, '${adj.product_name}')" title="Delete">
+                    <i class="bi bi-trash"></i>
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 function viewAdjustmentDetail(id) {
     $.get(`${API_BASE}/stock-adjustments/${id}`, function(adj) {
         const date = new Date(adj.created_at);
@@ -5389,14 +5709,14 @@ function viewStockHistory(productId) {
         return;
     }
 
-    // Load the stock history data
+    // Load the newest page; older pages are appended on demand
     $.get(`${API_BASE}/products/${productId}/stock-history`, function(data) {
         const productName = escapeHtml(data.product_name || 'Unknown Product');
 
         let content = `
             <div class="mb-3">
                 <h6><i class="bi bi-box-seam"></i> Complete Audit Trail for: <strong>${productName}</strong></h6>
-                <p class="text-muted mb-0"><small>Complete history of all stock movements with running balance</small></p>
+                <p class="text-muted mb-0"><small>Stock movements with running balance, newest first. Current stock: <strong>${parseInt(data.current_stock) || 0}</strong></small></p>
             </div>
             <div class="table-responsive">
                 <table class="table table-sm table-striped table-hover table-bordered">
@@ -5410,105 +5730,24 @@ function viewStockHistory(productId) {
                             <th style="min-width: 120px;" class="text-center"><i class="bi bi-bar-chart"></i> Running Balance</th>
                         </tr>
                     </thead>
-                    <tbody>
+                    <tbody id="stockHistoryRows">
         `;
 
         if (!data.history || data.history.length === 0) {
             content += '<tr><td colspan="6" class="text-center text-muted"><i class="bi bi-inbox"></i><br>No stock movements found for this product</td></tr>';
         } else {
-            let totalAdded = 0;
-            let totalRemoved = 0;
-
-            data.history.forEach((item, index) => {
-                try {
-                    const dateStr = item.date_time || '';
-                    const date =new Date(dateStr);
-                    const formattedDate = !isNaN(date.getTime()) ? date.toLocaleDateString('en-US', {
-                        year: 'numeric',
-                        month: 'short',
-                        day: 'numeric'
-                    }) : 'Invalid Date';
-                    const formattedTime = !isNaN(date.getTime()) ? date.toLocaleTimeString('en-US', {
-                        hour: '2-digit',
-                        minute: '2-digit',
-                        second: '2-digit'
-                    }) : '';
-
-                    const stockAddedVal = parseInt(item.stock_added) || 0;
-                    const stockRemovedVal = parseInt(item.stock_removed) || 0;
-
-                    const stockAdded = stockAddedVal > 0
-                        ? `<span class="badge bg-success">+${stockAddedVal}</span>`
-                        : '<span class="text-muted">-</span>';
-
-                    const stockRemoved = stockRemovedVal > 0
-                        ? `<span class="badge bg-danger">-${stockRemovedVal}</span>`
-                        : '<span class="text-muted">-</span>';
-
-                    const reference = escapeHtml(item.reference || 'Manual Entry');
-                    const performedBy = escapeHtml(item.received_by || 'System');
-
-                    const runningBalance = parseInt(item.running_balance) || 0;
-
-                    // Determine balance color based on stock level
-                    let balanceClass = 'text-primary';
-                    if (runningBalance === 0) {
-                        balanceClass = 'text-danger';
-                    } else if (runningBalance < 10) {
-                        balanceClass = 'text-warning';
-                    }
-
-                    totalAdded += stockAddedVal;
-                    totalRemoved += stockRemovedVal;
-
-                    content += `
-                        <tr>
-                            <td>
-                                <div class="d-flex flex-column">
-                                    <span class="fw-bold">${formattedDate}</span>
-                                    <small class="text-muted">${formattedTime}</small>
-                                </div>
-                            </td>
-                            <td class="text-center">${stockAdded}</td>
-                            <td class="text-center">${stockRemoved}</td>
-                            <td>
-                                <span class="badge bg-info bg-opacity-10 text-dark">
-                                    <i class="bi bi-link-45deg"></i> ${reference}
-                                </span>
-                            </td>
-                            <td>
-                                <span class="badge bg-secondary bg-opacity-10 text-dark">
-                                    <i class="bi bi-person-circle"></i> ${performedBy}
-                                </span>
-                            </td>
-                            <td class="text-center">
-                                <strong class="${balanceClass}" style="font-size: 1.1em;">${runningBalance}</strong>
-                            </td>
-                        </tr>
-                    `;
-                } catch (err) {
-                    console.error('Error rendering row:', err, item);
-                }
-            });
-
-            // Add summary row
-            const currentBalance = data.history.length > 0 ? (parseInt(data.history[data.history.length - 1].running_balance) || 0) : 0;
-
-            content += `
-                    <tr class="table-light fw-bold">
-                        <td class="text-end">SUMMARY:</td>
-                        <td class="text-center text-success">+${totalAdded}</td>
-                        <td class="text-center text-danger">-${totalRemoved}</td>
-                        <td colspan="2" class="text-center">Total Transactions: ${data.history.length}</td>
-                        <td class="text-center text-primary" style="font-size: 1.1em;">${currentBalance}</td>
-                    </tr>
-            `;
+            content += data.history.map(stockHistoryRow).join('');
         }
 
         content += `
                     </tbody>
                 </table>
             </div>
+            <div class="text-center">
+                <button class="btn btn-outline-secondary btn-sm" id="stockHistoryMore" style="display: none;">
+                    <i class="bi bi-arrow-down-circle"></i> Load older movements
+                </button>
+            </div>
             <div class="mt-3">
                 <div class="alert alert-info mb-0">
                     <i class="bi bi-info-circle"></i> <strong>Legend:</strong>
@@ -5524,6 +5763,7 @@ function viewStockHistory(productId) {
         `;
 
         $('#stockHistoryContent').html(content);
+        setStockHistoryCursor(productId, data.next_cursor);
     }).fail(function(xhr) {
         console.error('Stock history API error:', xhr);
         const errorMsg = escapeHtml((xhr.responseJSON && xhr.responseJSON.error) ? xhr.responseJSON.error : 'Failed to load stock history. Please try again.');
@@ -5536,6 +5776,131 @@ function viewStockHistory(productId) {
     });
 }
 
+// List endpoints return one page and send the cursor for the next one in
+// X-Next-Cursor; keep a "Load more" button under the table while there is one
+function setListCursor(tableId, url, params, xhr, rowHtml) {
+    const table = $(`#${tableId}`);
+    let button = $(`#${tableId}More`);
+    if (!button.length) {
+        button = $(`
+            <button class="btn btn-outline-secondary btn-sm mt-2" id="${tableId}More">
+                <i class="bi bi-arrow-down-circle"></i> Load more
+            </button>
+        `);
+        const wrapper = table.closest('.dataTables_wrapper');
+        (wrapper.length ? wrapper : table).after(button);
+    }
+
+    const nextCursor = xhr.getResponseHeader('X-Next-Cursor');
+    button.off('click').toggle(!!nextCursor).prop('disabled', false);
+    if (!nextCursor) return;
+
+    button.on('click', function() {
+        button.prop('disabled', true);
+        $.get(url, { ...params, cursor: nextCursor }, function(rows, status, nextXhr) {
+            const isDataTable = $.fn.DataTable.isDataTable(table);
+            const offset = isDataTable ? table.DataTable().rows().count() : table.find('tbody tr').length;
+            const html = rows.map((row, index) => rowHtml(row, offset + index)).join('');
+            if (isDataTable) {
+                table.DataTable().rows.add($(html).filter('tr')).draw(false);
+            } else {
+                table.find('tbody').append(html);
+            }
+            setListCursor(tableId, url, params, nextXhr, rowHtml);
+        }).fail(function() {
+            button.prop('disabled', false);
+            alert('Error loading more rows');
+        });
+    });
+}
+
+function setStockHistoryCursor(productId, nextCursor) {
+    const button = $('#stockHistoryMore');
+    button.off('click').toggle(!!nextCursor).prop('disabled', false);
+    if (!nextCursor) return;
+
+    button.on('click', function() {
+        button.prop('disabled', true);
+        $.get(`${API_BASE}/products/${productId}/stock-history`, { before_id: nextCursor }, function(data) {
+            $('#stockHistoryRows').append(data.history.map(stockHistoryRow).join(''));
+            setStockHistoryCursor(productId, data.next_cursor);
+        }).fail(function() {
+            button.prop('disabled', false);
+            alert('Error loading older stock movements');
+        });
+    });
+}
+
+function stockHistoryRow(item) {
+    try {
+        const dateStr = item.date_time || '';
+        const date = new Date(dateStr);
+        const formattedDate = !isNaN(date.getTime()) ? date.toLocaleDateString('en-US', {
+            year: 'numeric',
+            month: 'short',
+            day: 'numeric'
+        }) : 'Invalid Date';
+        const formattedTime = !isNaN(date.getTime()) ? date.toLocaleTimeString('en-US', {
+            hour: '2-digit',
+            minute: '2-digit',
+            second: '2-digit'
+        }) : '';
+
+        const stockAddedVal = parseInt(item.stock_added) || 0;
+        const stockRemovedVal = parseInt(item.stock_removed) || 0;
+
+        const stockAdded = stockAddedVal > 0
+            ? `<span class="badge bg-success">+${stockAddedVal}</span>`
+            : '<span class="text-muted">-</span>';
+
+        const stockRemoved = stockRemovedVal > 0
+            ? `<span class="badge bg-danger">-${stockRemovedVal}</span>`
+            : '<span class="text-muted">-</span>';
+
+        const reference = escapeHtml(item.reference || 'Manual Entry');
+        const performedBy = escapeHtml(item.received_by || 'System');
+
+        const runningBalance = parseInt(item.running_balance) || 0;
+
+        // Determine balance color based on stock level
+        let balanceClass = 'text-primary';
+        if (runningBalance === 0) {
+            balanceClass = 'text-danger';
+        } else if (runningBalance < 10) {
+            balanceClass = 'text-warning';
+        }
+
+        return `
+            <tr>
+                <td>
+                    <div class="d-flex flex-column">
+                        <span class="fw-bold">${formattedDate}</span>
+                        <small class="text-muted">${formattedTime}</small>
+                    </div>
+                </td>
+                <td class="text-center">${stockAdded}</td>
+                <td class="text-center">${stockRemoved}</td>
+                <td>
+                    <span class="badge bg-info bg-opacity-10 text-dark">
+                        <i class="bi bi-link-45deg"></i> ${reference}
+                    </span>
+                </td>
+                <td>
+                    <span class="badge bg-secondary bg-opacity-10 text-dark">
+                        <i class="bi bi-person-circle"></i> ${performedBy}
+                    </span>
+                </td>
+                <td class="text-center">
+                    <strong class="${balanceClass}" style="font-size: 1.1em;">${runningBalance}</strong>
+                </td>
+            </tr>
+        `;
+    } catch (err) {
+        console.error('Error rendering row:', err, item);
+        return '';
+    }
+}
+
 function deleteAdjustment(id, productName) {
     if (!confirm(`Are you sure you want to delete this stock adjustment for ${productName}?\n\nThis will reverse the stock change. This action cannot be undone.`)) {
         return;
@@ -5564,42 +5929,45 @@ let loadCustomersTable = function() {
     const search = $('#customerSearch').val();
     const status = $('#customerStatusFilter').val();
 
-    $.get(`${API_BASE}/customers`, { search, status }, function(customers) {
+    $.get(`${API_BASE}/customers`, { search, status }, function(customers, textStatus, xhr) {
         const tbody = $('#customersTable tbody');
         tbody.empty();
+        setListCursor('customersTable', `${API_BASE}/customers`, { search, status }, xhr, customerRow);
 
         if (customers.length === 0) {
             tbody.append('<tr><td colspan="8" class="text-center text-muted">No customers found</td></tr>');
             return;
         }
 
-        customers.forEach(customer => {
-            const statusBadge = customer.status === 'active' ? 'success' : 'secondary';
-            const createdDate = new Date(customer.created_at).toLocaleDateString();
-
-            tbody.append(`
-                <tr>
-                    <td>${customer.name}</td>
-                    <td>${customer.phone || '-'}</td>
-                    <td>${customer.email || '-'}</td>
-                    <td>${customer.city || '-'}</td>
-                    <td>${customer.gstin || '-'}</td>
-                    <td><span class="badge bg-${statusBadge}">${customer.status}</span></td>
-                    <td>${createdDate}</td>
-                    <td>
-                        <button class="btn btn-sm btn-primary" onclick="editCustomer(${customer.id})">
-                            <i class="bi bi-pencil"></i>
-                        </button>
-                        <button class="btn btn-sm btn-danger" onclick="deleteCustomer(${customer.id})">
-                            <i class="bi bi-trash"></i>
-                        </button>
-                    </td>
-                </tr>
-            `);
-        });
+        tbody.append(customers.map(customerRow).join(''));
     });
 };
 
+function customerRow(customer) {
+    const statusBadge = customer.status === 'active' ? 'success' : 'secondary';
+    const createdDate = new Date(customer.created_at).toLocaleDateString();
+
+    return `
+        <tr>
+            <td>${customer.name}</td>
+            <td>${customer.phone || '-'}</td>
+            <td>${customer.email || '-'}</td>
+            <td>${customer.city || '-'}</td>
+            <td>${customer.gstin || '-'}</td>
+            <td><span class="badge bg-${statusBadge}">${customer.status}</span></td>
+            <td>${createdDate}</td>
+            <td>
+                <button class="btn btn-sm btn-primary" onclick="editCustomer(${customer.id})">
+                    <i class="bi bi-pencil"></i>
+                </button>
+                <button class="btn btn-sm btn-danger" onclick="deleteCustomer(${customer.id})">
+                    <i class="bi bi-trash"></i>
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
 
 function loadCustomers() {
     $('#content-area').html(`
@@ -5947,6 +6315,11 @@ function loadReports() {
                                         <option value="good">Good Stock</option>
                                     </select>
                                 </div>
+                                <div class="mb-3">
+                                    <label class="form-label fw-bold">As of Date</label>
+                                    <input type="date" class="form-control" id="inventoryReportAsOf">
+                                    <small class="text-muted">Leave empty for current stock</small>
+                                </div>
                                 <div class="alert alert-success">
                                     <small><i class="bi bi-info-circle"></i> <strong>Includes:</strong> SKU, product name, stock levels, pricing, stock value, status</small>
                                 </div>
@@ -6295,10 +6668,12 @@ function generateSalesReport() {
 function generateInventoryReport() {
     const category = $('#inventoryReportCategory').val();
     const status = $('#inventoryReportStatus').val();
+    const asOf = $('#inventoryReportAsOf').val();
 
     let url = `${API_BASE}/reports/inventory?format=excel`;
     if (category) url += `&category_id=${category}`;
     if (status) url += `&stock_status=${status}`;
+    if (asOf) url += `&as_of=${asOf}`;
 
     window.location.href = url;
 }
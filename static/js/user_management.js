@@ -321,18 +321,28 @@ function saveRole() {
 }
 
 // Audit Logs
-function loadAuditLogs(page = 1) {
+// Cursors of the pages already visited, so "Newer" can step back
+let auditCursors = [];
+
+function loadAuditLogs(cursor = null) {
+    if (cursor === null) {
+        auditCursors = [];
+    }
+
     const params = {
-        page: page,
-        per_page: 20,
+        limit: 20,
         start_date: $('#auditStartDate').val(),
         end_date: $('#auditEndDate').val(),
         action_type: $('#auditActionType').val()
     };
+    if (cursor) {
+        params.before_id = cursor;
+    }
 
     $.get(`${API_BASE}/audit-logs`, params, function(response) {
         const list = $('#auditLogsList');
         list.empty();
+        $('#auditPagination').empty();
 
         if (response.logs.length === 0) {
             list.html('<p class="text-muted">No audit logs found</p>');
@@ -347,7 +357,7 @@ function loadAuditLogs(page = 1) {
                         <strong>${log.action_type}</strong>
                         <small class="text-muted">${date}</small>
                     </div>
-                    <div>${log.description}</div>
+                    <div>${log.description || ''}</div>
                     <small class="text-muted">
                         User: ${log.username || 'Unknown'} | IP: ${log.ip_address || '-'}
                     </small>
@@ -356,15 +366,32 @@ function loadAuditLogs(page = 1) {
         });
 
         // Pagination
-        if (response.pages > 1) {
+        const hasNewer = auditCursors.length > 0;
+        if (hasNewer || response.next_cursor) {
             let pagination = '<ul class="pagination">';
-            for (let i = 1; i <= response.pages; i++) {
-                pagination += `<li class="page-item ${i === page ? 'active' : ''}">
-                    <a class="page-link" href="#" onclick="loadAuditLogs(${i}); return false;">${i}</a>
-                </li>`;
-            }
+            pagination += `<li class="page-item ${hasNewer ? '' : 'disabled'}">
+                <a class="page-link" href="#" onclick="loadNewerAuditLogs(); return false;">Newer</a>
+            </li>`;
+            pagination += `<li class="page-item disabled"><span class="page-link">${response.total} entries</span></li>`;
+            pagination += `<li class="page-item ${response.next_cursor ? '' : 'disabled'}">
+                <a class="page-link" href="#" onclick="loadOlderAuditLogs(${cursor || 0}, ${response.next_cursor}); return false;">Older</a>
+            </li>`;
             pagination += '</ul>';
             $('#auditPagination').html(pagination);
         }
     });
 }
+
+function loadOlderAuditLogs(currentCursor, nextCursor) {
+    auditCursors.push(currentCursor);
+    loadAuditLogs(nextCursor);
+}
+
+function loadNewerAuditLogs() {
+    const previous = auditCursors.pop();
+    if (previous) {
+        loadAuditLogs(previous);
+    } else {
+        loadAuditLogs();
+    }
+}
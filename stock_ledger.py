@@ -0,0 +1,220 @@
+"""Stock ledger: stored running balances on ``stock_movements``.
+
+Every movement carries a signed ``quantity`` and ``balance_after``, the
+product's stock once that movement is applied, in ledger order
+(``created_at``, ``id``). Triggers fill ``balance_after`` as rows are
+inserted and shift the balances of any later rows when a movement is
+inserted back-dated or deleted, so the history endpoint only ever reads one
+page of rows off the ``(product_id, created_at)`` index.
+
+Writers must change a product's stock and record the matching movement
+together, one movement at a time: update ``current_stock`` for that
+movement alone, then insert it. A product's first movement is seeded from
+its stock, so a batch that applies several lines' stock first and inserts
+their movements afterwards would open the ledger at the wrong balance. A
+batch for the same product either interleaves update and insert per line
+or records one movement for the product's combined change.
+
+``stock_checkpoints`` records each product's ledger balance at a point in
+time; the reconciliation and snapshot jobs start from the latest one rather
+than replaying a product's whole history.
+
+Usage:
+    python stock_ledger.py checkpoint   # record balances (run daily from cron)
+    python stock_ledger.py rebuild      # recompute balance_after from current stock
+"""
+import sqlite3
+
+DATABASE = 'inventory.db'
+
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 500
+
+# Rows of the same product after NEW/OLD in ledger order, written as a range
+# on created_at so the index is used even for products with long histories
+_LATER = '''
+    product_id = {row}.product_id AND created_at >= {row}.created_at
+    AND (created_at > {row}.created_at OR id > {row}.id)
+'''
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_stock_ledger(cursor):
+    """Add balance_after, its triggers and index, and backfill existing movements"""
+    cursor.execute('PRAGMA table_info(stock_movements)')
+    columns = [column[1] for column in cursor.fetchall()]
+    backfill = 'balance_after' not in columns
+    if backfill:
+        cursor.execute('ALTER TABLE stock_movements ADD COLUMN balance_after INTEGER')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id, created_at)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            movement_id INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_checkpoints_product ON stock_checkpoints(product_id, id)')
+
+    # Balance before NEW: the previous row's balance, else the next row's
+    # balance before it was applied, else (first movement) the product's
+    # stock less NEW, which relies on the writer having applied exactly
+    # this movement to the stock just before inserting it (see above)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ledger_insert
+        AFTER INSERT ON stock_movements
+        BEGIN
+            UPDATE stock_movements SET balance_after = balance_after + NEW.quantity
+            WHERE {_LATER.format(row='NEW')};
+
+            UPDATE stock_movements SET balance_after = NEW.quantity + COALESCE(
+                (SELECT prev.balance_after FROM stock_movements prev
+                 WHERE prev.product_id = NEW.product_id AND prev.created_at <= NEW.created_at
+                   AND (prev.created_at < NEW.created_at OR prev.id < NEW.id)
+                 ORDER BY prev.created_at DESC, prev.id DESC LIMIT 1),
+                (SELECT nxt.balance_after - nxt.quantity - NEW.quantity FROM stock_movements nxt
+                 WHERE nxt.product_id = NEW.product_id AND nxt.created_at >= NEW.created_at
+                   AND (nxt.created_at > NEW.created_at OR nxt.id > NEW.id)
+                 ORDER BY nxt.created_at, nxt.id LIMIT 1),
+                (SELECT current_stock - NEW.quantity FROM products WHERE id = NEW.product_id),
+                0
+            )
+            WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ledger_delete
+        AFTER DELETE ON stock_movements
+        BEGIN
+            UPDATE stock_movements SET balance_after = balance_after - OLD.quantity
+            WHERE {_LATER.format(row='OLD')};
+        END
+    ''')
+
+    if backfill:
+        rebuild_balances(cursor)
+
+
+def rebuild_balances(cursor, product_id=None):
+    """Recompute balance_after so each product's ledger ends at its current stock"""
+    where = 'WHERE sm.product_id = ?' if product_id else ''
+    cursor.execute(f'''
+        UPDATE stock_movements
+        SET balance_after = ledger.balance
+        FROM (
+            SELECT sm.id,
+                   COALESCE(p.current_stock, 0) - COALESCE(SUM(sm.quantity) OVER (
+                       PARTITION BY sm.product_id ORDER BY sm.created_at, sm.id
+                       ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+                   ), 0) AS balance
+            FROM stock_movements sm
+            LEFT JOIN products p ON p.id = sm.product_id
+            {where}
+        ) AS ledger
+        WHERE stock_movements.id = ledger.id
+    ''', (product_id,) if product_id else ())
+    return cursor.rowcount
+
+
+def write_checkpoints(cursor):
+    """Record the ledger balance of every product that has moved since its last checkpoint"""
+    cursor.execute('''
+        INSERT INTO stock_checkpoints (product_id, movement_id, balance)
+        SELECT latest.product_id, latest.id, latest.balance_after
+        FROM (
+            SELECT product_id, id, balance_after,
+                   ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY created_at DESC, id DESC) AS position
+            FROM stock_movements
+        ) AS latest
+        LEFT JOIN (
+            SELECT product_id, movement_id FROM stock_checkpoints
+            WHERE id IN (SELECT MAX(id) FROM stock_checkpoints GROUP BY product_id)
+        ) AS last_checkpoint ON last_checkpoint.product_id = latest.product_id
+        WHERE latest.position = 1
+          AND (last_checkpoint.movement_id IS NULL OR last_checkpoint.movement_id != latest.id)
+    ''')
+    return cursor.rowcount
+
+
+def read_stock_history(cursor, product_id, before_id=None, limit=DEFAULT_HISTORY_LIMIT):
+    """One page of a product's movements, newest first.
+
+    Returns ``(history, next_cursor)``; pass ``next_cursor`` back as
+    ``before_id`` for the next older page. It is None on the last page.
+    """
+    params = [product_id]
+    keyset = ''
+    if before_id:
+        cursor.execute('SELECT created_at FROM stock_movements WHERE id = ?', (before_id,))
+        row = cursor.fetchone()
+        if row:
+            keyset = 'AND sm.created_at <= ? AND (sm.created_at < ? OR sm.id < ?)'
+            params += [row['created_at'], row['created_at'], before_id]
+        else:
+            keyset = 'AND sm.id < ?'
+            params.append(before_id)
+
+    cursor.execute(f'''
+        SELECT
+            sm.id,
+            sm.type,
+            sm.quantity,
+            sm.balance_after,
+            sm.created_at,
+            CASE
+                WHEN sm.reference_type = 'purchase_order' THEN 'PO-' || COALESCE(po.po_number, sm.reference_id)
+                WHEN sm.reference_type = 'grn' THEN COALESCE(g.grn_number, 'GRN-' || sm.reference_id)
+                WHEN sm.reference_type = 'manual' THEN 'Manual Entry'
+                ELSE COALESCE(sm.reference_type, 'System')
+            END as reference_number,
+            COALESCE(g.created_by, 'System') as received_by
+        FROM stock_movements sm
+        LEFT JOIN purchase_orders po ON sm.reference_type = 'purchase_order' AND sm.reference_id = po.id
+        LEFT JOIN grns g ON sm.reference_type = 'grn' AND sm.reference_id = g.id
+        WHERE sm.product_id = ? {keyset}
+        ORDER BY sm.created_at DESC, sm.id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+
+    history = [{
+        'id': row['id'],
+        'type': row['type'],
+        'date_time': row['created_at'],
+        'stock_added': max(row['quantity'], 0),
+        'stock_removed': max(-row['quantity'], 0),
+        'reference': row['reference_number'],
+        'received_by': row['received_by'],
+        'running_balance': row['balance_after']
+    } for row in rows[:limit]]
+    next_cursor = history[-1]['id'] if len(rows) > limit else None
+    return history, next_cursor
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('checkpoint', 'rebuild'):
+        print(__doc__)
+        sys.exit(1)
+
+    conn = get_db()
+    cursor = conn.cursor()
+    if sys.argv[1] == 'checkpoint':
+        written = write_checkpoints(cursor)
+        conn.commit()
+        print(f"📌 Recorded {written} stock checkpoints")
+    else:
+        updated = rebuild_balances(cursor)
+        conn.commit()
+        print(f"🔁 Recomputed balances for {updated} stock movements")
+    conn.close()
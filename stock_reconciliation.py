@@ -0,0 +1,225 @@
+"""Nightly stock reconciliation.
+
+For every product, one grouped pass over ``stock_movements`` (window
+functions in ledger order) recomputes the expected stock from the latest
+checkpoint, or from the opening balance of the product's first movement,
+plus the signed quantities since. That is compared with the stored ledger
+balance, with ``products.current_stock`` and, for IMEI-tracked products,
+with the number of IMEIs still in stock. Only the products that disagree
+are written to ``stock_discrepancies``. The pass runs in a read
+transaction, so POS and other writers carry on while it scans.
+
+With ``apply`` the ledger is brought in line with ``current_stock`` by one
+adjustment movement per drifted product (reference_type 'reconciliation'),
+so the discrepancy stays explained in the product's stock history. Only
+that step takes the write lock, and it re-checks the drifted products
+under the lock, so a correction is worked out from the stock it is
+recorded against.
+
+Usage:
+    python stock_reconciliation.py [--apply]
+"""
+import json
+import sqlite3
+
+DATABASE = 'inventory.db'
+
+IN_STOCK_IMEI_STATUSES = ('available', 'in_stock')
+
+# ``{only}`` restricts the pass to the product ids bound as :ids (or is blank)
+EXPECTED_STOCK_QUERY = f'''
+    WITH ordered AS (
+        SELECT product_id, id, quantity, balance_after,
+               SUM(quantity) OVER ledger AS running,
+               ROW_NUMBER() OVER ledger AS position,
+               COUNT(*) OVER (PARTITION BY product_id) AS movement_count
+        FROM stock_movements
+        {{only}}
+        WINDOW ledger AS (PARTITION BY product_id ORDER BY created_at, id)
+    ),
+    ledger AS (
+        SELECT product_id,
+               SUM(quantity) AS total,
+               MAX(CASE WHEN position = 1 THEN balance_after - quantity END) AS opening,
+               MAX(CASE WHEN position = movement_count THEN balance_after END) AS stored_balance
+        FROM ordered
+        GROUP BY product_id
+    ),
+    checkpoint AS (
+        SELECT c.product_id, c.balance, o.running
+        FROM stock_checkpoints c
+        JOIN ordered o ON o.id = c.movement_id
+        WHERE c.id IN (SELECT MAX(id) FROM stock_checkpoints GROUP BY product_id)
+    ),
+    imeis AS (
+        SELECT product_id,
+               SUM(status IN {IN_STOCK_IMEI_STATUSES}) AS in_stock
+        FROM product_imei
+        {{only}}
+        GROUP BY product_id
+    )
+    SELECT p.id AS product_id,
+           COALESCE(p.current_stock, 0) AS current_stock,
+           CASE
+               WHEN l.product_id IS NULL THEN COALESCE(p.opening_stock, 0)
+               WHEN cp.product_id IS NOT NULL THEN cp.balance + l.total - cp.running
+               ELSE l.opening + l.total
+           END AS expected_stock,
+           l.stored_balance AS ledger_balance,
+           i.in_stock AS imei_in_stock
+    FROM products p
+    LEFT JOIN ledger l ON l.product_id = p.id
+    LEFT JOIN checkpoint cp ON cp.product_id = p.id
+    LEFT JOIN imeis i ON i.product_id = p.id
+    {{only_products}}
+'''
+
+DRIFTED = '''
+    current_stock != expected_stock
+    OR ledger_balance != expected_stock
+    OR (imei_in_stock IS NOT NULL AND imei_in_stock != current_stock)
+'''
+
+
+def get_db():
+    conn = sqlite3.connect(DATABASE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_stock_reconciliation(cursor):
+    """Create the reconciliation run and discrepancy tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reconciliation_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            products_checked INTEGER DEFAULT 0,
+            discrepancies INTEGER DEFAULT 0,
+            corrected INTEGER DEFAULT 0,
+            applied INTEGER DEFAULT 0,
+            created_by INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_discrepancies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            current_stock INTEGER,
+            expected_stock INTEGER,
+            ledger_balance INTEGER,
+            imei_in_stock INTEGER,
+            correction INTEGER DEFAULT 0,
+            FOREIGN KEY (run_id) REFERENCES stock_reconciliation_runs (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_discrepancies_run ON stock_discrepancies(run_id, product_id)')
+
+
+def find_discrepancies(cursor, product_ids=None):
+    """Products whose stock, ledger and IMEIs disagree (among ``product_ids`` if given)"""
+    only = 'WHERE product_id IN (SELECT value FROM json_each(:ids))' if product_ids is not None else ''
+    query = EXPECTED_STOCK_QUERY.format(only=only, only_products=only.replace('product_id', 'p.id'))
+    cursor.execute(f'SELECT * FROM ({query}) WHERE {DRIFTED} ORDER BY product_id',
+                   {'ids': json.dumps(product_ids)} if product_ids is not None else {})
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def reconcile_stock(conn, apply=False, user_id=None):
+    """Run a reconciliation, optionally correcting drift; returns the run summary.
+
+    The comparison reads one consistent snapshot without blocking writers;
+    with ``apply`` the drifted products are compared again under the write
+    lock and corrected from those figures.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN')
+    try:
+        found = find_discrepancies(cursor)
+        cursor.execute('SELECT COUNT(*) FROM products')
+        products_checked = cursor.fetchone()[0]
+    finally:
+        conn.rollback()
+
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('INSERT INTO stock_reconciliation_runs (applied, created_by) VALUES (?, ?)', (int(apply), user_id))
+        run_id = cursor.lastrowid
+
+        corrections = {}
+        if apply and found:
+            # Writes since the snapshot may have moved these products; the
+            # correction is what the ledger needs to end at the stock now
+            for row in find_discrepancies(cursor, [row['product_id'] for row in found]):
+                ledger_end = row['ledger_balance'] if row['ledger_balance'] is not None else row['expected_stock']
+                if row['current_stock'] != ledger_end:
+                    corrections[row['product_id']] = (row['current_stock'] - ledger_end, ledger_end, row['current_stock'])
+
+        cursor.executemany('''
+            INSERT INTO stock_discrepancies
+                (run_id, product_id, current_stock, expected_stock, ledger_balance, imei_in_stock, correction)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(run_id, row['product_id'], row['current_stock'], row['expected_stock'], row['ledger_balance'],
+               row['imei_in_stock'], corrections.get(row['product_id'], (0,))[0]) for row in found])
+
+        # The trigger on stock_movements chains each correction onto the ledger's end
+        cursor.executemany('''
+            INSERT INTO stock_movements (product_id, type, quantity, reference_type, reference_id, notes)
+            VALUES (?, 'adjustment', ?, 'reconciliation', ?, ?)
+        ''', [(product_id, correction, run_id,
+               f'Reconciliation run #{run_id}: ledger {ledger_end}, stock on hand {stock}')
+              for product_id, (correction, ledger_end, stock) in sorted(corrections.items())])
+
+        cursor.execute('''
+            UPDATE stock_reconciliation_runs
+            SET finished_at = CURRENT_TIMESTAMP, products_checked = ?, discrepancies = ?, corrected = ?
+            WHERE id = ?
+        ''', (products_checked, len(found), len(corrections), run_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return get_reconciliation_run(cursor, run_id)
+
+
+def get_reconciliation_run(cursor, run_id=None, limit=500):
+    """A run (the latest when ``run_id`` is None) with up to ``limit`` discrepancies"""
+    if run_id is None:
+        cursor.execute('SELECT * FROM stock_reconciliation_runs ORDER BY id DESC LIMIT 1')
+    else:
+        cursor.execute('SELECT * FROM stock_reconciliation_runs WHERE id = ?', (run_id,))
+    run = cursor.fetchone()
+    if not run:
+        return None
+
+    cursor.execute('''
+        SELECT d.product_id, p.name AS product_name, p.sku, d.current_stock, d.expected_stock,
+               d.ledger_balance, d.imei_in_stock, d.correction,
+               d.current_stock - d.expected_stock AS stock_difference
+        FROM stock_discrepancies d
+        LEFT JOIN products p ON p.id = d.product_id
+        WHERE d.run_id = ?
+        ORDER BY ABS(d.current_stock - d.expected_stock) DESC, d.product_id
+        LIMIT ?
+    ''', (run['id'], limit))
+    return dict(run, items=[dict(row) for row in cursor.fetchall()])
+
+
+if __name__ == '__main__':
+    import sys
+
+    apply = '--apply' in sys.argv[1:]
+    conn = get_db()
+    init_stock_reconciliation(conn.cursor())
+    run = reconcile_stock(conn, apply=apply)
+    conn.close()
+
+    print(f"🔎 Checked {run['products_checked']} products: {run['discrepancies']} discrepancies")
+    for item in run['items'][:20]:
+        print(f"   • {item['product_name']} (#{item['product_id']}): stock {item['current_stock']}, "
+              f"expected {item['expected_stock']}, ledger {item['ledger_balance']}, IMEIs {item['imei_in_stock']}")
+    if apply:
+        print(f"✅ Recorded {run['corrected']} correcting adjustments (run #{run['id']})")
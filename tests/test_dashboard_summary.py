@@ -0,0 +1,90 @@
+"""The trigger-maintained dashboard aggregates match a from-scratch recomputation."""
+import sqlite3
+
+import pytest
+
+from dashboard_summary import init_dashboard_summary, verify_dashboard_summary
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'inventory.db')
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.executescript('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            status TEXT DEFAULT 'active',
+            current_stock INTEGER DEFAULT 0,
+            min_stock_level INTEGER DEFAULT 0,
+            cost_price REAL
+        );
+        CREATE TABLE pos_sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            transaction_type TEXT DEFAULT 'sale',
+            total_amount REAL
+        );
+        CREATE TABLE pos_sale_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sale_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            total_price REAL
+        );
+        CREATE TABLE stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            quantity INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    init_dashboard_summary(cursor)
+    yield cursor
+    conn.close()
+
+
+def test_empty_database_matches(cursor):
+    assert verify_dashboard_summary(cursor) == []
+
+
+def test_product_writes_keep_summary_in_step(cursor):
+    cursor.executemany(
+        'INSERT INTO products (name, status, current_stock, min_stock_level, cost_price) VALUES (?, ?, ?, ?, ?)',
+        [('Phone', 'active', 10, 2, 100.0), ('Case', 'active', 1, 5, 3.5),
+         ('Cable', 'active', 0, 1, None), ('Old', 'inactive', 4, 1, 50.0)]
+    )
+    cursor.execute("UPDATE products SET current_stock = 0 WHERE name = 'Phone'")
+    cursor.execute("UPDATE products SET status = 'active' WHERE name = 'Old'")
+    cursor.execute("UPDATE products SET cost_price = 4.25 WHERE name = 'Case'")
+    cursor.execute("DELETE FROM products WHERE name = 'Cable'")
+    assert verify_dashboard_summary(cursor) == []
+
+
+def test_sales_returns_and_deletes_keep_daily_rollup_in_step(cursor):
+    cursor.execute("INSERT INTO products (name, current_stock, min_stock_level, cost_price) VALUES ('Phone', 5, 1, 100.0)")
+    product_id = cursor.lastrowid
+    for sale_date, transaction_type, amount in (
+        ('2026-10-01 10:00:00', 'sale', 240.0),
+        ('2026-10-01 15:30:00', 'return', -120.0),
+        ('2026-10-02 09:00:00', 'sale', 120.0),
+        ('2026-10-02 11:00:00', 'exchange', 20.0),
+    ):
+        cursor.execute('INSERT INTO pos_sales (sale_date, transaction_type, total_amount) VALUES (?, ?, ?)',
+                       (sale_date, transaction_type, amount))
+        cursor.execute('INSERT INTO pos_sale_items (sale_id, product_id, quantity, total_price) VALUES (?, ?, ?, ?)',
+                       (cursor.lastrowid, product_id, 2, abs(amount)))
+    assert verify_dashboard_summary(cursor) == []
+
+    # Re-pricing re-costs past days; deleting a sale and its items reverses it
+    cursor.execute('UPDATE products SET cost_price = 90.0 WHERE id = ?', (product_id,))
+    cursor.execute("DELETE FROM pos_sale_items WHERE sale_id = (SELECT id FROM pos_sales WHERE sale_date LIKE '2026-10-02 09%')")
+    cursor.execute("DELETE FROM pos_sales WHERE sale_date LIKE '2026-10-02 09%'")
+    assert verify_dashboard_summary(cursor) == []
+
+
+def test_drift_is_reported(cursor):
+    cursor.execute("INSERT INTO products (name, current_stock, min_stock_level, cost_price) VALUES ('Phone', 5, 1, 100.0)")
+    cursor.execute('UPDATE dashboard_summary SET stock_value = stock_value + 10 WHERE id = 1')
+    assert verify_dashboard_summary(cursor) == ['stock_value: cached 510.0, expected 500.0']
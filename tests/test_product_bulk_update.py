@@ -0,0 +1,67 @@
+"""Bulk updates reach archived products picked by ID but not through a plain filter."""
+import sqlite3
+
+import pytest
+
+from product_bulk_update import apply_bulk_update
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'inventory.db')
+    conn.row_factory = sqlite3.Row
+    conn.executescript('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT,
+            name TEXT,
+            description TEXT,
+            category_id INTEGER,
+            brand_id INTEGER,
+            model_id INTEGER,
+            status TEXT DEFAULT 'active',
+            current_stock INTEGER DEFAULT 0,
+            min_stock_level INTEGER DEFAULT 0,
+            selling_price REAL DEFAULT 0,
+            cost_price REAL DEFAULT 0,
+            mrp REAL DEFAULT 0,
+            storage_location TEXT,
+            supplier_name TEXT,
+            updated_at TIMESTAMP
+        );
+        CREATE TABLE product_imei (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            imei TEXT
+        );
+    ''')
+    conn.executemany('INSERT INTO products (sku, name, category_id) VALUES (?, ?, ?)',
+                     [('PH-1', 'Phone', 1), ('PH-2', 'Old phone', 1)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _status(conn, product_id):
+    return conn.execute('SELECT status FROM products WHERE id = ?', (product_id,)).fetchone()['status']
+
+
+def test_archived_product_is_reactivated_by_id(conn):
+    result = apply_bulk_update(conn, [2], None, {'status': 'archived'})
+    assert (result['matched'], result['updated']) == (1, 1)
+    assert _status(conn, 2) == 'archived'
+
+    result = apply_bulk_update(conn, [2], None, {'status': 'active'})
+    assert (result['matched'], result['updated']) == (1, 1)
+    assert _status(conn, 2) == 'active'
+
+
+def test_filter_skips_archived_products_unless_asked_for(conn):
+    apply_bulk_update(conn, [2], None, {'status': 'archived'})
+
+    result = apply_bulk_update(conn, None, {'category_id': 1}, {'supplier_name': 'Acme'})
+    assert (result['matched'], result['updated']) == (1, 1)
+
+    result = apply_bulk_update(conn, None, {'status': 'archived'}, {'status': 'active'})
+    assert (result['matched'], result['updated']) == (1, 1)
+    assert _status(conn, 2) == 'active'
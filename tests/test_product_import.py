@@ -0,0 +1,101 @@
+"""Stock written by an import is recorded in the stock ledger."""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from product_import import import_product_frame
+from stock_ledger import init_stock_ledger
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'inventory.db')
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.executescript('''
+        CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE);
+        CREATE TABLE brands (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE);
+        CREATE TABLE models (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, brand_id INTEGER);
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT UNIQUE,
+            name TEXT NOT NULL,
+            category_id INTEGER,
+            brand_id INTEGER,
+            model_id INTEGER,
+            description TEXT,
+            cost_price REAL DEFAULT 0,
+            selling_price REAL DEFAULT 0,
+            mrp REAL DEFAULT 0,
+            current_stock INTEGER DEFAULT 0,
+            opening_stock INTEGER DEFAULT 0,
+            min_stock_level INTEGER DEFAULT 10,
+            storage_location TEXT,
+            imei TEXT,
+            color TEXT,
+            storage_capacity TEXT,
+            ram TEXT,
+            warranty_period TEXT,
+            supplier_name TEXT,
+            supplier_contact TEXT,
+            status TEXT DEFAULT 'active',
+            updated_at TIMESTAMP
+        );
+        CREATE TABLE stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            reference_type TEXT,
+            reference_id INTEGER,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    init_stock_ledger(cursor)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _import(conn, rows, **options):
+    stats = import_product_frame(conn, pd.DataFrame(rows), skip_errors=False, **options)
+    conn.commit()
+    return stats
+
+
+def _ledger(conn):
+    """product name -> (current stock, sum of movements, last balance_after)"""
+    cursor = conn.execute('''
+        SELECT p.name, p.current_stock, COALESCE(SUM(sm.quantity), 0) AS moved,
+               (SELECT balance_after FROM stock_movements
+                WHERE product_id = p.id ORDER BY created_at DESC, id DESC LIMIT 1) AS balance
+        FROM products p LEFT JOIN stock_movements sm ON sm.product_id = p.id
+        GROUP BY p.id ORDER BY p.name
+    ''')
+    return {row['name']: (row['current_stock'], row['moved'], row['balance']) for row in cursor.fetchall()}
+
+
+def test_new_products_get_an_opening_movement(conn):
+    _import(conn, [
+        {'name': 'Phone', 'sku': 'PH-1', 'current_stock': '5'},
+        {'name': 'Case', 'current_stock': '3'},
+        {'name': 'Cable', 'sku': 'CB-1', 'current_stock': '0'},
+    ])
+    assert _ledger(conn) == {'Phone': (5, 5, 5), 'Case': (3, 3, 3), 'Cable': (0, 0, None)}
+    assert conn.execute('SELECT DISTINCT type FROM stock_movements').fetchall()[0]['type'] == 'import'
+
+
+def test_reimport_records_the_stock_difference(conn):
+    _import(conn, [{'name': 'Phone', 'sku': 'PH-1', 'current_stock': '5'}])
+    _import(conn, [
+        {'name': 'Phone', 'sku': 'PH-1', 'current_stock': '2'},
+        {'name': 'Phone', 'sku': 'PH-1', 'current_stock': '8'},
+        {'name': 'Case', 'sku': 'CS-1', 'current_stock': '4'},
+    ], update_existing=True)
+    assert _ledger(conn) == {'Phone': (8, 8, 8), 'Case': (4, 4, 4)}
+
+    # Re-importing the same stock writes no movement
+    _import(conn, [{'name': 'Phone', 'sku': 'PH-1', 'current_stock': '8'}], update_existing=True)
+    assert conn.execute('SELECT COUNT(*) FROM stock_movements').fetchone()[0] == 3
@@ -2,7 +2,8 @@
 from flask import Blueprint, request, jsonify, session
 from auth import login_required, admin_required, permission_required, log_audit, check_permission
 import sqlite3
-import bcrypt
+from password_hashing import hash_password, HashingBusy
+from audit_store import query_audit_logs, count_audit_logs, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from datetime import datetime
 
 user_bp = Blueprint('user_management', __name__)
@@ -71,7 +72,10 @@ def create_user():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Hash password
-    password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        password_hash = hash_password(data['password'])
+    except HashingBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     
     conn = get_db()
     cursor = conn.cursor()
@@ -94,9 +98,7 @@ def create_user():
         user_id = cursor.lastrowid
         
         # Log activity
-        log_audit(session['user_id'], 'user_created', 
-                 f'Created new user: {data["username"]}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'user_created', details=f'Created new user: {data["username"]}')
         
         return jsonify({'success': True, 'user_id': user_id}), 201
     
@@ -145,9 +147,7 @@ def update_user(user_id):
         conn.commit()
         
         # Log activity
-        log_audit(session['user_id'], 'user_updated', 
-                 f'Updated user ID: {user_id}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'user_updated', details=f'Updated user ID: {user_id}')
         
         return jsonify({'success': True})
     
@@ -175,9 +175,7 @@ def update_user_status(user_id):
         conn.commit()
         
         # Log activity
-        log_audit(session['user_id'], 'user_status_changed', 
-                 f'Changed user ID {user_id} status to: {status}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'user_status_changed', details=f'Changed user ID {user_id} status to: {status}')
         
         return jsonify({'success': True})
     finally:
@@ -194,7 +192,10 @@ def reset_user_password(user_id):
     if not new_password or len(new_password) < 6:
         return jsonify({'error': 'Password must be at least 6 characters'}), 400
     
-    password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        password_hash = hash_password(new_password)
+    except HashingBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     
     conn = get_db()
     cursor = conn.cursor()
@@ -208,9 +209,7 @@ def reset_user_password(user_id):
         conn.commit()
         
         # Log activity
-        log_audit(session['user_id'], 'password_reset', 
-                 f'Reset password for user ID: {user_id}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'password_reset', details=f'Reset password for user ID: {user_id}')
         
         return jsonify({'success': True})
     finally:
@@ -255,9 +254,7 @@ def create_role():
         role_id = cursor.lastrowid
         
         # Log activity
-        log_audit(session['user_id'], 'role_created', 
-                 f'Created new role: {data["role_name"]}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'role_created', details=f'Created new role: {data["role_name"]}')
         
         return jsonify({'success': True, 'role_id': role_id}), 201
     
@@ -292,9 +289,7 @@ def update_role(role_id):
         conn.commit()
         
         # Log activity
-        log_audit(session['user_id'], 'role_updated', 
-                 f'Updated role ID: {role_id}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'role_updated', details=f'Updated role ID: {role_id}')
         
         return jsonify({'success': True})
     finally:
@@ -369,9 +364,7 @@ def update_role_permissions(role_id):
         conn.commit()
         
         # Log activity
-        log_audit(session['user_id'], 'permissions_updated', 
-                 f'Updated permissions for role ID: {role_id}',
-                 request.remote_addr, request.headers.get('User-Agent'))
+        log_audit(session['user_id'], 'permissions_updated', details=f'Updated permissions for role ID: {role_id}')
         
         return jsonify({'success': True})
     finally:
@@ -383,68 +376,28 @@ def update_role_permissions(role_id):
 @login_required
 @admin_required
 def get_audit_logs():
-    """Get audit logs with filters"""
-    user_id = request.args.get('user_id')
-    action_type = request.args.get('action_type')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    limit = int(request.args.get('limit', 100))
-    offset = int(request.args.get('offset', 0))
+    """Get audit logs with filters, newest first, paged by id cursor"""
+    filters = {
+        'user_id': request.args.get('user_id'),
+        'action': request.args.get('action_type'),
+        'start_date': request.args.get('start_date'),
+        'end_date': request.args.get('end_date'),
+    }
+    before_id = request.args.get('before_id', type=int)
+    limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
     
     conn = get_db()
     cursor = conn.cursor()
     
     try:
-        query = '''
-            SELECT al.*, u.username, u.name as user_name
-            FROM audit_logs al
-            LEFT JOIN users u ON al.user_id = u.id
-            WHERE 1=1
-        '''
-        params = []
-        
-        if user_id:
-            query += ' AND al.user_id = ?'
-            params.append(user_id)
-        
-        if action_type:
-            query += ' AND al.action_type = ?'
-            params.append(action_type)
-        
-        if start_date:
-            query += ' AND al.created_at >= ?'
-            params.append(start_date)
-        
-        if end_date:
-            query += ' AND al.created_at <= ?'
-            params.append(end_date)
-        
-        query += ' ORDER BY al.created_at DESC LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
-        
-        cursor.execute(query, params)
-        logs = [dict(row) for row in cursor.fetchall()]
-        
-        # Get total count
-        count_query = 'SELECT COUNT(*) as total FROM audit_logs WHERE 1=1'
-        count_params = []
-        
-        if user_id:
-            count_query += ' AND user_id = ?'
-            count_params.append(user_id)
-        
-        if action_type:
-            count_query += ' AND action_type = ?'
-            count_params.append(action_type)
-        
-        cursor.execute(count_query, count_params)
-        total = cursor.fetchone()['total']
+        logs, next_cursor = query_audit_logs(cursor, before_id=before_id, limit=limit, **filters)
+        total = count_audit_logs(cursor, **filters)
         
         return jsonify({
             'logs': logs,
             'total': total,
             'limit': limit,
-            'offset': offset
+            'next_cursor': next_cursor
         })
     finally:
         conn.close()